@@ -41,6 +41,7 @@ class EBDeployer:
                 '.venv',
                 'venv',
                 'tests',
+                'benchmarks',
                 '.pytest_cache',
                 'temp_deploy',
                 '*.zip',
@@ -53,6 +54,12 @@ class EBDeployer:
 
             shutil.copytree(source_dir, temp_dir / "app", ignore=ignore_func, dirs_exist_ok=True)
 
+            # Fingerprint and precompress static assets
+            self.build_static_assets(temp_dir / "app")
+
+            # Precompile templates so workers start with a warm bytecode cache
+            self.precompile_templates(temp_dir / "app")
+
             # Create the ZIP file
             shutil.make_archive(zip_filename[:-4], 'zip', temp_dir / "app")
 
@@ -63,6 +70,31 @@ class EBDeployer:
             # Cleanup temporary directory
             shutil.rmtree(temp_dir)
 
+    def build_static_assets(self, package_dir: Path) -> None:
+        """Write content-hashed, precompressed static assets and their manifest"""
+        print("🗜️  Building static assets...")
+        from app.assets import build_assets
+
+        manifest = build_assets(static_dir=str(package_dir / "app" / "static"))
+        print(f"✅ Built {len(manifest)} static assets")
+
+    def precompile_templates(self, package_dir: Path) -> None:
+        """Fill the Jinja bytecode cache inside the deployment package"""
+        print("🧩 Precompiling templates...")
+        from app.templating import create_environment, precompile_templates
+
+        # Bytecode cache keys include the template path the loader saw, so
+        # compile from the package root with the same relative paths that
+        # the workers use (the TEMPLATE_DIR default), or no entry is ever hit
+        cwd = os.getcwd()
+        os.chdir(package_dir)
+        try:
+            env = create_environment()
+            count = precompile_templates(env)
+        finally:
+            os.chdir(cwd)
+        print(f"✅ Precompiled {count} templates")
+
     def upload_to_s3(self, filename: str) -> Dict[str, str]:
         """Upload deployment package to S3"""
         print(f"📤 Uploading {filename} to S3...")
@@ -62,7 +62,9 @@ class AWSResourceManager:
                 "AttributeDefinitions": [
                     {"AttributeName": "id", "AttributeType": "S"},
                     {"AttributeName": "genre", "AttributeType": "S"},
-                    {"AttributeName": "rating", "AttributeType": "N"}
+                    {"AttributeName": "rating", "AttributeType": "N"},
+                    {"AttributeName": "trending_generation", "AttributeType": "N"},
+                    {"AttributeName": "trending", "AttributeType": "N"}
                 ],
                 "GlobalSecondaryIndexes": [
                     {
@@ -86,6 +88,30 @@ class AWSResourceManager:
                             "ReadCapacityUnits": 5,
                             "WriteCapacityUnits": 5
                         }
+                    },
+                    {
+                        "IndexName": "GenreRatingIndex",
+                        "KeySchema": [
+                            {"AttributeName": "genre", "KeyType": "HASH"},
+                            {"AttributeName": "rating", "KeyType": "RANGE"}
+                        ],
+                        "Projection": {"ProjectionType": "ALL"},
+                        "ProvisionedThroughput": {
+                            "ReadCapacityUnits": 5,
+                            "WriteCapacityUnits": 5
+                        }
+                    },
+                    {
+                        "IndexName": "TrendingIndex",
+                        "KeySchema": [
+                            {"AttributeName": "trending_generation", "KeyType": "HASH"},
+                            {"AttributeName": "trending", "KeyType": "RANGE"}
+                        ],
+                        "Projection": {"ProjectionType": "ALL"},
+                        "ProvisionedThroughput": {
+                            "ReadCapacityUnits": 5,
+                            "WriteCapacityUnits": 5
+                        }
                     }
                 ],
                 "ProvisionedThroughput": {
@@ -99,7 +125,8 @@ class AWSResourceManager:
                 ],
                 "AttributeDefinitions": [
                     {"AttributeName": "id", "AttributeType": "S"},
-                    {"AttributeName": "movie_id", "AttributeType": "S"}
+                    {"AttributeName": "movie_id", "AttributeType": "S"},
+                    {"AttributeName": "path", "AttributeType": "S"}
                 ],
                 "GlobalSecondaryIndexes": [
                     {
@@ -112,6 +139,18 @@ class AWSResourceManager:
                             "ReadCapacityUnits": 5,
                             "WriteCapacityUnits": 5
                         }
+                    },
+                    {
+                        "IndexName": "ThreadIndex",
+                        "KeySchema": [
+                            {"AttributeName": "movie_id", "KeyType": "HASH"},
+                            {"AttributeName": "path", "KeyType": "RANGE"}
+                        ],
+                        "Projection": {"ProjectionType": "ALL"},
+                        "ProvisionedThroughput": {
+                            "ReadCapacityUnits": 5,
+                            "WriteCapacityUnits": 5
+                        }
                     }
                 ],
                 "ProvisionedThroughput": {
@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from mimetypes import guess_type
+from typing import Dict, Optional
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+import logging
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are skipped if the package is missing
+    brotli = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.getenv("STATIC_DIR", "app/static")
+STATIC_URL = "/static"
+BUILD_DIR_NAME = "build"
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Text formats worth compressing; images are already compressed
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".html", ".ico"}
+
+# Preferred order when a client accepts several encodings
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def build_assets(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Copy static files to content-hashed names with .gz/.br siblings and write a manifest.
+
+    Returns the manifest, which maps logical names such as "css/styles.css"
+    to their fingerprinted paths under the build directory.
+    """
+    build_dir = os.path.join(static_dir, BUILD_DIR_NAME)
+    if os.path.exists(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        # Skip the output directory itself
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != build_dir)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical_name = os.path.relpath(source, static_dir).replace(os.sep, "/")
+
+            with open(source, "rb") as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()[:10]
+            stem, ext = os.path.splitext(logical_name)
+            hashed_name = f"{stem}.{digest}{ext}"
+
+            target = os.path.join(build_dir, *hashed_name.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(content)
+
+            if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+                with open(target + ".gz", "wb") as f:
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + ".br", "wb") as f:
+                        f.write(brotli.compress(content, quality=11))
+
+            manifest[logical_name] = f"{BUILD_DIR_NAME}/{hashed_name}"
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    logger.info(f"Built {len(manifest)} static assets into {build_dir}")
+    return manifest
+
+
+def load_manifest(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Load the asset manifest, or an empty one if the build step has not run"""
+    path = os.path.join(static_dir, BUILD_DIR_NAME, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning("No static asset manifest found, serving unversioned assets")
+        return {}
+
+
+_manifest: Optional[Dict[str, str]] = None
+
+
+def asset_url(name: str) -> str:
+    """Resolve a logical asset name like "css/styles.css" to its fingerprinted URL"""
+    global _manifest
+    if _manifest is None:
+        _manifest = load_manifest()
+    name = name.lstrip("/")
+    return f"{STATIC_URL}/{_manifest.get(name, name)}"
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows encoding; q=0 rules it out, as does leaving it unlisted"""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities.get(encoding, qualities.get("*", 0.0)) > 0
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz siblings of built assets with immutable caching"""
+
+    async def get_response(self, path: str, scope):
+        fingerprinted = path.split(os.sep)[0] == BUILD_DIR_NAME
+
+        if fingerprinted and scope["method"] in ("GET", "HEAD"):
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            for encoding, suffix in ENCODINGS:
+                if not accepts_encoding(accept_encoding, encoding):
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result is None:
+                    continue
+                media_type, _ = guess_type(path)
+                response = FileResponse(
+                    full_path,
+                    stat_result=stat_result,
+                    media_type=media_type,
+                    headers={"Content-Encoding": encoding},
+                )
+                return self._add_cache_headers(response)
+
+        response = await super().get_response(path, scope)
+        if fingerprinted and response.status_code in (200, 304):
+            self._add_cache_headers(response)
+        return response
+
+    @staticmethod
+    def _add_cache_headers(response):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+if __name__ == "__main__":
+    build_assets()
@@ -6,4 +6,80 @@ DATABASE_URL = get_parameter("/youflix/DATABASE_URL") + "/YouFlix"
 AWS_REGION = get_parameter("/youflix/AWS_REGION")
 AWS_S3_BUCKET = get_parameter("/youflix/AWS_S3_BUCKET")
 DYNAMODB_TABLE = get_parameter("/youflix/DYNAMODB_TABLE")
-SECRET_KEY = get_parameter("/youflix/SECRET_KEY")
\ No newline at end of file
+SECRET_KEY = get_parameter("/youflix/SECRET_KEY")
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+# Database connection pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# DynamoDB
+DYNAMODB_SCAN_SEGMENTS = int(os.getenv("DYNAMODB_SCAN_SEGMENTS", "4"))
+# Threads shared by parallel scans and per-genre queries
+DYNAMODB_QUERY_THREADS = int(os.getenv("DYNAMODB_QUERY_THREADS", "16"))
+GENRE_COUNTS_CACHE_SECONDS = int(os.getenv("GENRE_COUNTS_CACHE_SECONDS", "30"))
+# Waiters on a coalesced read get the leader's exception instead of retrying
+SINGLE_FLIGHT_SHARE_ERRORS = os.getenv("SINGLE_FLIGHT_SHARE_ERRORS", "true").lower() == "true"
+
+# In-memory catalog snapshot, served stale-while-revalidate
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT_ENABLED", "false").lower() == "true"
+CATALOG_REFRESH_SECONDS = int(os.getenv("CATALOG_REFRESH_SECONDS", "60"))
+CATALOG_MAX_STALENESS_SECONDS = int(os.getenv("CATALOG_MAX_STALENESS_SECONDS", "300"))
+
+# Buffered view and download counters; a crashed worker loses at most
+# COUNTER_FLUSH_SECONDS of counts
+COUNTER_FLUSH_SECONDS = float(os.getenv("COUNTER_FLUSH_SECONDS", "30"))
+COUNTER_FLUSH_THRESHOLD = int(os.getenv("COUNTER_FLUSH_THRESHOLD", "1000"))
+
+# Live comment updates; "unix" fans events out to every worker on the host,
+# "local" keeps them within one worker
+COMMENT_EVENTS_BACKEND = os.getenv("COMMENT_EVENTS_BACKEND", "unix")
+# Must be private to the app's user; the default is per user, under XDG_RUNTIME_DIR when there is one
+COMMENT_EVENTS_SOCKET_DIR = os.getenv(
+    "COMMENT_EVENTS_SOCKET_DIR",
+    os.path.join(os.getenv("XDG_RUNTIME_DIR") or "/tmp", f"youflix-comment-events-{os.getuid()}")
+)
+COMMENT_EVENTS_KEEPALIVE_SECONDS = int(os.getenv("COMMENT_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# Threaded comments; top-level comments have depth 0
+MAX_COMMENT_DEPTH = int(os.getenv("MAX_COMMENT_DEPTH", "4"))
+COMMENT_THREADS_PAGE_SIZE = int(os.getenv("COMMENT_THREADS_PAGE_SIZE", "20"))
+
+# Trending feed on the home page
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_REFRESH_SECONDS = int(os.getenv("TRENDING_REFRESH_SECONDS", "10"))
+TRENDING_LIMIT = int(os.getenv("TRENDING_LIMIT", "12"))
+
+# Search index
+SEARCH_INDEX_SNAPSHOT_PATH = os.getenv("SEARCH_INDEX_SNAPSHOT_PATH", "/tmp/youflix-search-index.json")
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "300"))
+
+# Client-side write admission control. Provisioned WCU per table and per
+# index; each worker admits its DYNAMODB_CAPACITY_SHARE of it
+DYNAMODB_WRITE_CAPACITY = float(os.getenv("DYNAMODB_WRITE_CAPACITY", "5"))
+DYNAMODB_CAPACITY_SHARE = float(os.getenv("DYNAMODB_CAPACITY_SHARE", "0.25"))
+DYNAMODB_CAPACITY_BURST_SECONDS = float(os.getenv("DYNAMODB_CAPACITY_BURST_SECONDS", "30"))
+# Fraction of the burst that low priority writes leave for user-facing ones
+DYNAMODB_LOW_PRIORITY_RESERVE = float(os.getenv("DYNAMODB_LOW_PRIORITY_RESERVE", "0.5"))
+# Per-user limit on ratings and comments
+USER_WRITE_RATE_PER_MINUTE = float(os.getenv("USER_WRITE_RATE_PER_MINUTE", "20"))
+USER_WRITE_BURST = int(os.getenv("USER_WRITE_BURST", "5"))
+# Log and count requests whose full-table scans read more than this many RCU
+DYNAMODB_SCAN_WARN_UNITS = float(os.getenv("DYNAMODB_SCAN_WARN_UNITS", "50"))
+
+# Cleanup of a deleted movie's comments and ratings. A worker running one
+# holds a lease on it; cleanups whose lease has run out, e.g. because their
+# worker was recycled, are resumed by the workers every resume interval
+CASCADE_LEASE_SECONDS = int(os.getenv("CASCADE_LEASE_SECONDS", "120"))
+CASCADE_RESUME_SECONDS = int(os.getenv("CASCADE_RESUME_SECONDS", "300"))
+
+# /metrics and /metrics/capacity. When METRICS_TOKEN is set they require
+# "Authorization: Bearer <token>"; otherwise only local requests are served
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
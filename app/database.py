@@ -1,10 +1,160 @@
-from sqlalchemy import create_engine
+import functools
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+)
+from app.utils import metrics
+
+
+# Async driver to use for each database backend. MSSQL has none that works
+# with pymssql, so its async sessions run the sync engine in the threadpool.
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def has_async_driver(url: str) -> bool:
+    return make_url(url).get_backend_name() in ASYNC_DRIVERS
+
+
+def get_async_url(url: str):
+    """Swap the driver in a database URL for its async counterpart"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+class ThreadedSession:
+    """The subset of AsyncSession the app uses, backed by a sync Session run in the threadpool"""
+
+    def __init__(self, session_factory):
+        self._session = session_factory()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await run_in_threadpool(self._session.close)
+
+    async def execute(self, *args, **kwargs):
+        # Fetch the rows in the threadpool too, so the caller never touches the cursor
+        frozen = await run_in_threadpool(lambda: self._session.execute(*args, **kwargs).freeze())
+        return frozen()
+
+    def add(self, instance) -> None:
+        self._session.add(instance)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self._session.commit)
+
+    async def refresh(self, instance) -> None:
+        await run_in_threadpool(self._session.refresh, instance)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self._session.delete, instance)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self._session.close)
 
-from app.config import DATABASE_URL
 
+class InstrumentedPoolMixin:
+    """Records how long callers wait for a connection and how often they time out"""
+    metrics_prefix = "db.pool"
 
-engine = create_engine(DATABASE_URL)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.increment(f"{self.metrics_prefix}.timeouts")
+            raise
+        finally:
+            metrics.observe(f"{self.metrics_prefix}.checkout_wait_seconds", time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    metrics_prefix = "db.pool.sync"
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_prefix = "db.pool.async"
+
+
+def instrument_pool(pool) -> None:
+    """Export in-use, overflow and connection churn metrics for a pool"""
+    prefix = pool.metrics_prefix
+    # checkin fires before the connection is back in the pool, so
+    # pool.checkedout() would still count it; keep our own count instead
+    lock = threading.Lock()
+    in_use = 0
+
+    def update_gauges(delta: int):
+        nonlocal in_use
+        with lock:
+            in_use += delta
+            metrics.set_gauge(f"{prefix}.in_use", in_use)
+            # Overflow connections are closed as they come back, so this is the overflow that exists
+            metrics.set_gauge(f"{prefix}.overflow", max(in_use - pool.size(), 0))
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.increment(f"{prefix}.connects")
+
+    @event.listens_for(pool, "close")
+    def on_close(dbapi_connection, connection_record):
+        metrics.increment(f"{prefix}.closes")
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment(f"{prefix}.invalidations")
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        update_gauges(1)
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        update_gauges(-1)
+
+    @event.listens_for(pool, "detach")
+    def on_detach(dbapi_connection, connection_record):
+        # Detached connections leave the pool without a checkin
+        update_gauges(-1)
+
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, **pool_options)
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
+
+instrument_pool(engine.pool)
+
+if has_async_driver(DATABASE_URL):
+    async_engine = create_async_engine(
+        get_async_url(DATABASE_URL), poolclass=InstrumentedAsyncQueuePool, **pool_options
+    )
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    instrument_pool(async_engine.sync_engine.pool)
+else:
+    # Objects outlive their session as they do with the async engine
+    AsyncSessionLocal = functools.partial(ThreadedSession, sessionmaker(bind=engine, expire_on_commit=False))
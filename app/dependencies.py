@@ -1,16 +1,18 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.requests import Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+import secrets
 
-from app.database import SessionLocal
-from app.models.user import User
-from app.config import SECRET_KEY
+from app.database import SessionLocal, AsyncSessionLocal
+from app.models.user import get_user_by_username_async
+from app.config import METRICS_TOKEN, SECRET_KEY
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 ALGORITHM = "HS256"
+LOCAL_HOSTS = {"127.0.0.1", "::1"}
 
 
 def get_db():
@@ -21,7 +23,12 @@ def get_db():
         db.close()
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -32,7 +39,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        user = db.query(User).filter(User.username == username).first()
+        user = await get_user_by_username_async(db, username)
         if user is None:
             raise credentials_exception
     except JWTError:
@@ -40,7 +47,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     return user
 
 
-async def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
+async def get_current_user_from_cookie(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
         cookie = request.cookies.get("access_token")
         if not cookie or not cookie.startswith("Bearer "):
@@ -50,7 +57,20 @@ async def get_current_user_from_cookie(request: Request, db: Session = Depends(g
         username: str = payload.get("sub")
         if username is None:
             return None
-        user = db.query(User).filter(User.username == username).first()
+        user = await get_user_by_username_async(db, username)
         return user
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+
+def require_metrics_access(request: Request):
+    """Let through the metrics token if one is configured, else only local callers"""
+    if METRICS_TOKEN:
+        authorization = request.headers.get("Authorization", "")
+        if secrets.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return
+    elif (request.client is not None and request.client.host in LOCAL_HOSTS
+          and "X-Forwarded-For" not in request.headers):
+        # A forwarded request only looks local because the proxy is
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
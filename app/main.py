@@ -1,18 +1,23 @@
 from datetime import datetime, timezone
+import asyncio
 
 from fastapi import FastAPI, Request, Depends, status
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from sqlalchemy import exc as sqlalchemy_exc
 from sqlalchemy.orm import Session
 import logging
 
-from app.database import SessionLocal
-from app.dependencies import get_db, get_current_user, get_current_user_from_cookie
-from app.routers import auth, movies, comments
-from app.utils import aws_dynamodb
+from app.database import AsyncSessionLocal
+from app.dependencies import get_db, get_current_user, get_current_user_from_cookie, require_metrics_access
+from app.assets import PrecompressedStaticFiles
+from app.routers import auth, movies, comments, api
+from app.templating import templates, to_datetime, precompile_templates
+from app.config import SEARCH_INDEX_REFRESH_SECONDS
+from app.utils import aws_dynamodb, capacity, catalog, comment_events, counter_buffer, password_hashing, metrics, http_caching, search_index, suggest_index
+from app.utils.data_loader import get_loaders
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,57 +35,96 @@ app.add_middleware(
 )
 
 
+def database_busy_response():
+    # Fail fast instead of queueing behind a saturated connection pool
+    logger.warning("Timed out waiting for a database connection")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable"},
+        headers={"Retry-After": "1"}
+    )
+
+
 class UserMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
-        # Add db and current_user to request state
-        request.state.db = SessionLocal()
-        request.state.current_user = await get_current_user_from_cookie(request, request.state.db)
+        # Add current_user to request state
+        try:
+            async with AsyncSessionLocal() as db:
+                request.state.current_user = await get_current_user_from_cookie(request, db)
+        except sqlalchemy_exc.TimeoutError:
+            return database_busy_response()
         response = await call_next(request)
-        request.state.db.close()
         return response
 
 
 app.add_middleware(UserMiddleware)
 
-# Mount static files
-try:
-    app.mount("/static", StaticFiles(directory="app/static"), name="static")
-except Exception as e:
-    logger.error(f"Failed to mount static files: {e}")
-
-# Initialize templates
-templates = Jinja2Templates(directory="app/templates")
-
-
-# Add custom filters to Jinja2 environment
-def to_datetime(value):
-    if isinstance(value, datetime):
-        # Make sure datetime is timezone-aware
-        if value.tzinfo is None:
-            return value.replace(tzinfo=timezone.utc)
-        return value
-    try:
-        # Parse ISO format string and ensure timezone awareness
-        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt
-    except (ValueError, AttributeError):
-        return datetime.fromtimestamp(0, tz=timezone.utc)
 
+class CapacityMiddleware(BaseHTTPMiddleware):
+    """Charge the DynamoDB capacity each request consumes to its route"""
+    async def dispatch(self, request: Request, call_next):
+        usage = capacity.start_request()
+        try:
+            return await call_next(request)
+        finally:
+            # The router records the matched endpoint in the shared scope
+            endpoint = request.scope.get("endpoint")
+            capacity.finish_request(getattr(endpoint, "__name__", "unmatched"), usage)
 
-def format_datetime(value):
-    dt = to_datetime(value)
-    return dt.strftime('%Y-%m-%d %H:%M:%S %Z')
 
+app.add_middleware(CapacityMiddleware)
 
-# Add filters to Jinja2 environment
-templates.env.filters["to_datetime"] = to_datetime
-templates.env.filters["format_datetime"] = format_datetime
+# Mount static files
+try:
+    app.mount("/static", PrecompressedStaticFiles(directory="app/static"), name="static")
+except Exception as e:
+    logger.error(f"Failed to mount static files: {e}")
 
 app.include_router(auth.router)
 app.include_router(movies.router)
 app.include_router(comments.router)
+app.include_router(api.router)
+
+
+async def refresh_search_index_periodically():
+    built_at = None
+    while True:
+        try:
+            await run_in_threadpool(search_index.refresh)
+            # Suggestions are derived from the same snapshot, so only rebuild when it changed
+            if search_index.index.built_at != built_at:
+                built_at = search_index.index.built_at
+                await run_in_threadpool(suggest_index.index.rebuild, search_index.index.documents())
+        except Exception as e:
+            logger.error(f"Failed to refresh search index: {e}")
+        await asyncio.sleep(SEARCH_INDEX_REFRESH_SECONDS)
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Compile templates up front so the first request after a deploy is not slower
+    precompile_templates(templates.env)
+    # Load or build the search index in the background
+    app.state.search_index_task = asyncio.create_task(refresh_search_index_periodically())
+    catalog.start()
+    counter_buffer.start()
+    comment_events.start()
+    # Pick up cleanups of deleted movies that a recycled worker left unfinished
+    aws_dynamodb.start_resuming_cascades()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.search_index_task.cancel()
+    password_hashing.shutdown()
+    comment_events.stop()
+    # Write out buffered view and download counts before the worker exits
+    await run_in_threadpool(counter_buffer.stop)
+
+
+@app.exception_handler(sqlalchemy_exc.TimeoutError)
+async def database_timeout_handler(request: Request, exc: sqlalchemy_exc.TimeoutError):
+    return database_busy_response()
 
 
 @app.exception_handler(Exception)
@@ -94,9 +138,14 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 @app.get("/", response_class=HTMLResponse, name="home")
 async def home(request: Request):
+    try:
+        trending = await run_in_threadpool(aws_dynamodb.get_trending_movies)
+    except Exception as e:
+        logger.error(f"Failed to load trending movies: {e}")
+        trending = []
     return templates.TemplateResponse(
         "index.html",
-        {"request": request, "current_user": request.state.current_user}
+        {"request": request, "current_user": request.state.current_user, "trending": trending}
     )
 
 
@@ -109,15 +158,20 @@ async def profile(
     if not current_user:
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_302_FOUND)
 
-    user_movies = aws_dynamodb.get_movies_by_user(current_user.id)
-    user_comments = aws_dynamodb.get_comments_by_user(current_user.id)
+    # Fetch the user's movies and comments concurrently
+    loaders = get_loaders(request)
+    user_movies, user_comments = await asyncio.gather(
+        loaders.movies_by_user(current_user.id),
+        loaders.comments_by_user(current_user.id)
+    )
 
     # Ensure all comment timestamps are timezone-aware
     for comment in user_comments:
         if 'timestamp' in comment:
             comment['timestamp'] = to_datetime(comment['timestamp'])
 
-    return templates.TemplateResponse(
+    return http_caching.conditional_template_response(
+        request,
         "profile.html",
         {
             "request": request,
@@ -125,10 +179,24 @@ async def profile(
             "movies": user_movies,
             "comments": user_comments,
             "now": datetime.now(timezone.utc)
-        }
+        },
+        user_movies + user_comments,
+        http_caching.cache_control_for(request),
+        http_caching.editable_comment_ids(user_comments, current_user)
     )
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_access)])
+async def metrics_dump():
+    return metrics.snapshot()
+
+
+@app.get("/metrics/capacity", dependencies=[Depends(require_metrics_access)])
+async def capacity_report():
+    """DynamoDB capacity consumed per route and operation by this worker"""
+    return capacity.report()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, select
 
 from app.database import Base
 
@@ -49,3 +49,45 @@ def delete_user(db, user_id: int):
         db.delete(db_user)
         db.commit()
     return db_user
+
+
+# Async versions for use with an AsyncSession
+async def get_user_async(db, user_id: int):
+    result = await db.execute(select(User).filter(User.id == user_id))
+    return result.scalars().first()
+
+
+async def get_user_by_username_async(db, username: str):
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
+
+
+async def get_user_by_email_async(db, email: str):
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+
+async def create_user_async(db, user_data: dict):
+    db_user = User(**user_data)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def update_user_async(db, user_id: int, user_data: dict):
+    db_user = await get_user_async(db, user_id)
+    if db_user:
+        for key, value in user_data.items():
+            setattr(db_user, key, value)
+        await db.commit()
+        await db.refresh(db_user)
+    return db_user
+
+
+async def delete_user_async(db, user_id: int):
+    db_user = await get_user_async(db, user_id)
+    if db_user:
+        await db.delete(db_user)
+        await db.commit()
+    return db_user
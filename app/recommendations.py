@@ -0,0 +1,129 @@
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+import logging
+
+from app.utils import aws_dynamodb
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOP_K = 10
+# Similarities backed by few common raters are shrunk towards zero
+SHRINKAGE = 10.0
+# Columns of the similarity matrix computed at a time; bounds peak memory
+BLOCK_SIZE = 512
+
+
+def build_matrix(ratings: Iterable[Tuple[str, Any, float]]) -> Tuple[sp.csr_matrix, List[str]]:
+    """Build a sparse user x movie rating matrix from (movie_id, user_id, rating) triples"""
+    movie_index: Dict[str, int] = {}
+    user_index: Dict[Any, int] = {}
+    rows, cols, values = [], [], []
+    for movie_id, user_id, rating in ratings:
+        cols.append(movie_index.setdefault(movie_id, len(movie_index)))
+        rows.append(user_index.setdefault(user_id, len(user_index)))
+        values.append(rating)
+
+    matrix = sp.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (np.asarray(rows), np.asarray(cols))),
+        shape=(len(user_index), len(movie_index))
+    )
+    return matrix, list(movie_index)
+
+
+def similar_movies(matrix: sp.csr_matrix, k: int = TOP_K, shrinkage: float = SHRINKAGE,
+                   block_size: int = BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k cosine neighbors of every movie (column).
+
+    Returns (neighbors, scores), both movies x k; missing neighbors are -1
+    with a score of 0. Work happens one block of columns at a time, so only
+    a movies x block_size dense slice is ever materialized.
+    """
+    matrix = sp.csc_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1
+    normalized = sp.csc_matrix(matrix.multiply(1 / norms[np.newaxis, :]))
+    rated = sp.csc_matrix((matrix != 0).astype(np.float32))
+    normalized_t, rated_t = normalized.T.tocsr(), rated.T.tocsr()
+
+    n_movies = matrix.shape[1]
+    k = min(k, max(n_movies - 1, 0))
+    neighbors = np.full((n_movies, k), -1, dtype=np.int32)
+    scores = np.zeros((n_movies, k), dtype=np.float32)
+    if k == 0:
+        return neighbors, scores
+
+    for start in range(0, n_movies, block_size):
+        end = min(start + block_size, n_movies)
+        similarity = (normalized_t @ normalized[:, start:end]).toarray()
+        common = (rated_t @ rated[:, start:end]).toarray()
+        similarity *= common / (common + shrinkage)
+        # A movie is not its own neighbor
+        similarity[np.arange(start, end), np.arange(end - start)] = 0
+
+        block = similarity.T
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        top[top_scores <= 0] = -1
+        neighbors[start:end] = top
+        scores[start:end] = np.maximum(top_scores, 0)
+
+    return neighbors, scores
+
+
+def compute(ratings: Iterable[Tuple[str, Any, float]], k: int = TOP_K) -> Dict[str, List[Tuple[str, float]]]:
+    """Neighbors as movie id -> [(similar movie id, score), ...], best first"""
+    matrix, movie_ids = build_matrix(ratings)
+    neighbors, scores = similar_movies(matrix, k)
+    return {
+        movie_id: [(movie_ids[j], float(s)) for j, s in zip(neighbors[i], scores[i]) if j >= 0]
+        for i, movie_id in enumerate(movie_ids)
+    }
+
+
+def run(k: int = TOP_K) -> int:
+    """Recompute recommendations for every movie and store those that changed, returning how many"""
+    start = time.perf_counter()
+    ratings = [
+        (item['movie_id'], item['user_id'], float(item['rating']))
+        for item in aws_dynamodb.parallel_scan(aws_dynamodb.ratings_table.name)
+    ]
+    movies = aws_dynamodb.parallel_scan_movies()
+    titles = {movie['id']: movie.get('title', '') for movie in movies}
+    stored = {movie['id']: movie.get('similar') or [] for movie in movies}
+    recommendations = compute(ratings, k)
+    logger.info(f"Computed neighbors for {len(recommendations)} movies from {len(ratings)} ratings "
+                f"in {time.perf_counter() - start:.1f}s")
+
+    computed_at = datetime.now(timezone.utc).isoformat()
+    written = 0
+    # Ratings left behind by deleted movies are skipped; movies that no longer
+    # have ratings get their old neighbors cleared
+    for movie_id in titles:
+        similar = [
+            {'id': other_id, 'title': titles[other_id], 'score': Decimal(f"{score:.4f}")}
+            for other_id, score in recommendations.get(movie_id, []) if other_id in titles
+        ]
+        # Every write bumps the movie's version and with it cached pages, so only write changes
+        if similar == stored[movie_id]:
+            continue
+        aws_dynamodb.set_similar_movies(movie_id, similar, computed_at)
+        written += 1
+
+    logger.info(f"Stored recommendations for {written} of {len(titles)} movies "
+                f"in {time.perf_counter() - start:.1f}s")
+    return written
+
+
+if __name__ == "__main__":
+    run()
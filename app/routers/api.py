@@ -0,0 +1,158 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Type
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+import logging
+
+from app.schemas import MovieOut, CommentOut, RatingOut, RatingSummaryOut
+from app.utils import aws_dynamodb
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+router = APIRouter(
+    prefix="/api/v1",
+    tags=["api"],
+    default_response_class=ORJSONResponse,
+)
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+# Validating a whole list in one call is much cheaper than one model at a time
+_list_adapters: Dict[Type[BaseModel], TypeAdapter] = {
+    model: TypeAdapter(List[model]) for model in (MovieOut, CommentOut, RatingOut)
+}
+
+
+def encode_cursor(last_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Turn a DynamoDB LastEvaluatedKey into an opaque cursor"""
+    if not last_key:
+        return None
+    wire = {k: _serializer.serialize(v) for k, v in last_key.items()}
+    return base64.urlsafe_b64encode(json.dumps(wire, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Turn a cursor back into an ExclusiveStartKey"""
+    if not cursor:
+        return None
+    try:
+        wire = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {k: _deserializer.deserialize(v) for k, v in wire.items()}
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[set]:
+    """Parse ?fields=a,b into the set of fields to include"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return requested
+
+
+def serialize_items(items: List[Dict[str, Any]], model: Type[BaseModel], fields: Optional[str]) -> List[Dict[str, Any]]:
+    """Validate a list of DynamoDB items against a schema and dump the selected fields"""
+    include = parse_fields(fields, model)
+    try:
+        validated = _list_adapters[model].validate_python(items)
+    except ValidationError as e:
+        logger.error(f"Invalid {model.__name__} data from DynamoDB: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Stored data failed validation"
+        )
+    return [item.model_dump(include=include) for item in validated]
+
+
+def page_response(items, model, fields, last_key):
+    return {
+        "items": serialize_items(items, model, fields),
+        "next_cursor": encode_cursor(last_key),
+    }
+
+
+@router.get("/movies", name="api_browse_movies")
+async def api_browse_movies(
+        genre: Optional[str] = None,
+        min_rating: Optional[int] = Query(None, ge=0, le=10),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None
+):
+    """Browse movies with optional genre or minimum rating filter.
+
+    genre may list several genres separated by commas; they are merged
+    best rated first.
+    """
+    start_key = decode_cursor(cursor)
+    if genre:
+        if start_key is not None and not all(v is None or isinstance(v, dict) for v in start_key.values()):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        items, last_key = await run_in_threadpool(
+            aws_dynamodb.query_movies_by_genres_page, genre.split(","), limit, start_key, min_rating
+        )
+    else:
+        items, last_key = await run_in_threadpool(aws_dynamodb.scan_movies_page, limit, start_key, min_rating)
+    return page_response(items, MovieOut, fields, last_key)
+
+
+@router.get("/movies/{movie_id}", name="api_movie")
+async def api_movie(movie_id: str, fields: Optional[str] = None):
+    """Get a single movie"""
+    movie = await run_in_threadpool(aws_dynamodb.get_movie, movie_id)
+    if not movie:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    return serialize_items([movie], MovieOut, fields)[0]
+
+
+@router.get("/movies/{movie_id}/comments", name="api_movie_comments")
+async def api_movie_comments(
+        movie_id: str,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None
+):
+    """List comments on a movie, newest first"""
+    items, last_key = await run_in_threadpool(
+        aws_dynamodb.get_comments_by_movie_page, movie_id, limit, decode_cursor(cursor)
+    )
+    return page_response(items, CommentOut, fields, last_key)
+
+
+@router.get("/movies/{movie_id}/ratings", name="api_movie_ratings")
+async def api_movie_ratings(
+        movie_id: str,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None
+):
+    """List individual ratings for a movie"""
+    items, last_key = await run_in_threadpool(
+        aws_dynamodb.get_ratings_by_movie_page, movie_id, limit, decode_cursor(cursor)
+    )
+    return page_response(items, RatingOut, fields, last_key)
+
+
+@router.get("/movies/{movie_id}/ratings/summary", name="api_movie_rating_summary")
+async def api_movie_rating_summary(movie_id: str):
+    """Get the rating average, count and distribution for a movie"""
+    summary = await run_in_threadpool(aws_dynamodb.get_movie_ratings, movie_id)
+    return RatingSummaryOut(**summary).model_dump()
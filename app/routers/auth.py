@@ -1,29 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form, Request
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt
 from datetime import datetime, timedelta, timezone
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 
-from app.dependencies import get_db
-from app.models.user import User, create_user
+from app.templating import templates
+from app.dependencies import get_async_db
+from app.models.user import get_user_by_username_async, create_user_async, update_user_async
 from app.config import SECRET_KEY
-
-templates = Jinja2Templates(directory="app/templates")
+from app.utils.password_hashing import hash_password, verify_password
 
 router = APIRouter(
     prefix="/auth",
     tags=["auth"],
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await hash_password(password)
 
 
 def create_access_token(data: dict):
@@ -44,20 +41,20 @@ async def register_submit(
         username: str = Form(...),
         email: str = Form(...),
         password: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    existing_user = db.query(User).filter(User.username == username).first()
+    existing_user = await get_user_by_username_async(db, username)
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
     # Create new user
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash(password)
     user_data = {
         "username": username,
         "email": email,
         "hashed_password": hashed_password
     }
-    new_user = create_user(db, user_data)
+    new_user = await create_user_async(db, user_data)
 
     return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -72,12 +69,20 @@ async def login_submit(
         request: Request,
         username: str = Form(...),
         password: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = db.query(User).filter(User.username == username).first()
-    if not db_user or not pwd_context.verify(password, db_user.hashed_password):
+    db_user = await get_user_by_username_async(db, username)
+    if not db_user:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+
+    valid, new_hash = await verify_password(password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
+    # Upgrade hashes created with an older cost factor
+    if new_hash:
+        await update_user_async(db, db_user.id, {"hashed_password": new_hash})
+
     access_token = create_access_token(data={"sub": db_user.username})
     response = RedirectResponse(url="/", status_code=status.HTTP_302_FOUND)
     response.set_cookie(
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta, timezone
+from typing import Optional
+import asyncio
 import logging
 
+from app.templating import templates
 from app.dependencies import get_db
-from app.utils import aws_dynamodb
+from app.config import COMMENT_EVENTS_KEEPALIVE_SECONDS, COMMENT_THREADS_PAGE_SIZE, MAX_COMMENT_DEPTH
+from app.utils import aws_dynamodb, capacity, comment_events, counter_buffer, http_caching
+from app.utils.data_loader import get_loaders
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,7 +23,9 @@ router = APIRouter(
     tags=["comments"],
 )
 
-templates = Jinja2Templates(directory="app/templates")
+
+def is_htmx(request: Request) -> bool:
+    return request.headers.get("HX-Request") == "true"
 
 
 @router.post("/add", name="add_comment")
@@ -26,9 +33,10 @@ async def add_comment(
         request: Request,
         movie_id: str = Form(...),
         content: str = Form(...),
+        parent_id: Optional[str] = Form(None),
         db: Session = Depends(get_db)
 ):
-    """Add a new comment to a movie"""
+    """Add a new comment to a movie, or a reply when parent_id is given"""
     if not request.state.current_user:
         return RedirectResponse(
             url="/auth/login",
@@ -36,17 +44,26 @@ async def add_comment(
         )
 
     try:
+        capacity.check_user_write(request.state.current_user.id, "comment")
         # Add comment to DynamoDB
-        aws_dynamodb.add_comment(
+        await run_in_threadpool(
+            aws_dynamodb.add_comment,
             movie_id=movie_id,
             user_id=int(request.state.current_user.id),  # Explicitly convert to int
-            content=content
+            content=content,
+            parent_id=parent_id or None
         )
+        counter_buffer.record_comment(movie_id)
 
+        # htmx callers get the new comment over the event stream
+        if is_htmx(request):
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
         return RedirectResponse(
             url=f"/movies/{movie_id}",
             status_code=status.HTTP_302_FOUND
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -58,20 +75,27 @@ async def add_comment(
 async def get_movie_comments(
         request: Request,
         movie_id: str,
+        before: Optional[str] = None,
         db: Session = Depends(get_db)
 ):
-    """Get all comments for a movie"""
+    """Get a page of comment threads for a movie, or with before, just the next page of threads"""
     try:
-        comments = aws_dynamodb.get_comments_by_movie(movie_id)
-        return templates.TemplateResponse(
-            "partials/comments_list.html",
+        comments, next_cursor = await get_loaders(request).comment_threads(movie_id, COMMENT_THREADS_PAGE_SIZE, before)
+        return http_caching.conditional_template_response(
+            request,
+            "comment_threads.html" if before else "comments_list.html",
             {
                 "request": request,
-                "comments": comments,
+                "threads": aws_dynamodb.nest_comments(comments),
+                "next_cursor": next_cursor,
+                "max_comment_depth": MAX_COMMENT_DEPTH,
                 "current_user": request.state.current_user,
                 "movie_id": movie_id,
                 "now": datetime.now(timezone.utc)
-            }
+            },
+            comments,
+            http_caching.cache_control_for(request),
+            http_caching.editable_comment_ids(comments, request.state.current_user)
         )
     except Exception as e:
         raise HTTPException(
@@ -80,6 +104,84 @@ async def get_movie_comments(
         )
 
 
+@router.get("/{comment_id}/thread", response_class=HTMLResponse, name="comment_thread")
+async def get_comment_thread(
+        request: Request,
+        comment_id: str,
+        db: Session = Depends(get_db)
+):
+    """Get a comment with all of its replies"""
+    comments = await run_in_threadpool(aws_dynamodb.get_comment_subtree, comment_id)
+    if not comments:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return http_caching.conditional_template_response(
+        request,
+        "comment_threads.html",
+        {
+            "request": request,
+            "threads": aws_dynamodb.nest_comments(comments),
+            "next_cursor": None,
+            "max_comment_depth": MAX_COMMENT_DEPTH,
+            "current_user": request.state.current_user,
+            "movie_id": comments[0]["movie_id"],
+            "now": datetime.now(timezone.utc)
+        },
+        comments,
+        http_caching.cache_control_for(request),
+        http_caching.editable_comment_ids(comments, request.state.current_user)
+    )
+
+
+def render_comment_event(request: Request, event: dict) -> str:
+    """Format a comment change as an SSE message of out-of-band swaps for the page"""
+    comment = event['comment']
+    if event['change'] == 'deleted':
+        html = f'<div id="comment-{comment["id"]}" hx-swap-oob="true" class="hidden"></div>'
+    else:
+        html = templates.get_template("comment_item.html").render(
+            request=request,
+            comment=comment,
+            current_user=request.state.current_user,
+            max_comment_depth=MAX_COMMENT_DEPTH,
+            now=datetime.now(timezone.utc),
+            # An update replaces only the comment itself, leaving its replies in place
+            body_only=event['change'] == 'updated',
+            oob=event['change'] == 'updated'
+        )
+        if event['change'] == 'added':
+            # Replies go last under their parent, new threads first
+            if comment.get('parent_id'):
+                html = f'<div id="replies-{comment["parent_id"]}" hx-swap-oob="beforeend">{html}</div>'
+            else:
+                html = f'<div id="comment-threads" hx-swap-oob="afterbegin">{html}</div>'
+    data = "".join(f"data: {line}\n" for line in html.splitlines())
+    return f"event: comment\n{data}\n"
+
+
+@router.get("/movie/{movie_id}/events", name="movie_comment_events")
+async def movie_comment_events(request: Request, movie_id: str):
+    """Stream comment changes for a movie as server-sent events"""
+    async def stream():
+        with comment_events.hub.subscribe(movie_id) as queue:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), COMMENT_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # Keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield render_comment_event(request, event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/user/{user_id}", response_class=HTMLResponse, name="user_comments")
 async def get_user_comments(
         request: Request,
@@ -177,7 +279,10 @@ async def edit_comment(
 
         # Update the comment
         logger.debug(f"Updating comment with new content: {content}")
+        capacity.check_user_write(request.state.current_user.id, "comment")
         aws_dynamodb.update_comment(comment_id, content)
+        if is_htmx(request):
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
 
         # Determine return URL
         referrer = request.headers.get("referer", "")
@@ -236,7 +341,10 @@ async def delete_comment(
             )
 
         # Delete the comment
+        capacity.check_user_write(request.state.current_user.id, "comment")
         aws_dynamodb.delete_comment(comment_id)
+        if is_htmx(request):
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
 
         return RedirectResponse(
             url=f"/movies/{comment['movie_id']}",
@@ -1,20 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Request
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, status, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from uuid import uuid4
-from typing import Optional
+from datetime import datetime, timezone
+from typing import List, Optional
+import asyncio
+import logging
 
+from app.templating import templates
 from app.dependencies import get_db
-from app.utils import aws_s3, aws_dynamodb
+from app.config import COMMENT_THREADS_PAGE_SIZE, MAX_COMMENT_DEPTH
+from app.utils import aws_s3, aws_dynamodb, capacity, catalog, counter_buffer, http_caching, search_index, suggest_index
+from app.utils.data_loader import get_loaders
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/movies",
     tags=["movies"],
 )
 
-templates = Jinja2Templates(directory="app/templates")
-
 
 @router.get("/upload", response_class=HTMLResponse, name="upload_movie")
 async def upload_movie_page(request: Request):
@@ -45,6 +53,9 @@ async def upload_movie(
         movie_id = str(uuid4())
         s3_key = f"movies/{movie_id}/{file.filename}"
 
+        # Turn the upload away before storing anything if DynamoDB has no capacity for it
+        aws_dynamodb.admit_movie_write()
+
         # Upload to S3
         await aws_s3.upload_movie(file.file, s3_key)
 
@@ -59,12 +70,15 @@ async def upload_movie(
             "user_id": request.state.current_user.id,
             "s3_key": s3_key,
         }
-        aws_dynamodb.put_movie(movie_data)
+        # The file is already in S3, so wait for capacity rather than orphan it
+        await run_in_threadpool(aws_dynamodb.put_movie, movie_data, wait=True)
 
         return RedirectResponse(
             url=f"/movies/{movie_id}",
             status_code=status.HTTP_302_FOUND
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -75,26 +89,40 @@ async def upload_movie(
 @router.get("/browse", response_class=HTMLResponse, name="browse_movies")
 async def browse_movies(
         request: Request,
-        genre: Optional[str] = None,
+        genre: List[str] = Query([]),
         min_rating: Optional[str] = None,  # Change to str to handle empty strings
         db: Session = Depends(get_db)
 ):
-    """Browse movies with optional filters"""
+    """Browse movies with optional filters, best rated first"""
+    genres = [g for g in genre if g and g.strip()]
+    try:
+        rating_value = int(min_rating) if min_rating and min_rating.strip() else None
+    except ValueError:
+        rating_value = None  # Invalid rating value, don't filter on it
+
     try:
-        # Initialize empty movies list
-        movies = []
-
-        # Get movies based on filters
-        if genre and genre.strip():
-            movies = aws_dynamodb.query_movies_by_genre(genre)
-        elif min_rating and min_rating.strip():  # Check if min_rating is not empty
-            try:
-                rating_value = int(min_rating)
-                movies = aws_dynamodb.query_movies_by_rating(rating_value)
-            except ValueError:
-                movies = aws_dynamodb.scan_movies()  # Invalid rating value, show all movies
-        else:
-            movies = aws_dynamodb.scan_movies()  # Get all movies if no filters
+        # Serve from the in-memory snapshot when it is enabled and fresh enough
+        movies = catalog.browse(genres, rating_value)
+        # DynamoDB reads run in the threadpool; identical concurrent ones share one call
+        if movies is None:
+            if genres:
+                # Already merged best rated first from GenreRatingIndex
+                movies = await run_in_threadpool(aws_dynamodb.query_movies_by_genres, genres, rating_value)
+            else:
+                if rating_value is not None:
+                    movies = await run_in_threadpool(aws_dynamodb.query_movies_by_rating, rating_value)
+                else:
+                    movies = await run_in_threadpool(aws_dynamodb.scan_movies)  # Get all movies if no filters
+                movies = sorted(movies, key=lambda m: m.get('rating', 0) if isinstance(m, dict) else 0, reverse=True)
+
+        # One cached read; a failure only hides the counts
+        try:
+            genre_counts = catalog.genre_counts()
+            if genre_counts is None:
+                genre_counts = await run_in_threadpool(aws_dynamodb.get_genre_counts)
+        except Exception as e:
+            logger.error(f"Failed to load genre counts: {e}")
+            genre_counts = {}
 
         # Validate movie data
         validated_movies = []
@@ -109,20 +137,28 @@ async def browse_movies(
                     'rating': int(movie.get('rating', 0)),
                     'user_id': movie.get('user_id'),
                     'release_time': movie.get('release_time', ''),
-                    's3_key': movie.get('s3_key', '')
+                    's3_key': movie.get('s3_key', ''),
+                    'comment_count': int(movie.get('comment_count', 0)),
+                    'version': int(movie.get('version', 0)),
+                    'updated_at': movie.get('updated_at', '')
                 }
                 validated_movies.append(validated_movie)
 
-        return templates.TemplateResponse(
+        return http_caching.conditional_template_response(
+            request,
             "movie_browse.html",
             {
                 "request": request,
                 "current_user": request.state.current_user,
                 "movies": validated_movies,
-                "selected_genre": genre,
+                "selected_genres": [aws_dynamodb.normalize_genre(g) for g in genres],
+                "genre_counts": genre_counts,
                 "min_rating": min_rating if min_rating and min_rating.strip() else None,
                 "error": None
-            }
+            },
+            validated_movies,
+            http_caching.cache_control_for(request, max_age=30),
+            sorted(genre_counts.items())
         )
     except Exception as e:
         return templates.TemplateResponse(
@@ -131,13 +167,43 @@ async def browse_movies(
                 "request": request,
                 "current_user": request.state.current_user,
                 "movies": [],
-                "selected_genre": genre,
+                "selected_genres": [aws_dynamodb.normalize_genre(g) for g in genres],
+                "genre_counts": {},
                 "min_rating": min_rating if min_rating and min_rating.strip() else None,
                 "error": "An error occurred while fetching movies."
             }
         )
 
 
+@router.get("/search", response_class=HTMLResponse, name="search_movies")
+async def search_movies(
+        request: Request,
+        q: str = "",
+        limit: int = 20
+):
+    """Search movies by title or director"""
+    movies = search_index.index.search(q, limit=max(1, min(limit, 100))) if q.strip() else []
+    return templates.TemplateResponse(
+        "movie_search.html",
+        {
+            "request": request,
+            "current_user": request.state.current_user,
+            "movies": movies,
+            "query": q
+        }
+    )
+
+
+@router.get("/suggest", response_class=ORJSONResponse, name="suggest_movies")
+async def suggest_movies(q: str = "", limit: int = suggest_index.TOP_K):
+    """Typeahead suggestions for titles, directors and genres"""
+    limit = max(1, min(limit, suggest_index.MAX_LIMIT))
+    return ORJSONResponse(
+        {"query": q, "suggestions": suggest_index.index.suggest(q, limit)},
+        headers={"Cache-Control": "public, max-age=60"}
+    )
+
+
 @router.get("/{movie_id}", response_class=HTMLResponse, name="movie_detail")
 async def movie_detail(
         request: Request,
@@ -145,21 +211,34 @@ async def movie_detail(
         db: Session = Depends(get_db)
 ):
     """Show movie details page"""
-    movie = aws_dynamodb.get_movie(movie_id)
+    # Fetch the movie and its first page of comment threads concurrently
+    loaders = get_loaders(request)
+    movie, (comments, next_cursor) = await asyncio.gather(
+        loaders.movie(movie_id),
+        loaders.comment_threads(movie_id, COMMENT_THREADS_PAGE_SIZE)
+    )
     if not movie:
         raise HTTPException(status_code=404, detail="Movie not found")
+    counter_buffer.record_view(movie_id)
 
-    # Get comments for the movie
-    comments = aws_dynamodb.get_comments_by_movie(movie_id)
-
-    return templates.TemplateResponse(
+    return http_caching.conditional_template_response(
+        request,
         "movie_detail.html",
         {
             "request": request,
             "current_user": request.state.current_user,
             "movie": movie,
-            "comments": comments
-        }
+            "threads": aws_dynamodb.nest_comments(comments),
+            "next_cursor": next_cursor,
+            "max_comment_depth": MAX_COMMENT_DEPTH,
+            "now": datetime.now(timezone.utc)
+        },
+        [movie] + comments,
+        http_caching.cache_control_for(request, max_age=30),
+        http_caching.editable_comment_ids(comments, request.state.current_user),
+        # Counter updates do not bump the movie's version
+        int(movie.get('view_count', 0)),
+        int(movie.get('download_count', 0))
     )
 
 
@@ -175,11 +254,15 @@ async def rate_movie(
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_302_FOUND)
 
     try:
-        aws_dynamodb.add_rating(movie_id, request.state.current_user.id, rating)
+        capacity.check_user_write(request.state.current_user.id, "rating")
+        await run_in_threadpool(aws_dynamodb.add_rating, movie_id, request.state.current_user.id, rating)
+        counter_buffer.record_rating(movie_id)
         return RedirectResponse(
             url=f"/movies/{movie_id}",
             status_code=status.HTTP_302_FOUND
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -228,7 +311,8 @@ async def edit_movie_submit(
     if not request.state.current_user:
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_302_FOUND)
 
-    movie = aws_dynamodb.get_movie(movie_id)
+    loaders = get_loaders(request)
+    movie = await loaders.movie(movie_id)
     if not movie:
         raise HTTPException(status_code=404, detail="Movie not found")
 
@@ -242,11 +326,14 @@ async def edit_movie_submit(
             "director": director,
             "release_time": release_time
         }
-        aws_dynamodb.update_movie(movie_id, updated_data)
+        updated_movie = aws_dynamodb.update_movie(movie_id, updated_data)
+        loaders.movies.prime(movie_id, updated_movie)
         return RedirectResponse(
             url=f"/movies/{movie_id}",
             status_code=status.HTTP_302_FOUND
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -272,12 +359,17 @@ async def delete_movie(
         raise HTTPException(status_code=403, detail="Not authorized to delete this movie")
 
     try:
-        aws_s3.delete_movie(movie['s3_key'])
+        # The DynamoDB delete can be turned away for capacity, so it goes before the file
         aws_dynamodb.delete_movie(movie_id)
+        aws_s3.delete_movie(movie['s3_key'])
+        # Comments and ratings go in the background; see movie_cleanup_status
+        await run_in_threadpool(aws_dynamodb.start_cascade_delete, movie_id, movie['user_id'])
         return RedirectResponse(
             url="/movies/browse",
             status_code=status.HTTP_302_FOUND
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -285,6 +377,33 @@ async def delete_movie(
         )
 
 
+@router.get("/{movie_id}/cleanup", name="movie_cleanup_status")
+async def movie_cleanup_status(
+        request: Request,
+        movie_id: str
+):
+    """Progress of deleting a deleted movie's comments and ratings"""
+    if not request.state.current_user:
+        return RedirectResponse(url="/auth/login", status_code=status.HTTP_302_FOUND)
+
+    cascade = await run_in_threadpool(aws_dynamodb.get_cascade_status, movie_id)
+    if not cascade:
+        raise HTTPException(status_code=404, detail="No cleanup for this movie")
+    if int(cascade['user_id']) != request.state.current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this cleanup")
+
+    return ORJSONResponse({
+        "movie_id": movie_id,
+        "status": cascade['status'],
+        "comments_deleted": int(cascade.get('comments_deleted', 0)),
+        "ratings_deleted": int(cascade.get('ratings_deleted', 0)),
+        "started_at": cascade.get('started_at'),
+        "updated_at": cascade.get('updated_at'),
+        "finished_at": cascade.get('finished_at'),
+        "error": cascade.get('last_error'),
+    })
+
+
 @router.get("/{movie_id}/download")
 async def download_movie(
         request: Request,
@@ -299,6 +418,7 @@ async def download_movie(
     if not movie:
         raise HTTPException(status_code=404, detail="Movie not found")
 
+    counter_buffer.record_download(movie_id)
     try:
         download_url = aws_s3.get_presigned_url(movie['s3_key'])
         return RedirectResponse(url=download_url)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
+from typing import Optional
 
 
 # User Schemas
@@ -67,10 +68,14 @@ class CommentUpdate(BaseModel):
 
 
 class CommentOut(CommentBase):
-    id: int
+    id: str
     user_id: int
     movie_id: str
     timestamp: datetime
+    parent_id: Optional[str] = None
+    depth: int = 0
+    reply_count: int = 0
+    deleted: bool = False
 
     class Config:
         orm_mode = True
@@ -86,9 +91,14 @@ class RatingCreate(RatingBase):
 
 
 class RatingOut(RatingBase):
-    id: int
     user_id: int
     movie_id: str
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class RatingSummaryOut(BaseModel):
+    average: float
+    count: int
+    distribution: dict[str, int]
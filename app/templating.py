@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, pass_environment
+from markupsafe import Markup
+import logging
+
+from app.assets import asset_url, load_manifest
+from app.utils.fragment_cache import FragmentCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Read straight from the environment rather than app.config so the
+# deployment build can precompile templates without Parameter Store access
+TEMPLATE_DIR = os.getenv("TEMPLATE_DIR", "app/templates")
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "app/.jinja_cache")
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "false").lower() == "true"
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "5000"))
+
+fragment_cache = FragmentCache(max_entries=FRAGMENT_CACHE_SIZE)
+
+
+def to_datetime(value):
+    if isinstance(value, datetime):
+        # Make sure datetime is timezone-aware
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+    try:
+        # Parse ISO format string and ensure timezone awareness
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt
+    except (ValueError, AttributeError):
+        return datetime.fromtimestamp(0, tz=timezone.utc)
+
+
+def format_datetime(value):
+    dt = to_datetime(value)
+    return dt.strftime('%Y-%m-%d %H:%M:%S %Z')
+
+
+@pass_environment
+def cached_fragment(env, template_name, item):
+    """Render a fragment for one item, reusing it until the item's version changes.
+
+    Fragments are rendered without the request, so they must not contain
+    anything user-specific.
+    """
+    key = (template_name, item.get('id'), int(item.get('version', 0)))
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(env.get_template(template_name).render(item=item))
+        fragment_cache.set(key, html)
+    return html
+
+
+def create_environment(
+        template_dir: str = TEMPLATE_DIR,
+        cache_dir: str = TEMPLATE_CACHE_DIR,
+        auto_reload: bool = TEMPLATE_AUTO_RELOAD
+) -> Environment:
+    """Create the Jinja2 environment shared by every router"""
+    os.makedirs(cache_dir, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(template_dir),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        auto_reload=auto_reload,
+        autoescape=True,
+    )
+    env.filters["to_datetime"] = to_datetime
+    env.filters["format_datetime"] = format_datetime
+    env.globals["cached_fragment"] = cached_fragment
+    env.globals["asset_url"] = asset_url
+    return env
+
+
+def template_fingerprint(template_dir: str = TEMPLATE_DIR, manifest: Optional[Dict[str, str]] = None) -> str:
+    """Hash the template sources and the asset manifest so page ETags change
+    when a deploy changes markup, or only the hashed CSS/JS pages link to"""
+    digest = hashlib.sha1()
+    if manifest is None:
+        manifest = load_manifest()
+    digest.update(json.dumps(manifest, sort_keys=True).encode())
+    for root, dirs, files in sorted(os.walk(template_dir)):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def precompile_templates(env: Environment) -> int:
+    """Compile every template into the bytecode cache and the in-memory cache"""
+    count = 0
+    for name in env.list_templates(extensions=["html"]):
+        try:
+            env.get_template(name)
+            count += 1
+        except Exception as e:
+            logger.error(f"Failed to precompile template {name}: {e}")
+    logger.info(f"Precompiled {count} templates")
+    return count
+
+
+templates = Jinja2Templates(env=create_environment())
+TEMPLATE_FINGERPRINT = template_fingerprint()
+
+
+if __name__ == "__main__":
+    precompile_templates(templates.env)
@@ -1,51 +1,606 @@
+import contextvars
+import heapq
+import itertools
+import secrets
+import threading
+import time
+
 import boto3
 from boto3.dynamodb.conditions import Key
 from datetime import datetime, timezone
+from decimal import Decimal
 from fastapi import HTTPException, status
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import logging
 
-from app.config import DYNAMODB_TABLE
+from app.config import (
+    DYNAMODB_TABLE, DYNAMODB_SCAN_SEGMENTS, DYNAMODB_QUERY_THREADS, GENRE_COUNTS_CACHE_SECONDS,
+    TRENDING_HALF_LIFE_HOURS, TRENDING_REFRESH_SECONDS, TRENDING_LIMIT, MAX_COMMENT_DEPTH,
+    CASCADE_LEASE_SECONDS, CASCADE_RESUME_SECONDS
+)
+from app.utils import capacity, metrics
+from app.utils.single_flight import single_flight, invalidate_flights
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Operations that accept ReturnConsumedCapacity
+CONSUMED_CAPACITY_OPERATIONS = {
+    'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+    'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems'
+}
+
+
+def _request_consumed_capacity(params: Dict[str, Any], model, **kwargs) -> None:
+    if model.name in CONSUMED_CAPACITY_OPERATIONS:
+        params.setdefault('ReturnConsumedCapacity', 'INDEXES')
+
+
+def _account_consumed_capacity(parsed: Dict[str, Any], model, **kwargs) -> None:
+    consumed = parsed.get('ConsumedCapacity')
+    if consumed:
+        capacity.account(model.name, consumed)
+
+
+def _instrument(resource):
+    """Have every call made through resource report and account its consumed capacity"""
+    events = resource.meta.client.meta.events
+    events.register('provide-client-params.dynamodb', _request_consumed_capacity)
+    events.register('after-call.dynamodb', _account_consumed_capacity)
+    return resource
+
+
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = _instrument(boto3.resource('dynamodb'))
 movies_table = dynamodb.Table(f"{DYNAMODB_TABLE}-movies")
 comments_table = dynamodb.Table(f"{DYNAMODB_TABLE}-comments")
 ratings_table = dynamodb.Table(f"{DYNAMODB_TABLE}-ratings")
+stats_table = dynamodb.Table(f"{DYNAMODB_TABLE}-stats")
+
+dynamodb = _instrument(boto3.resource("dynamodb"))
+
+# Callbacks run after movie writes so in-process indexes can stay current
+_movie_put_listeners: List[Callable[[Dict[str, Any]], None]] = []
+_movie_delete_listeners: List[Callable[[str], None]] = []
+# Callbacks run after comment writes, with 'added', 'updated' or 'deleted'
+_comment_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+# Movies by genre, best rated first; rating is the sort key
+GENRE_RATING_INDEX = 'GenreRatingIndex'
+
+# Runs scan segments and per-genre queries. Nothing submitted to it submits
+# more work, so sharing one pool cannot deadlock.
+_executor = ThreadPoolExecutor(max_workers=DYNAMODB_QUERY_THREADS, thread_name_prefix="dynamodb")
+
+# Comments of a movie in thread order. path is the materialized path of the
+# comment: one fixed-width, time-ordered segment per level joined with '/',
+# so sorting by path lists every thread depth first and a subtree is the
+# range of paths beginning with its root's.
+THREAD_INDEX = 'ThreadIndex'
+
+# Stats item holding one counter attribute per genre
+GENRE_COUNTS_ID = 'genre_counts'
+# Stats items tracking the cleanup of a deleted movie's comments and ratings
+CASCADE_ID_PREFIX = 'cascade#'
+CASCADE_PAGE_SIZE = 100
+# Identifies this worker as the holder of a cleanup's lease
+_cascade_owner = secrets.token_hex(8)
+# BatchWriteItem takes at most 25 requests
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_ATTEMPTS = 8
+_genre_counts_lock = threading.Lock()
+_genre_counts: Optional[Dict[str, int]] = None
+_genre_counts_loaded_at = 0.0
+
+# Trending scores use the decayed-counter trick: an event adds
+# weight * 2 ** (half-lives since a fixed start), so comparing stored counters
+# compares decayed scores and nothing is rewritten as time passes. Time is cut
+# into generations of TRENDING_GENERATION_HALF_LIVES half-lives, each with its
+# own start, to keep the counters small; a movie's first event in a new
+# generation carries its counter over, rescaled. Movies with no events for a
+# whole generation drop out of the feed.
+TRENDING_INDEX = 'TrendingIndex'
+TRENDING_GENERATION_HALF_LIVES = 8
+TRENDING_WEIGHTS = {'download': 1, 'comment': 2, 'rating': 3}
+_trending_lock = threading.Lock()
+_trending: Dict[int, Tuple[float, List[Dict[str, Any]]]] = {}
+
+
+def register_movie_listener(on_put: Optional[Callable[[Dict[str, Any]], None]] = None,
+                            on_delete: Optional[Callable[[str], None]] = None) -> None:
+    """Register callbacks for movie writes made through this module"""
+    if on_put:
+        _movie_put_listeners.append(on_put)
+    if on_delete:
+        _movie_delete_listeners.append(on_delete)
+
+
+def _notify_movie_put(movie: Optional[Dict[str, Any]]) -> None:
+    if not movie:
+        return
+    for listener in _movie_put_listeners:
+        try:
+            listener(movie)
+        except Exception as e:
+            logger.error(f"Movie put listener failed for {movie.get('id')}: {e}")
+
+
+def _notify_movie_deleted(movie_id: str) -> None:
+    for listener in _movie_delete_listeners:
+        try:
+            listener(movie_id)
+        except Exception as e:
+            logger.error(f"Movie delete listener failed for {movie_id}: {e}")
+
+
+def register_comment_listener(listener: Callable[[str, Dict[str, Any]], None]) -> None:
+    """Register a callback for comment writes made through this module"""
+    _comment_listeners.append(listener)
+
+
+def _movie_comments_scope(movie_id: str, *args, **kwargs) -> Tuple[str, str]:
+    return ('movie_comments', movie_id)
+
+
+def _user_comments_scope(user_id: int) -> Tuple[str, int]:
+    return ('user_comments', int(user_id))
+
+
+def _notify_comment(change: str, comment: Optional[Dict[str, Any]]) -> None:
+    if not comment:
+        return
+    # The writer's next read, typically the page it is redirected to, must see this
+    invalidate_flights(_movie_comments_scope(comment['movie_id']))
+    if comment.get('user_id') is not None:
+        invalidate_flights(_user_comments_scope(comment['user_id']))
+    for listener in _comment_listeners:
+        try:
+            listener(change, comment)
+        except Exception as e:
+            logger.error(f"Comment listener failed for {comment.get('id')}: {e}")
+
+
+def _admit(table, priority: str, wait: bool = False) -> None:
+    """Raise CapacityExceeded unless the limiter admits a write to table, or with wait=True sleep until it does"""
+    delay = capacity.limiter.admit(table.name, priority)
+    if delay > 0:
+        if not wait:
+            metrics.increment(f"capacity.rejected.{priority}")
+            raise capacity.CapacityExceeded(delay)
+        metrics.increment(f"capacity.delayed.{priority}")
+        time.sleep(delay)
+
+
+def admit_movie_write() -> None:
+    """Turn a user's movie write away now, before side effects such as an S3 upload that it would orphan"""
+    _admit(movies_table, capacity.HIGH)
+
+
+def _write(table, operation: str, priority: Optional[str] = capacity.HIGH, wait: bool = False,
+           **kwargs) -> Dict[str, Any]:
+    """Run put_item, update_item or delete_item on table within its write capacity.
+
+    The write is admitted by the capacity limiter first: turned away with
+    CapacityExceeded (a 429), or with wait=True delayed until there is
+    capacity, as batch jobs prefer. priority=None skips admission, for
+    follow-up writes that should not fail once the write they complete has
+    succeeded. Either way the capacity consumed is recorded.
+    """
+    if priority is not None:
+        _admit(table, priority, wait)
+    try:
+        response = getattr(table, operation)(ReturnConsumedCapacity='INDEXES', **kwargs)
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        # Failed conditions still consume capacity but do not report it
+        capacity.limiter.charge(table.name, 1)
+        raise
+    except dynamodb.meta.client.exceptions.ProvisionedThroughputExceededException:
+        # boto3 has already retried; back off everything writing to the table
+        capacity.limiter.throttled(table.name)
+        metrics.increment("capacity.throttled")
+        raise capacity.CapacityExceeded(capacity.limiter.admit(table.name))
+    capacity.limiter.record(response.get('ConsumedCapacity'))
+    return response
+
+
+class _ClientTable:
+    """The reads of a Table, made through the resource's client for use from executor threads.
+
+    boto3 resources are not thread-safe but clients are. This one keeps the
+    resource's conversions (conditions in, plain Python items out) and its
+    capacity instrumentation.
+    """
+
+    def __init__(self, table_name: str):
+        self.name = table_name
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        return dynamodb.meta.client.query(TableName=self.name, **kwargs)
+
+    def scan(self, **kwargs) -> Dict[str, Any]:
+        return dynamodb.meta.client.scan(TableName=self.name, **kwargs)
+
+
+def _in_caller_context(func: Callable[..., Any]) -> Callable[..., Any]:
+    """func for an executor, run in a copy of the caller's context so its capacity is charged to the caller"""
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(func, *args)
+
+
+def normalize_genre(genre: Optional[str]) -> Optional[str]:
+    """Canonical spelling of a genre, so "drama " and "Drama" share an index partition"""
+    if genre is None:
+        return None
+    # Each word and each part of a hyphenated one is capitalized, so "sci-fi"
+    # becomes "Sci-Fi"; str.title() would also turn "children's" into "Children'S"
+    return " ".join(
+        "-".join(part[:1].upper() + part[1:].lower() for part in word.split("-"))
+        for word in str(genre).split()
+    )
+
+
+@capacity.accounted
+def parallel_scan(table_name: str, total_segments: int = DYNAMODB_SCAN_SEGMENTS, **kwargs) -> List[Dict[str, Any]]:
+    """Scan a whole table with several segments read concurrently"""
+    def scan_segment(segment: int) -> List[Dict[str, Any]]:
+        table = _ClientTable(table_name)
+        scan_kwargs = {**kwargs, 'Segment': segment, 'TotalSegments': total_segments}
+        items = []
+        while True:
+            response = table.scan(**scan_kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    try:
+        segments = list(_executor.map(_in_caller_context(scan_segment), range(total_segments)))
+        return [item for segment_items in segments for item in segment_items]
+    except Exception as e:
+        logger.error(f"Error running parallel scan of {table_name}: {e}")
+        raise
+
+
+@single_flight
+@capacity.accounted
+def parallel_scan_movies() -> List[Dict[str, Any]]:
+    """Get all movies using a parallel scan"""
+    return parallel_scan(movies_table.name)
+
 
-dynamodb = boto3.resource("dynamodb")
+def _adjust_genre_counts(old_genre: Optional[str], new_genre: Optional[str]) -> None:
+    """Move one movie between genre counters with a single atomic update"""
+    if old_genre == new_genre:
+        return
+    deltas = {genre: delta for genre, delta in ((old_genre, -1), (new_genre, 1)) if genre}
+    names = {f"#g{i}": genre for i, genre in enumerate(deltas)}
+    values = {f":d{i}": delta for i, delta in enumerate(deltas.values())}
+    try:
+        _write(
+            stats_table, 'update_item', priority=None,
+            Key={'id': GENRE_COUNTS_ID},
+            UpdateExpression="ADD " + ", ".join(f"#g{i} :d{i}" for i in range(len(deltas))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        # The movie write already succeeded; recount_genres() repairs drift
+        logger.error(f"Error updating genre counts {deltas}: {e}")
+        return
+
+    with _genre_counts_lock:
+        if _genre_counts is not None:
+            for genre, delta in deltas.items():
+                _genre_counts[genre] = _genre_counts.get(genre, 0) + delta
+
+
+@capacity.accounted
+def get_genre_counts() -> Dict[str, int]:
+    """Number of movies per genre, cached in process for GENRE_COUNTS_CACHE_SECONDS"""
+    global _genre_counts, _genre_counts_loaded_at
+    with _genre_counts_lock:
+        if _genre_counts is not None and time.monotonic() - _genre_counts_loaded_at < GENRE_COUNTS_CACHE_SECONDS:
+            return {genre: count for genre, count in _genre_counts.items() if count > 0}
+
+    response = stats_table.get_item(Key={'id': GENRE_COUNTS_ID})
+    item = response.get('Item', {})
+    counts = {genre: int(count) for genre, count in item.items() if genre != 'id'}
+    with _genre_counts_lock:
+        _genre_counts, _genre_counts_loaded_at = counts, time.monotonic()
+    return {genre: count for genre, count in counts.items() if count > 0}
+
+
+@capacity.accounted
+def recount_genres() -> Dict[str, int]:
+    """Rebuild the genre counters from a full scan of the movies table"""
+    global _genre_counts
+    counts: Dict[str, int] = {}
+    for movie in parallel_scan_movies():
+        if movie.get('genre'):
+            counts[movie['genre']] = counts.get(movie['genre'], 0) + 1
+    _write(stats_table, 'put_item', priority=capacity.LOW, wait=True, Item={'id': GENRE_COUNTS_ID, **counts})
+    with _genre_counts_lock:
+        _genre_counts = None
+    logger.info(f"Recounted {len(counts)} genres")
+    return counts
+
+
+def _trending_clock(now: Optional[float] = None) -> Tuple[int, float]:
+    """The current trending generation and the half-lives elapsed since it started"""
+    half_life = TRENDING_HALF_LIFE_HOURS * 3600
+    generation, offset = divmod(time.time() if now is None else now,
+                                half_life * TRENDING_GENERATION_HALF_LIVES)
+    return int(generation), offset / half_life
+
+
+def _trending_number(value: float) -> Decimal:
+    return Decimal(f"{value:.6g}")
+
+
+def trending_weight(event: str, now: Optional[float] = None) -> Tuple[int, float]:
+    """The generation a rating, comment or download falls in and its weight there"""
+    generation, elapsed = _trending_clock(now)
+    return generation, TRENDING_WEIGHTS[event] * 2.0 ** elapsed
+
+
+@capacity.accounted
+def record_trending_event(movie_id: str, event: str, now: Optional[float] = None) -> None:
+    """Count a rating, comment or download towards a movie's trending score.
+
+    Failures are logged rather than raised; the feed is best effort.
+    """
+    add_trending_weight(movie_id, *trending_weight(event, now))
+
+
+@capacity.accounted
+def add_trending_weight(movie_id: str, generation: int, weight: float) -> None:
+    """Add weight, earned in generation, to a movie's trending score.
+
+    Weights from several events in the same generation can be summed and
+    added at once. Failures are logged rather than raised.
+    """
+    conditional_check_failed = dynamodb.meta.client.exceptions.ConditionalCheckFailedException
+    try:
+        for _ in range(3):
+            try:
+                _write(
+                    movies_table, 'update_item', priority=capacity.LOW,
+                    Key={'id': movie_id},
+                    UpdateExpression='ADD trending :w',
+                    ConditionExpression='trending_generation = :g',
+                    ExpressionAttributeValues={':w': _trending_number(weight), ':g': generation}
+                )
+                return
+            except conditional_check_failed:
+                pass
+
+            # First event of this generation for the movie
+            item = movies_table.get_item(
+                Key={'id': movie_id},
+                ProjectionExpression='id, trending, trending_generation',
+                ConsistentRead=True
+            ).get('Item')
+            if item is None:
+                return  # Deleted movie
+            if 'trending_generation' in item:
+                old_generation = int(item['trending_generation'])
+                shift = (old_generation - generation) * TRENDING_GENERATION_HALF_LIVES
+                if old_generation > generation:
+                    # Another server's clock has already moved on to the next generation
+                    weight, generation = weight * 2.0 ** -shift, old_generation
+                    continue
+                carried = float(item.get('trending', 0)) * 2.0 ** shift
+                condition, values = 'trending_generation = :old', {':old': old_generation}
+            else:
+                carried = 0.0
+                condition, values = 'attribute_not_exists(trending_generation)', {}
 
+            try:
+                _write(
+                    movies_table, 'update_item', priority=None,
+                    Key={'id': movie_id},
+                    UpdateExpression='SET trending = :t, trending_generation = :g',
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues={
+                        ':t': _trending_number(carried + weight), ':g': generation, **values
+                    }
+                )
+                return
+            except conditional_check_failed:
+                pass  # Raced with another event for the movie; try again
+        logger.warning(f"Gave up recording trending weight for movie {movie_id}")
+    except capacity.CapacityExceeded:
+        # Not worth a user-facing write's capacity
+        metrics.increment("trending.dropped")
+    except Exception as e:
+        logger.error(f"Error recording trending weight for movie {movie_id}: {e}")
 
-def put_movie(movie_data):
-    movies_table.put_item(Item=movie_data)
 
+@single_flight
+@capacity.accounted
+def query_trending_movies(limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """The hottest movies first, each with trending_score decayed to now.
 
+    Reads the top of the current generation and of the previous one, whose
+    movies have not had an event since and so were never carried over.
+    """
+    generation, elapsed = _trending_clock(now)
+    movies: Dict[str, Dict[str, Any]] = {}
+    try:
+        for g in (generation, generation - 1):
+            response = movies_table.query(
+                IndexName=TRENDING_INDEX,
+                KeyConditionExpression=Key('trending_generation').eq(g),
+                ScanIndexForward=False,
+                Limit=limit
+            )
+            for movie in response.get('Items', []):
+                movie['trending_score'] = float(movie['trending']) * 2.0 ** (
+                    (g - generation) * TRENDING_GENERATION_HALF_LIVES - elapsed)
+                # The index is eventually consistent, so a movie being carried over can show up twice
+                if movie['id'] not in movies or movie['trending_score'] > movies[movie['id']]['trending_score']:
+                    movies[movie['id']] = movie
+        return sorted(movies.values(), key=lambda movie: movie['trending_score'], reverse=True)[:limit]
+    except Exception as e:
+        logger.error(f"Error querying trending movies: {e}")
+        raise
+
+
+def get_trending_movies(limit: int = TRENDING_LIMIT) -> List[Dict[str, Any]]:
+    """Trending movies, cached in process for TRENDING_REFRESH_SECONDS"""
+    with _trending_lock:
+        cached = _trending.get(limit)
+        if cached is not None and time.monotonic() - cached[0] < TRENDING_REFRESH_SECONDS:
+            return list(cached[1])
+
+    movies = query_trending_movies(limit)
+    with _trending_lock:
+        _trending[limit] = (time.monotonic(), movies)
+    return list(movies)
+
+
+@capacity.accounted
+def recount_comments() -> int:
+    """Rebuild every movie's comment_count from a parallel scan of MovieIndex, returning how many changed.
+
+    Comments written while it runs can be miscounted, so run it when traffic is quiet.
+    """
+    counts: Dict[str, int] = {}
+    for comment in parallel_scan(comments_table.name, IndexName='MovieIndex', ProjectionExpression='movie_id'):
+        counts[comment['movie_id']] = counts.get(comment['movie_id'], 0) + 1
+
+    changed = 0
+    for movie in parallel_scan_movies():
+        count = counts.get(movie['id'], 0)
+        if movie.get('comment_count') != count:
+            try:
+                _write(
+                    movies_table, 'update_item', priority=capacity.LOW, wait=True,
+                    Key={'id': movie['id']},
+                    UpdateExpression='SET comment_count = :n ADD version :one',
+                    ConditionExpression='attribute_exists(id)',
+                    ExpressionAttributeValues={':n': count, ':one': 1}
+                )
+                changed += 1
+            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+                pass  # Deleted since the scan
+    logger.info(f"Recounted comments for {changed} movies")
+    return changed
+
+
+@capacity.accounted
+def put_movie(movie_data, wait: bool = False):
+    # version is bumped on every write so cached fragments can be invalidated
+    movie_data = {
+        **movie_data,
+        "genre": normalize_genre(movie_data.get("genre")),
+        "version": int(movie_data.get("version", 0)) + 1,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    response = _write(movies_table, "put_item", wait=wait, Item=movie_data, ReturnValues="ALL_OLD")
+    _adjust_genre_counts(response.get("Attributes", {}).get("genre"), movie_data.get("genre"))
+    _notify_movie_put(movie_data)
+
+
+@capacity.accounted
 def get_movie(movie_id):
     response = movies_table.get_item(Key={"id": movie_id})
     return response.get("Item")
 
 
+@capacity.accounted
 def delete_movie(movie_id):
     print(movie_id)
-    movies_table.delete_item(Key={"id": movie_id})
+    response = _write(movies_table, "delete_item", Key={"id": movie_id}, ReturnValues="ALL_OLD")
+    _adjust_genre_counts(response.get("Attributes", {}).get("genre"), None)
+    _notify_movie_deleted(movie_id)
 
 
+@capacity.accounted
 def update_movie(movie_id, updated_data):
-    update_expression = "SET " + ", ".join(f"{k}=:{k}" for k in updated_data.keys())
+    updated_data = {**updated_data, "updated_at": datetime.now(timezone.utc).isoformat()}
+    if "genre" in updated_data:
+        updated_data["genre"] = normalize_genre(updated_data["genre"])
+    update_expression = "SET " + ", ".join(f"{k}=:{k}" for k in updated_data.keys()) + " ADD version :one"
     expression_attribute_values = {f":{k}": v for k, v in updated_data.items()}
-    movies_table.update_item(
+    expression_attribute_values[":one"] = 1
+    # The old item tells us whether the genre changed; SET and ADD make the new one predictable
+    response = _write(
+        movies_table, "update_item",
         Key={"id": movie_id},
         UpdateExpression=update_expression,
         ExpressionAttributeValues=expression_attribute_values,
+        ReturnValues="ALL_OLD",
     )
-    return get_movie(movie_id)
+    old_movie = response.get("Attributes", {})
+    movie = {"id": movie_id, **old_movie, **updated_data, "version": old_movie.get("version", 0) + 1}
+    _adjust_genre_counts(old_movie.get("genre"), movie.get("genre"))
+    _notify_movie_put(movie)
+    return movie
 
 
+@capacity.accounted
+def set_similar_movies(movie_id: str, similar: List[Dict[str, Any]], computed_at: str) -> None:
+    """Store precomputed "because you liked" neighbors on a movie"""
+    try:
+        _write(
+            movies_table, 'update_item', priority=capacity.LOW, wait=True,
+            Key={'id': movie_id},
+            UpdateExpression='SET similar = :s, similar_updated_at = :t ADD version :one',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':s': similar, ':t': computed_at, ':one': 1}
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"Skipping recommendations for deleted movie {movie_id}")
+
+
+@capacity.accounted
+def increment_movie_counters(movie_id: str, counts: Dict[str, int]) -> None:
+    """Add to several counters on a movie in one write, e.g. {'view_count': 3}"""
+    names = {f"#c{i}": counter for i, counter in enumerate(counts)}
+    values = {f":c{i}": amount for i, amount in enumerate(counts.values())}
+    try:
+        _write(
+            movies_table, 'update_item', priority=capacity.LOW,
+            Key={'id': movie_id},
+            UpdateExpression='ADD ' + ', '.join(f"#c{i} :c{i}" for i in range(len(counts))),
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"Dropping counters for deleted movie {movie_id}")
+
+
+@capacity.accounted
+def batch_get_movies(movie_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Get several movies with BatchGetItem, keyed by movie id"""
+    try:
+        movies = {}
+        unique_ids = list(dict.fromkeys(movie_ids))
+        # BatchGetItem accepts at most 100 keys per call
+        for i in range(0, len(unique_ids), 100):
+            request = {movies_table.name: {'Keys': [{'id': movie_id} for movie_id in unique_ids[i:i + 100]]}}
+            attempt = 0
+            while request:
+                if attempt:
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0))
+                response = dynamodb.batch_get_item(RequestItems=request)
+                for movie in response.get('Responses', {}).get(movies_table.name, []):
+                    movies[movie['id']] = movie
+                request = response.get('UnprocessedKeys')
+                attempt += 1
+        return movies
+    except Exception as e:
+        logger.error(f"Error batch getting movies: {e}")
+        raise
+
+
+@single_flight
+@capacity.accounted
 def query_movies_by_rating(min_rating):
     """Query movies with rating >= min_rating"""
     try:
@@ -72,32 +627,40 @@ def query_movies_by_rating(min_rating):
         raise
 
 
+@single_flight
+@capacity.accounted
 def query_movies_by_genre(genre):
     response = movies_table.query(
         IndexName="GenreIndex",
-        KeyConditionExpression=Key("genre").eq(genre)
+        KeyConditionExpression=Key("genre").eq(normalize_genre(genre))
     )
     return response.get("Items", [])
 
 
 # Comment and rating functions
+@capacity.accounted
 def put_comment(comment_data):
-    comments_table.put_item(Item=comment_data)
+    comment_data = {**comment_data, "version": int(comment_data.get("version", 0)) + 1}
+    _write(comments_table, "put_item", Item=comment_data)
 
 
+@capacity.accounted
 def update_movie_rating(movie_id):
     response = ratings_table.query(
         KeyConditionExpression=Key("movie_id").eq(movie_id)
     )
     ratings = [item["rating"] for item in response.get("Items", [])]
     avg_rating = sum(ratings) / len(ratings) if ratings else 0.0
-    ratings_table.update_item(
+    _write(
+        ratings_table, "update_item",
         Key={"id": movie_id},
-        UpdateExpression="SET rating = :rating",
-        ExpressionAttributeValues={":rating": avg_rating},
+        UpdateExpression="SET rating = :rating ADD version :one",
+        ExpressionAttributeValues={":rating": avg_rating, ":one": 1},
     )
 
 
+@single_flight
+@capacity.accounted
 def scan_movies() -> List[Dict[str, Any]]:
     """Get all movies from the database"""
     try:
@@ -117,6 +680,172 @@ def scan_movies() -> List[Dict[str, Any]]:
         raise
 
 
+def _query_page(table, method: str, limit: int, start_key: Optional[Dict[str, Any]] = None,
+                **kwargs) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Fetch one page of a scan or query, returning the items and the key to continue from"""
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+    response = getattr(table, method)(Limit=limit, **kwargs)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+@capacity.accounted
+def scan_movies_page(limit: int, start_key: Optional[Dict[str, Any]] = None,
+                     min_rating: Optional[int] = None):
+    """Get one page of movies, optionally filtered by minimum rating"""
+    try:
+        kwargs = {}
+        if min_rating is not None:
+            kwargs['FilterExpression'] = 'rating >= :min_rating'
+            kwargs['ExpressionAttributeValues'] = {':min_rating': min_rating}
+        return _query_page(movies_table, 'scan', limit, start_key, **kwargs)
+    except Exception as e:
+        logger.error(f"Error scanning movies page: {e}")
+        raise
+
+
+@capacity.accounted
+def query_movies_by_genre_page(genre: str, limit: int, start_key: Optional[Dict[str, Any]] = None):
+    """Get one page of movies in a genre"""
+    try:
+        return _query_page(
+            movies_table, 'query', limit, start_key,
+            IndexName='GenreIndex',
+            KeyConditionExpression=Key('genre').eq(normalize_genre(genre))
+        )
+    except Exception as e:
+        logger.error(f"Error querying movies page for genre {genre}: {e}")
+        raise
+
+
+def _genre_rating_query(genre: str, min_rating: Optional[int]) -> Dict[str, Any]:
+    condition = Key('genre').eq(genre)
+    if min_rating is not None:
+        condition = condition & Key('rating').gte(min_rating)
+    return {
+        'IndexName': GENRE_RATING_INDEX,
+        'KeyConditionExpression': condition,
+        'ScanIndexForward': False,
+    }
+
+
+def _rating_of(item: Dict[str, Any]):
+    return item.get('rating', 0)
+
+
+def _normalized_genres(genres: List[str]) -> List[str]:
+    return list(dict.fromkeys(normalize_genre(genre) for genre in genres if genre and genre.strip()))
+
+
+def _map_genres(func: Callable[[str], Any], genres: List[str]) -> List[Any]:
+    """Run one query per genre, concurrently when there is more than one"""
+    if len(genres) == 1:
+        return [func(genres[0])]
+    return list(_executor.map(_in_caller_context(func), genres))
+
+
+@single_flight
+@capacity.accounted
+def query_movies_by_genres(genres: List[str], min_rating: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get all movies in any of the genres with rating >= min_rating, best rated first"""
+    genres = _normalized_genres(genres)
+    if not genres:
+        return []
+
+    def query_genre(genre: str) -> List[Dict[str, Any]]:
+        table = _ClientTable(movies_table.name)
+        kwargs = _genre_rating_query(genre, min_rating)
+        items = []
+        while True:
+            response = table.query(**kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    try:
+        # Each genre comes back sorted, so a k-way merge keeps the overall order
+        return list(heapq.merge(*_map_genres(query_genre, genres), key=_rating_of, reverse=True))
+    except Exception as e:
+        logger.error(f"Error querying movies for genres {genres}: {e}")
+        raise
+
+
+@capacity.accounted
+def query_movies_by_genres_page(genres: List[str], limit: int,
+                                start_keys: Optional[Dict[str, Optional[Dict[str, Any]]]] = None,
+                                min_rating: Optional[int] = None):
+    """Get one page of movies in any of the genres, best rated first.
+
+    Returns the items and a dict mapping each genre with more results to the
+    ExclusiveStartKey to resume it from, or None when every genre is done.
+    Genres missing from start_keys are treated as exhausted.
+    """
+    genres = _normalized_genres(genres)
+    if start_keys is not None:
+        genres = [genre for genre in genres if genre in start_keys]
+    start_keys = start_keys or {}
+    if not genres:
+        return [], None
+
+    def query_genre(genre: str):
+        table = _ClientTable(movies_table.name)
+        # limit items per genre is always enough to fill one merged page
+        return _query_page(table, 'query', limit, start_keys.get(genre), **_genre_rating_query(genre, min_rating))
+
+    try:
+        pages = dict(zip(genres, _map_genres(query_genre, genres)))
+        streams = [[(item, genre) for item in items] for genre, (items, _) in pages.items()]
+        merged = heapq.merge(*streams, key=lambda entry: _rating_of(entry[0]), reverse=True)
+        page = list(itertools.islice(merged, limit))
+
+        next_keys = {}
+        for genre, (items, last_key) in pages.items():
+            used = sum(1 for _, item_genre in page if item_genre == genre)
+            if used == 0:
+                if items:
+                    next_keys[genre] = start_keys.get(genre)
+            elif used < len(items):
+                last = items[used - 1]
+                next_keys[genre] = {'id': last['id'], 'genre': last['genre'], 'rating': last['rating']}
+            elif last_key:
+                next_keys[genre] = last_key
+        return [item for item, _ in page], next_keys or None
+    except Exception as e:
+        logger.error(f"Error querying movies page for genres {genres}: {e}")
+        raise
+
+
+@capacity.accounted
+def get_comments_by_movie_page(movie_id: str, limit: int, start_key: Optional[Dict[str, Any]] = None):
+    """Get one page of comments for a movie, newest first"""
+    try:
+        return _query_page(
+            comments_table, 'query', limit, start_key,
+            IndexName='MovieIndex',
+            KeyConditionExpression=Key('movie_id').eq(movie_id),
+            ScanIndexForward=False
+        )
+    except Exception as e:
+        logger.error(f"Error getting comments page for movie {movie_id}: {e}")
+        raise
+
+
+@capacity.accounted
+def get_ratings_by_movie_page(movie_id: str, limit: int, start_key: Optional[Dict[str, Any]] = None):
+    """Get one page of individual ratings for a movie"""
+    try:
+        return _query_page(
+            ratings_table, 'query', limit, start_key,
+            KeyConditionExpression=Key('movie_id').eq(movie_id)
+        )
+    except Exception as e:
+        logger.error(f"Error getting ratings page for movie {movie_id}: {e}")
+        raise
+
+
+@single_flight
+@capacity.accounted
 def get_movies_by_user(user_id: int) -> List[Dict[str, Any]]:
     """Get all movies uploaded by a specific user"""
     try:
@@ -130,6 +859,8 @@ def get_movies_by_user(user_id: int) -> List[Dict[str, Any]]:
         raise
 
 
+@single_flight
+@capacity.accounted
 def get_movie_ratings(movie_id: str) -> Dict[str, Any]:
     """Get rating statistics for a movie"""
     try:
@@ -160,6 +891,7 @@ def get_movie_ratings(movie_id: str) -> Dict[str, Any]:
         raise
 
 
+@capacity.accounted
 def get_user_rating(movie_id: str, user_id: int) -> float:
     """Get a user's rating for a specific movie"""
     try:
@@ -176,11 +908,13 @@ def get_user_rating(movie_id: str, user_id: int) -> float:
         raise
 
 
+@capacity.accounted
 def add_rating(movie_id: str, user_id: int, rating: int) -> None:
     """Add or update a user's rating for a movie"""
     try:
         # Add rating to ratings table
-        ratings_table.put_item(
+        _write(
+            ratings_table, 'put_item',
             Item={
                 'movie_id': movie_id,
                 'user_id': user_id,
@@ -198,12 +932,20 @@ def add_rating(movie_id: str, user_id: int, rating: int) -> None:
         # Calculate new average rating
         avg_rating = int(sum(ratings) / len(ratings)) if ratings else 0
 
-        # Update movie's average rating
-        movies_table.update_item(
+        # Update movie's average rating and rating count
+        response = _write(
+            movies_table, 'update_item', priority=None,
             Key={'id': movie_id},
-            UpdateExpression='SET rating = :r',
-            ExpressionAttributeValues={':r': avg_rating}
+            UpdateExpression='SET rating = :r, rating_count = :n, updated_at = :u ADD version :one',
+            ExpressionAttributeValues={
+                ':r': avg_rating,
+                ':n': len(ratings),
+                ':u': datetime.now(timezone.utc).isoformat(),
+                ':one': 1
+            },
+            ReturnValues='ALL_NEW'
         )
+        _notify_movie_put(response.get('Attributes'))
 
         logger.info(f"Added rating {rating} for movie {movie_id} by user {user_id}")
     except Exception as e:
@@ -211,21 +953,76 @@ def add_rating(movie_id: str, user_id: int, rating: int) -> None:
         raise
 
 
-def add_comment(movie_id: str, user_id: int, content: str) -> Dict[str, Any]:
-    """Add a comment to a movie"""
+def _adjust_comment_count(movie_id: str, delta: int) -> None:
+    """Keep the movie's denormalized comment_count in step with the comments table"""
+    try:
+        response = _write(
+            movies_table, 'update_item', priority=None,
+            Key={'id': movie_id},
+            UpdateExpression='ADD comment_count :d, version :one',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':d': delta, ':one': 1},
+            ReturnValues='ALL_NEW'
+        )
+        _notify_movie_put(response.get('Attributes'))
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"Not counting comment for deleted movie {movie_id}")
+    except Exception as e:
+        # recount_comments repairs any drift
+        logger.error(f"Error adjusting comment count for movie {movie_id}: {e}")
+
+
+def _path_segment(now: datetime) -> str:
+    # Microseconds since the epoch plus a random tiebreak, fixed width so paths sort by time
+    return f"{int(now.timestamp() * 1_000_000):016d}{secrets.randbelow(10_000):04d}"
+
+
+@capacity.accounted
+def add_comment(movie_id: str, user_id: int, content: str, parent_id: Optional[str] = None) -> Dict[str, Any]:
+    """Add a comment to a movie, or a reply to another comment on it"""
     try:
         # Ensure user_id is an integer
         user_id = int(str(user_id))
+        now = datetime.now(timezone.utc)
 
         comment_data = {
-            'id': f"{movie_id}_{datetime.now(timezone.utc).timestamp()}",
+            'id': f"{movie_id}_{now.timestamp()}",
             'movie_id': movie_id,
             'user_id': user_id,
             'content': content,
-            'timestamp': datetime.now(timezone.utc).isoformat()
+            'timestamp': now.isoformat(),
+            'path': _path_segment(now),
+            'depth': 0,
+            'version': 1
         }
 
-        comments_table.put_item(Item=comment_data)
+        if parent_id:
+            parent = comments_table.get_item(Key={'id': parent_id}, ConsistentRead=True).get('Item')
+            if not parent or parent['movie_id'] != movie_id or 'path' not in parent:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent comment not found")
+            if int(parent['depth']) >= MAX_COMMENT_DEPTH:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Replies cannot be nested more than {MAX_COMMENT_DEPTH} deep"
+                )
+            comment_data.update(
+                parent_id=parent_id,
+                path=f"{parent['path']}/{comment_data['path']}",
+                depth=int(parent['depth']) + 1
+            )
+
+        _write(comments_table, 'put_item', Item=comment_data)
+        if parent_id:
+            response = _write(
+                comments_table, 'update_item', priority=None,
+                Key={'id': parent_id},
+                UpdateExpression='ADD reply_count :one, version :one',
+                ExpressionAttributeValues={':one': 1},
+                ReturnValues='ALL_NEW'
+            )
+            _notify_comment('updated', response.get('Attributes'))
+        _adjust_comment_count(movie_id, 1)
+        _notify_comment('added', comment_data)
         return comment_data
     except (ValueError, TypeError) as e:
         logger.error(f"Error converting user_id to integer: {e}")
@@ -238,15 +1035,18 @@ def add_comment(movie_id: str, user_id: int, content: str) -> Dict[str, Any]:
         raise
 
 
+@capacity.accounted
 def update_comment(comment_id: str, content: str) -> Dict[str, Any]:
     """Update a comment"""
     try:
-        update_response = comments_table.update_item(
+        update_response = _write(
+            comments_table, 'update_item',
             Key={'id': comment_id},
-            UpdateExpression='SET content = :c, updated_at = :u',
+            UpdateExpression='SET content = :c, updated_at = :u ADD version :one',
             ExpressionAttributeValues={
                 ':c': content,
-                ':u': datetime.now(timezone.utc).isoformat()
+                ':u': datetime.now(timezone.utc).isoformat(),
+                ':one': 1
             },
             ReturnValues='ALL_NEW'
         )
@@ -259,7 +1059,10 @@ def update_comment(comment_id: str, content: str) -> Dict[str, Any]:
                 detail="Failed to retrieve updated comment"
             )
 
+        _notify_comment('updated', updated_comment)
         return updated_comment
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating comment {comment_id}: {e}")
         raise HTTPException(
@@ -267,15 +1070,51 @@ def update_comment(comment_id: str, content: str) -> Dict[str, Any]:
             detail=str(e)
         )
 
+@capacity.accounted
 def delete_comment(comment_id: str) -> None:
-    """Delete a comment"""
+    """Delete a comment; one with replies is blanked instead so its thread stays intact"""
     try:
-        comments_table.delete_item(Key={'id': comment_id})
+        try:
+            response = _write(
+                comments_table, 'delete_item',
+                Key={'id': comment_id},
+                ConditionExpression='attribute_not_exists(reply_count) OR reply_count = :zero',
+                ExpressionAttributeValues={':zero': 0},
+                ReturnValues='ALL_OLD'
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            response = _write(
+                comments_table, 'update_item', priority=None,
+                Key={'id': comment_id},
+                UpdateExpression='SET content = :empty, deleted = :true ADD version :one',
+                ConditionExpression='attribute_exists(id)',
+                ExpressionAttributeValues={':empty': '', ':true': True, ':one': 1},
+                ReturnValues='ALL_NEW'
+            )
+            _notify_comment('updated', response.get('Attributes'))
+            return
+
+        deleted = response.get('Attributes')
+        # Only count deletions that removed something, so retries do not double count
+        if deleted:
+            _adjust_comment_count(deleted['movie_id'], -1)
+            if deleted.get('parent_id'):
+                response = _write(
+                    comments_table, 'update_item', priority=None,
+                    Key={'id': deleted['parent_id']},
+                    UpdateExpression='ADD reply_count :minus_one, version :one',
+                    ConditionExpression='attribute_exists(id)',
+                    ExpressionAttributeValues={':minus_one': -1, ':one': 1},
+                    ReturnValues='ALL_NEW'
+                )
+                _notify_comment('updated', response.get('Attributes'))
+        _notify_comment('deleted', deleted)
     except Exception as e:
         logger.error(f"Error deleting comment {comment_id}: {e}")
         raise
 
 
+@capacity.accounted
 def get_comment(comment_id: str) -> Dict[str, Any]:
     """Get a specific comment"""
     try:
@@ -315,6 +1154,8 @@ def get_comment(comment_id: str) -> Dict[str, Any]:
         raise
 
 
+@single_flight(scope=_movie_comments_scope)
+@capacity.accounted
 def get_comments_by_movie(movie_id: str) -> List[Dict[str, Any]]:
     """Get all comments for a movie"""
     try:
@@ -342,6 +1183,96 @@ def get_comments_by_movie(movie_id: str) -> List[Dict[str, Any]]:
         raise
 
 
+def _parse_comment(comment: Dict[str, Any]) -> Dict[str, Any]:
+    comment['user_id'] = int(comment['user_id'])
+    if 'timestamp' in comment:
+        timestamp = datetime.fromisoformat(comment['timestamp'].replace('Z', '+00:00'))
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        comment['timestamp'] = timestamp
+    return comment
+
+
+@single_flight(scope=_movie_comments_scope)
+@capacity.accounted
+def get_comment_threads(movie_id: str, limit: int,
+                        before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Get up to limit whole threads of a movie, newest thread first, in one query.
+
+    Comments come back depth first, each reply after its parent. The second
+    value is the cursor for the next page: pass it as before, or None when
+    there are no more threads.
+    """
+    # Read backwards by path, so a thread ends with its top-level comment
+    condition = Key('movie_id').eq(movie_id)
+    if before is not None:
+        condition = condition & Key('path').lt(before)
+    kwargs = {
+        'IndexName': THREAD_INDEX,
+        'KeyConditionExpression': condition,
+        'ScanIndexForward': False,
+    }
+    try:
+        threads: List[List[Dict[str, Any]]] = []
+        thread: List[Dict[str, Any]] = []
+        while True:
+            response = comments_table.query(**kwargs)
+            for comment in response.get('Items', []):
+                thread.append(_parse_comment(comment))
+                if int(comment['depth']) == 0:
+                    threads.append(thread[::-1])
+                    thread = []
+                    if len(threads) == limit:
+                        # Only worth another page if the query had more to give
+                        more = 'LastEvaluatedKey' in response or comment is not response['Items'][-1]
+                        return [c for t in threads for c in t], comment['path'] if more else None
+            if 'LastEvaluatedKey' not in response:
+                return [c for t in threads for c in t], None
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except Exception as e:
+        logger.error(f"Error getting comment threads for movie {movie_id}: {e}")
+        raise
+
+
+@capacity.accounted
+def get_comment_subtree(comment_id: str) -> List[Dict[str, Any]]:
+    """Get a comment and all its replies, depth first, in one query"""
+    comment = comments_table.get_item(Key={'id': comment_id}).get('Item')
+    if not comment or 'path' not in comment:
+        return []
+    kwargs = {
+        'IndexName': THREAD_INDEX,
+        'KeyConditionExpression': Key('movie_id').eq(comment['movie_id']) & Key('path').begins_with(comment['path']),
+    }
+    try:
+        comments = []
+        while True:
+            response = comments_table.query(**kwargs)
+            comments.extend(_parse_comment(item) for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return comments
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except Exception as e:
+        logger.error(f"Error getting replies to comment {comment_id}: {e}")
+        raise
+
+
+def nest_comments(comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turn a depth-first list of comments into trees, each comment holding its replies.
+
+    Replies whose parent is not in the list become roots themselves.
+    """
+    by_id: Dict[str, Dict[str, Any]] = {}
+    roots = []
+    for comment in comments:
+        node = by_id[comment['id']] = {**comment, 'replies': []}
+        parent = by_id.get(comment.get('parent_id'))
+        (parent['replies'] if parent else roots).append(node)
+    return roots
+
+
+@single_flight(scope=_user_comments_scope)
+@capacity.accounted
 def get_comments_by_user(user_id: int) -> List[Dict[str, Any]]:
     """Get all comments by a user"""
     try:
@@ -369,6 +1300,317 @@ def get_comments_by_user(user_id: int) -> List[Dict[str, Any]]:
         raise
 
 
+GENRE_RATING_INDEX_DEFINITION = {
+    'IndexName': GENRE_RATING_INDEX,
+    'KeySchema': [
+        {'AttributeName': 'genre', 'KeyType': 'HASH'},
+        {'AttributeName': 'rating', 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'ALL'},
+    'ProvisionedThroughput': {
+        'ReadCapacityUnits': 5,
+        'WriteCapacityUnits': 5
+    }
+}
+
+
+TRENDING_INDEX_DEFINITION = {
+    'IndexName': TRENDING_INDEX,
+    'KeySchema': [
+        {'AttributeName': 'trending_generation', 'KeyType': 'HASH'},
+        {'AttributeName': 'trending', 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'ALL'},
+    'ProvisionedThroughput': {
+        'ReadCapacityUnits': 5,
+        'WriteCapacityUnits': 5
+    }
+}
+
+
+THREAD_INDEX_DEFINITION = {
+    'IndexName': THREAD_INDEX,
+    'KeySchema': [
+        {'AttributeName': 'movie_id', 'KeyType': 'HASH'},
+        {'AttributeName': 'path', 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'ALL'},
+    'ProvisionedThroughput': {
+        'ReadCapacityUnits': 5,
+        'WriteCapacityUnits': 5
+    }
+}
+
+
+def create_genre_rating_index() -> None:
+    """Add GenreRatingIndex to an existing movies table"""
+    try:
+        dynamodb.meta.client.update_table(
+            TableName=f"{DYNAMODB_TABLE}-movies",
+            AttributeDefinitions=[
+                {'AttributeName': 'genre', 'AttributeType': 'S'},
+                {'AttributeName': 'rating', 'AttributeType': 'N'}
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': GENRE_RATING_INDEX_DEFINITION}]
+        )
+        logger.info(f"Creating {GENRE_RATING_INDEX}")
+    except Exception as e:
+        logger.error(f"Error creating {GENRE_RATING_INDEX}: {e}")
+        raise
+
+
+def create_trending_index() -> None:
+    """Add TrendingIndex to an existing movies table"""
+    try:
+        dynamodb.meta.client.update_table(
+            TableName=f"{DYNAMODB_TABLE}-movies",
+            AttributeDefinitions=[
+                {'AttributeName': 'trending_generation', 'AttributeType': 'N'},
+                {'AttributeName': 'trending', 'AttributeType': 'N'}
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': TRENDING_INDEX_DEFINITION}]
+        )
+        logger.info(f"Creating {TRENDING_INDEX}")
+    except Exception as e:
+        logger.error(f"Error creating {TRENDING_INDEX}: {e}")
+        raise
+
+
+def create_thread_index() -> None:
+    """Add ThreadIndex to an existing comments table"""
+    try:
+        dynamodb.meta.client.update_table(
+            TableName=f"{DYNAMODB_TABLE}-comments",
+            AttributeDefinitions=[
+                {'AttributeName': 'movie_id', 'AttributeType': 'S'},
+                {'AttributeName': 'path', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': THREAD_INDEX_DEFINITION}]
+        )
+        logger.info(f"Creating {THREAD_INDEX}")
+    except Exception as e:
+        logger.error(f"Error creating {THREAD_INDEX}: {e}")
+        raise
+
+
+@capacity.accounted
+def backfill_comment_paths() -> int:
+    """Make comments written before threading top-level comments, returning how many changed"""
+    changed = 0
+    for comment in parallel_scan(comments_table.name):
+        if 'path' in comment:
+            continue
+        timestamp = datetime.fromisoformat(comment['timestamp'].replace('Z', '+00:00'))
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        try:
+            _write(
+                comments_table, 'update_item', priority=capacity.LOW, wait=True,
+                Key={'id': comment['id']},
+                UpdateExpression='SET #p = :p, #d = :zero',
+                ConditionExpression='attribute_exists(id) AND attribute_not_exists(#p)',
+                # PATH is a reserved word
+                ExpressionAttributeNames={'#p': 'path', '#d': 'depth'},
+                ExpressionAttributeValues={':p': _path_segment(timestamp), ':zero': 0}
+            )
+            changed += 1
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # Deleted since the scan
+    logger.info(f"Backfilled the path of {changed} comments")
+    return changed
+
+
+@capacity.accounted
+def normalize_movie_genres() -> int:
+    """Rewrite stored genres in canonical form, returning how many movies changed"""
+    changed = 0
+    for movie in parallel_scan_movies():
+        genre = movie.get('genre')
+        if genre is not None and genre != normalize_genre(genre):
+            response = _write(
+                movies_table, 'update_item', priority=capacity.LOW, wait=True,
+                Key={'id': movie['id']},
+                UpdateExpression='SET genre = :g ADD version :one',
+                ExpressionAttributeValues={':g': normalize_genre(genre), ':one': 1},
+                ReturnValues='ALL_NEW'
+            )
+            _notify_movie_put(response.get('Attributes'))
+            changed += 1
+    logger.info(f"Normalized the genre of {changed} movies")
+    return changed
+
+
+def _batch_delete(table, keys: List[Dict[str, Any]]) -> None:
+    """Delete items with BatchWriteItem at low priority, retrying unprocessed and throttled ones"""
+    for i in range(0, len(keys), BATCH_WRITE_SIZE):
+        request = {table.name: [{'DeleteRequest': {'Key': key}} for key in keys[i:i + BATCH_WRITE_SIZE]]}
+        attempt = 0
+        while request:
+            if attempt == BATCH_WRITE_ATTEMPTS:
+                raise RuntimeError(f"Gave up deleting {len(request[table.name])} items from {table.name}")
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            attempt += 1
+            delay = capacity.limiter.admit(table.name, capacity.LOW)
+            if delay > 0:
+                metrics.increment("capacity.delayed.low")
+                time.sleep(delay)
+            try:
+                response = dynamodb.batch_write_item(RequestItems=request, ReturnConsumedCapacity='INDEXES')
+            except dynamodb.meta.client.exceptions.ProvisionedThroughputExceededException:
+                capacity.limiter.throttled(table.name)
+                continue
+            for consumed in response.get('ConsumedCapacity', []):
+                capacity.limiter.record(consumed)
+            request = response.get('UnprocessedItems')
+
+
+def _update_cascade(movie_id: str, expression: str, values: Dict[str, Any],
+                    condition: Optional[str] = None) -> Dict[str, Any]:
+    kwargs = {}
+    if '#s' in expression:
+        # STATUS is a reserved word
+        kwargs['ExpressionAttributeNames'] = {'#s': 'status'}
+    if condition:
+        kwargs['ConditionExpression'] = condition
+    response = _write(
+        stats_table, 'update_item', priority=None,
+        Key={'id': f"{CASCADE_ID_PREFIX}{movie_id}"},
+        UpdateExpression=expression,
+        ExpressionAttributeValues={':u': datetime.now(timezone.utc).isoformat(), **values},
+        ReturnValues='ALL_NEW',
+        **kwargs
+    )
+    return response.get('Attributes', {})
+
+
+def get_cascade_status(movie_id: str) -> Optional[Dict[str, Any]]:
+    """Progress of the cleanup after a movie was deleted, or None if there was none"""
+    response = stats_table.get_item(Key={'id': f"{CASCADE_ID_PREFIX}{movie_id}"}, ConsistentRead=True)
+    return response.get('Item')
+
+
+def _delete_movie_items(movie_id: str, table, counter: str, key_of: Callable[[Dict[str, Any]], Dict[str, Any]],
+                        **query_kwargs) -> None:
+    """Delete one page of a movie's items at a time, counting each page in its cascade status"""
+    query_kwargs = {**query_kwargs, 'KeyConditionExpression': Key('movie_id').eq(movie_id), 'Limit': CASCADE_PAGE_SIZE}
+    while True:
+        response = table.query(**query_kwargs)
+        keys = [key_of(item) for item in response.get('Items', [])]
+        if keys:
+            _batch_delete(table, keys)
+            # Each page renews the lease
+            _update_cascade(movie_id, f"SET updated_at = :u, lease_until = :lease ADD {counter} :n",
+                            {':n': len(keys), ':lease': _lease_until()})
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _lease_until() -> int:
+    return int(time.time()) + CASCADE_LEASE_SECONDS
+
+
+@capacity.accounted
+def cascade_delete_movie(movie_id: str) -> Optional[Dict[str, Any]]:
+    """Delete the comments and ratings of a deleted movie, returning its final cascade status.
+
+    Progress is kept in the stats table. Running it again after a failure
+    or restart picks up whatever is left, so counts may include a few
+    items MovieIndex had not yet seen deleted. Returns None without doing
+    anything while another worker holds the cleanup's lease.
+    """
+    try:
+        _update_cascade(
+            movie_id,
+            "SET #s = :running, updated_at = :u, started_at = if_not_exists(started_at, :u), "
+            "lease_until = :lease, lease_owner = :owner",
+            {':running': 'running', ':lease': _lease_until(), ':owner': _cascade_owner, ':now': int(time.time())},
+            condition="attribute_not_exists(lease_until) OR lease_until < :now OR lease_owner = :owner"
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"Cleanup of deleted movie {movie_id} is running in another worker")
+        return None
+    try:
+        _delete_movie_items(movie_id, comments_table, 'comments_deleted', lambda item: {'id': item['id']},
+                            IndexName='MovieIndex', ProjectionExpression='id')
+        _delete_movie_items(movie_id, ratings_table, 'ratings_deleted',
+                            lambda item: {'movie_id': item['movie_id'], 'user_id': item['user_id']},
+                            ProjectionExpression='movie_id, user_id')
+    except Exception as e:
+        logger.error(f"Error cleaning up after deleted movie {movie_id}: {e}")
+        return _update_cascade(movie_id, "SET #s = :failed, updated_at = :u, last_error = :e REMOVE lease_until",
+                               {':failed': 'failed', ':e': str(e)})
+
+    cascade = _update_cascade(
+        movie_id, "SET #s = :done, updated_at = :u, finished_at = :u REMOVE last_error, lease_until",
+        {':done': 'done'}
+    )
+    logger.info(
+        f"Deleted {cascade.get('comments_deleted', 0)} comments and {cascade.get('ratings_deleted', 0)} "
+        f"ratings of movie {movie_id}"
+    )
+    return cascade
+
+
+def start_cascade_delete(movie_id: str, user_id: int) -> None:
+    """Record a pending cleanup for a deleted movie, owned by user_id, and run it in the background"""
+    _update_cascade(
+        movie_id, "SET #s = :pending, user_id = :user, updated_at = :u, started_at = :u",
+        {':pending': 'pending', ':user': user_id}
+    )
+    threading.Thread(target=cascade_delete_movie, args=(movie_id,),
+                     name=f"cascade-delete-{movie_id}", daemon=True).start()
+
+
+def resume_cascades() -> int:
+    """Finish cleanups left pending or failed, e.g. by a worker restart, returning how many were run.
+
+    Cleanups whose lease is still held are left to their worker; of several
+    workers resuming at once, the conditional claim lets only one run each.
+    """
+    now = time.time()
+    unfinished = [
+        item['id'][len(CASCADE_ID_PREFIX):] for item in parallel_scan(stats_table.name, total_segments=1)
+        if item['id'].startswith(CASCADE_ID_PREFIX) and item.get('status') != 'done'
+        and item.get('lease_until', 0) < now
+    ]
+    resumed = sum(1 for movie_id in unfinished if cascade_delete_movie(movie_id) is not None)
+    if resumed:
+        logger.info(f"Resumed the cleanup of {resumed} deleted movies")
+    return resumed
+
+
+def start_resuming_cascades(interval: float = CASCADE_RESUME_SECONDS) -> None:
+    """Resume unfinished cleanups now and then every interval seconds, in a background thread"""
+    def run():
+        while True:
+            try:
+                resume_cascades()
+            except Exception as e:
+                logger.error(f"Error resuming cleanups of deleted movies: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=run, name="cascade-resume", daemon=True).start()
+
+
+def create_stats_table() -> None:
+    """Create the table for small counter items such as genre counts"""
+    dynamodb.create_table(
+        TableName=f"{DYNAMODB_TABLE}-stats",
+        KeySchema=[
+            {'AttributeName': 'id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'id', 'AttributeType': 'S'}
+        ],
+        ProvisionedThroughput={
+            'ReadCapacityUnits': 5,
+            'WriteCapacityUnits': 5
+        }
+    ).wait_until_exists()
+
+
 def create_tables() -> None:
     """Create DynamoDB tables if they don't exist"""
     try:
@@ -382,7 +1624,9 @@ def create_tables() -> None:
                 {'AttributeName': 'id', 'AttributeType': 'S'},
                 {'AttributeName': 'user_id', 'AttributeType': 'N'},
                 {'AttributeName': 'genre', 'AttributeType': 'S'},
-                {'AttributeName': 'rating', 'AttributeType': 'N'}
+                {'AttributeName': 'rating', 'AttributeType': 'N'},
+                {'AttributeName': 'trending_generation', 'AttributeType': 'N'},
+                {'AttributeName': 'trending', 'AttributeType': 'N'}
             ],
             GlobalSecondaryIndexes=[
                 {
@@ -411,7 +1655,9 @@ def create_tables() -> None:
                         'ReadCapacityUnits': 5,
                         'WriteCapacityUnits': 5
                     }
-                }
+                },
+                GENRE_RATING_INDEX_DEFINITION,
+                TRENDING_INDEX_DEFINITION
             ],
             ProvisionedThroughput={
                 'ReadCapacityUnits': 5,
@@ -428,7 +1674,8 @@ def create_tables() -> None:
             AttributeDefinitions=[
                 {'AttributeName': 'id', 'AttributeType': 'S'},
                 {'AttributeName': 'movie_id', 'AttributeType': 'S'},
-                {'AttributeName': 'user_id', 'AttributeType': 'N'}
+                {'AttributeName': 'user_id', 'AttributeType': 'N'},
+                {'AttributeName': 'path', 'AttributeType': 'S'}
             ],
             GlobalSecondaryIndexes=[
                 {
@@ -448,7 +1695,8 @@ def create_tables() -> None:
                         'ReadCapacityUnits': 5,
                         'WriteCapacityUnits': 5
                     }
-                }
+                },
+                THREAD_INDEX_DEFINITION
             ],
             ProvisionedThroughput={
                 'ReadCapacityUnits': 5,
@@ -456,6 +1704,9 @@ def create_tables() -> None:
             }
         )
 
+        # Stats table
+        create_stats_table()
+
         # Ratings table
         ratings_table = dynamodb.create_table(
             TableName=f"{DYNAMODB_TABLE}-ratings",
@@ -480,4 +1731,24 @@ def create_tables() -> None:
 
 
 if __name__ == "__main__":
-    create_tables()
\ No newline at end of file
+    import sys
+
+    if sys.argv[1:] == ["migrate"]:
+        normalize_movie_genres()
+        create_genre_rating_index()
+        create_stats_table()
+        recount_genres()
+    elif sys.argv[1:] == ["create-trending-index"]:
+        create_trending_index()
+    elif sys.argv[1:] == ["recount-comments"]:
+        recount_comments()
+    elif sys.argv[1:] == ["create-thread-index"]:
+        create_thread_index()
+    elif sys.argv[1:] == ["backfill-comment-paths"]:
+        backfill_comment_paths()
+    elif sys.argv[1:2] == ["cascade-delete"] and len(sys.argv) == 3:
+        cascade_delete_movie(sys.argv[2])
+    elif sys.argv[1:] == ["resume-cascades"]:
+        resume_cascades()
+    else:
+        create_tables()
\ No newline at end of file
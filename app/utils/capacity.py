@@ -0,0 +1,267 @@
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Union
+import logging
+
+from fastapi import HTTPException, status
+
+from app.config import (
+    DYNAMODB_WRITE_CAPACITY, DYNAMODB_CAPACITY_SHARE, DYNAMODB_CAPACITY_BURST_SECONDS,
+    DYNAMODB_LOW_PRIORITY_RESERVE, USER_WRITE_RATE_PER_MINUTE, USER_WRITE_BURST, DYNAMODB_SCAN_WARN_UNITS
+)
+from app.utils import metrics
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Write priorities. User-facing writes are HIGH; LOW writes (counters,
+# trending, batch jobs) only run while there is capacity to spare.
+HIGH = "high"
+LOW = "low"
+
+
+class CapacityExceeded(HTTPException):
+    """A write turned away before it could be throttled by DynamoDB; surfaces as a 429"""
+
+    def __init__(self, retry_after: float, detail: str = "Too many writes right now, please try again shortly"):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Tokens refill at rate per second up to capacity. Consumption is recorded
+    after the fact, so the balance can go negative and later callers wait it out."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, needed: float) -> float:
+        """Seconds until the bucket holds needed tokens; 0 if it already does"""
+        self._refill()
+        return max(0.0, (needed - self._tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._tokens -= amount
+
+    def take(self, amount: float = 1) -> bool:
+        """Consume amount only if it is available"""
+        self._refill()
+        if self._tokens < amount:
+            return False
+        self._tokens -= amount
+        return True
+
+    def drain(self) -> None:
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+
+class CapacityLimiter:
+    """Client-side model of the write capacity provisioned for each table and index.
+
+    There is one bucket per table and per global secondary index, refilling
+    at this worker's share of the provisioned WCU. Writes report what they
+    consumed (ReturnConsumedCapacity=INDEXES) and are admitted only while
+    the table and every index it has written to have tokens left. LOW
+    priority writes also leave low_priority_reserve of each bucket untouched
+    for HIGH ones. Reads are not limited here; read capacity is separate,
+    and reads are what pages need first.
+    """
+
+    def __init__(self, rate: float = DYNAMODB_WRITE_CAPACITY * DYNAMODB_CAPACITY_SHARE,
+                 burst_seconds: float = DYNAMODB_CAPACITY_BURST_SECONDS,
+                 low_priority_reserve: float = DYNAMODB_LOW_PRIORITY_RESERVE):
+        self.rate = rate
+        self.capacity = rate * burst_seconds
+        self.low_priority_reserve = low_priority_reserve
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._indexes: Dict[str, Set[str]] = {}
+
+    def _bucket(self, name: str) -> TokenBucket:
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = TokenBucket(self.rate, self.capacity)
+        return bucket
+
+    def _table_buckets(self, table: str):
+        return [self._bucket(table)] + [self._bucket(f"{table}:{index}") for index in self._indexes.get(table, ())]
+
+    def admit(self, table: str, priority: str = HIGH) -> float:
+        """Seconds to wait before writing to table; 0 means go ahead"""
+        needed = 1.0
+        if priority == LOW:
+            needed += self.low_priority_reserve * self.capacity
+        with self._lock:
+            return max(bucket.wait_time(needed) for bucket in self._table_buckets(table))
+
+    def record(self, consumed: Optional[Dict[str, Any]]) -> None:
+        """Charge the buckets with a ConsumedCapacity block from a response"""
+        if not isinstance(consumed, dict):
+            return
+        table = consumed['TableName']
+        with self._lock:
+            self._bucket(table).consume(float(consumed.get('Table', consumed).get('CapacityUnits', 0)))
+            for index, units in consumed.get('GlobalSecondaryIndexes', {}).items():
+                self._indexes.setdefault(table, set()).add(index)
+                self._bucket(f"{table}:{index}").consume(float(units.get('CapacityUnits', 0)))
+
+    def charge(self, table: str, units: float) -> None:
+        """Charge a write whose response did not say what it consumed, such as a failed condition"""
+        with self._lock:
+            self._bucket(table).consume(units)
+
+    def throttled(self, table: str) -> None:
+        """DynamoDB throttled a write anyway: assume the table and its indexes are spent"""
+        with self._lock:
+            for bucket in self._table_buckets(table):
+                bucket.drain()
+
+
+class UserWriteLimiter:
+    """Per-user token buckets for writes such as ratings and comments.
+
+    Buckets are per worker, so the effective limit is a little higher than
+    configured; the least recently used are dropped past max_users.
+    """
+
+    def __init__(self, rate_per_minute: float = USER_WRITE_RATE_PER_MINUTE,
+                 burst: int = USER_WRITE_BURST, max_users: int = 10_000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def check(self, user_id: Any, action: str) -> None:
+        """Count one write by the user, raising CapacityExceeded if they are over the limit"""
+        key = (int(user_id), action)
+        with self._lock:
+            bucket = self._buckets.pop(key, None) or TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+            if bucket.take():
+                return
+            retry_after = bucket.wait_time(1)
+        metrics.increment(f"capacity.user_limited.{action}")
+        raise CapacityExceeded(retry_after, detail="You are doing that too often, please slow down")
+
+
+limiter = CapacityLimiter()
+user_limiter = UserWriteLimiter()
+
+
+def check_user_write(user_id: Any, action: str) -> None:
+    user_limiter.check(user_id, action)
+
+
+# Capacity accounting. Every DynamoDB call returns its ConsumedCapacity,
+# which is charged to the accounted function that made it (scan_movies,
+# add_comment, ...) and, at the end of the request, to the route. Calls
+# made outside a request are charged to the "background" route as they
+# happen. Metric names are dynamodb.<unit>_per_request.<route>.<operation>.
+READ_OPERATIONS = {'GetItem', 'BatchGetItem', 'Query', 'Scan', 'TransactGetItems'}
+BACKGROUND = "background"
+
+Usage = Dict[str, Dict[str, float]]
+
+_operation: ContextVar[Optional[str]] = ContextVar("dynamodb_operation", default=None)
+_usage: ContextVar[Optional[Usage]] = ContextVar("dynamodb_usage", default=None)
+_usage_lock = threading.Lock()
+
+
+def accounted(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Charge the capacity func consumes to it, unless an accounted caller already claims it"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _operation.get() is not None:
+            return func(*args, **kwargs)
+        token = _operation.set(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+    return wrapper
+
+
+def account(api_operation: str, consumed: Union[Dict[str, Any], List[Dict[str, Any]]]) -> None:
+    """Charge the ConsumedCapacity of one call, a block or a list of them for batch calls"""
+    blocks = consumed if isinstance(consumed, list) else [consumed]
+    units = sum(float(block.get('CapacityUnits', 0)) for block in blocks)
+    unit = 'rcu' if api_operation in READ_OPERATIONS else 'wcu'
+    usage = _usage.get()
+    own_usage = usage is None
+    if own_usage:
+        usage = defaultdict(lambda: defaultdict(float))
+    with _usage_lock:
+        charged = usage[_operation.get() or api_operation]
+        charged[unit] += units
+        if api_operation == 'Scan':
+            charged['scan_rcu'] += units
+    if own_usage:
+        finish_request(BACKGROUND, usage)
+
+
+def start_request() -> Usage:
+    """Collect the capacity consumed by the current request, including its threadpool calls"""
+    usage: Usage = defaultdict(lambda: defaultdict(float))
+    _usage.set(usage)
+    return usage
+
+
+def finish_request(route: str, usage: Usage) -> None:
+    """Charge what a request consumed to its route"""
+    with _usage_lock:
+        charges = {operation: dict(units) for operation, units in usage.items()}
+    for operation, units in charges.items():
+        for unit in ('rcu', 'wcu'):
+            metrics.increment(f"dynamodb.{unit}.{route}.{operation}", units.get(unit, 0))
+            metrics.observe(f"dynamodb.{unit}_per_request.{route}.{operation}", units.get(unit, 0))
+        if units.get('scan_rcu', 0) > DYNAMODB_SCAN_WARN_UNITS:
+            metrics.increment(f"dynamodb.expensive_scans.{route}.{operation}")
+            logger.warning(
+                f"{operation} scanned {units['scan_rcu']:.1f} RCU in {route}, over {DYNAMODB_SCAN_WARN_UNITS}"
+            )
+
+
+def report(snapshot: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Capacity per route and operation, costliest routes first, from a metrics snapshot"""
+    snapshot = snapshot if snapshot is not None else metrics.snapshot()
+    routes: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+    for name, hist in snapshot["histograms"].items():
+        prefix, _, key = name.partition("_per_request.")
+        if prefix not in ("dynamodb.rcu", "dynamodb.wcu") or not hist["count"]:
+            continue
+        route, _, operation = key.partition(".")
+        unit = prefix.rsplit(".", 1)[1]
+        entry = routes[route].setdefault(operation, {"requests": hist["count"]})
+        entry[f"{unit}_total"] = hist["sum"]
+        entry[f"{unit}_per_request"] = hist["sum"] / hist["count"]
+        entry[f"{unit}_max"] = hist["max"]
+    for route, operations in routes.items():
+        for operation, entry in operations.items():
+            entry["expensive_scans"] = snapshot["counters"].get(f"dynamodb.expensive_scans.{route}.{operation}", 0)
+
+    def cost(operations):
+        return sum(entry.get("rcu_total", 0) + entry.get("wcu_total", 0) for entry in operations.values())
+    return dict(sorted(routes.items(), key=lambda item: cost(item[1]), reverse=True))
@@ -0,0 +1,147 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+from app.config import CATALOG_SNAPSHOT_ENABLED, CATALOG_REFRESH_SECONDS, CATALOG_MAX_STALENESS_SECONDS
+from app.utils import aws_dynamodb
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """The whole movies table held in memory and served stale-while-revalidate.
+
+    A snapshot younger than refresh_seconds is served as is. An older one is
+    still served, but a background parallel scan is started to replace it.
+    Past max_staleness it is not served at all, so callers fall back to
+    DynamoDB and freshness stays bounded even if refreshes keep failing.
+    Writes made through aws_dynamodb in this worker patch it directly.
+    """
+
+    def __init__(self, refresh_seconds: float = CATALOG_REFRESH_SECONDS,
+                 max_staleness: float = CATALOG_MAX_STALENESS_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._movies: Optional[Dict[str, Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+        # Writes seen while a scan is running, replayed onto its result
+        self._pending: List[tuple] = []
+
+    def age(self) -> Optional[float]:
+        if self._movies is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def refresh(self) -> None:
+        """Load the table with a parallel scan and swap it in"""
+        with self._lock:
+            self._refreshing = True
+        try:
+            movies = {movie['id']: movie for movie in aws_dynamodb.parallel_scan_movies() if movie.get('id')}
+        except Exception as e:
+            logger.error(f"Failed to refresh catalog snapshot: {e}")
+            with self._lock:
+                self._pending = []
+                self._refreshing = False
+            return
+
+        with self._lock:
+            for movie_id, movie in self._pending:
+                if movie is None:
+                    movies.pop(movie_id, None)
+                else:
+                    movies[movie_id] = movie
+            self._movies, self._loaded_at = movies, time.monotonic()
+            self._pending = []
+            self._refreshing = False
+        logger.info(f"Loaded catalog snapshot with {len(movies)} movies")
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="catalog-refresh", daemon=True).start()
+
+    def movies(self) -> Optional[List[Dict[str, Any]]]:
+        """All movies, or None when there is no snapshot fresh enough to serve"""
+        age = self.age()
+        if age is None or age >= self.refresh_seconds:
+            self._refresh_in_background()
+        if age is None or age >= self.max_staleness:
+            return None
+        with self._lock:
+            return list(self._movies.values())
+
+    def browse(self, genres: List[str], min_rating: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Movies in any of the genres (all if empty) with rating >= min_rating, best rated first"""
+        movies = self.movies()
+        if movies is None:
+            return None
+        wanted = {aws_dynamodb.normalize_genre(genre) for genre in genres}
+        matches = [
+            movie for movie in movies
+            if (not wanted or movie.get('genre') in wanted)
+            and (min_rating is None or movie.get('rating', 0) >= min_rating)
+        ]
+        matches.sort(key=lambda movie: movie.get('rating', 0), reverse=True)
+        return matches
+
+    def genre_counts(self) -> Optional[Dict[str, int]]:
+        movies = self.movies()
+        if movies is None:
+            return None
+        counts: Dict[str, int] = {}
+        for movie in movies:
+            if movie.get('genre'):
+                counts[movie['genre']] = counts.get(movie['genre'], 0) + 1
+        return counts
+
+    def put(self, movie: Dict[str, Any]) -> None:
+        self._patch(movie['id'], movie)
+
+    def remove(self, movie_id: str) -> None:
+        self._patch(movie_id, None)
+
+    def _patch(self, movie_id: str, movie: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            if self._refreshing:
+                self._pending.append((movie_id, movie))
+            if self._movies is None:
+                return
+            if movie is None:
+                self._movies.pop(movie_id, None)
+            else:
+                self._movies[movie_id] = movie
+
+
+snapshot = CatalogSnapshot()
+
+
+def browse(genres: List[str], min_rating: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """Serve a browse from the snapshot, or None if it is disabled or too stale"""
+    if not CATALOG_SNAPSHOT_ENABLED:
+        return None
+    return snapshot.browse(genres, min_rating)
+
+
+def genre_counts() -> Optional[Dict[str, int]]:
+    if not CATALOG_SNAPSHOT_ENABLED:
+        return None
+    return snapshot.genre_counts()
+
+
+def start() -> None:
+    """Start loading the snapshot so the first browse can be served from memory"""
+    if CATALOG_SNAPSHOT_ENABLED:
+        snapshot._refresh_in_background()
+
+
+# Keep the snapshot current with writes made by this worker
+aws_dynamodb.register_movie_listener(on_put=snapshot.put, on_delete=snapshot.remove)
@@ -0,0 +1,255 @@
+import asyncio
+import glob
+import json
+import os
+import socket
+import stat
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+import logging
+
+from app.config import COMMENT_EVENTS_BACKEND, COMMENT_EVENTS_SOCKET_DIR
+from app.utils import aws_dynamodb, metrics
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Events a slow subscriber may fall behind by before new ones are dropped for it
+QUEUE_SIZE = 100
+# Unix datagrams larger than this are not reliably delivered
+MAX_EVENT_BYTES = 64 * 1024
+
+Event = Dict[str, Any]
+
+# struct ucred, which the kernel attaches to each datagram once SO_PASSCRED is set (Linux only)
+PASS_CREDENTIALS = hasattr(socket, "SO_PASSCRED")
+CREDENTIALS = struct.Struct("iII")
+
+
+class LocalBroadcast:
+    """Delivers events to subscribers in this process only.
+
+    The stand-in for a shared broker when there is a single worker, and in tests.
+    """
+
+    def start(self, deliver: Callable[[Event], None]) -> None:
+        self._deliver = deliver
+
+    def publish(self, event: Event) -> None:
+        self._deliver(event)
+
+    def stop(self) -> None:
+        pass
+
+
+class UnixSocketBroadcast:
+    """Fans events out to every worker on this host over Unix datagram sockets.
+
+    Each worker binds a socket named after its pid in directory, and
+    publishing sends the event to every socket found there. Sockets left by
+    dead workers are removed when a send to them is refused. Workers on other
+    instances are not reached; that needs a broker behind the same interface.
+
+    Anyone who can send to these sockets can post fake comments, so directory
+    must be private to this user, and on Linux datagrams from other users
+    are dropped as well.
+    """
+
+    def __init__(self, directory: str = COMMENT_EVENTS_SOCKET_DIR):
+        self.directory = directory
+        self._path: Optional[str] = None
+        self._receiver: Optional[socket.socket] = None
+        self._sender: Optional[socket.socket] = None
+
+    def start(self, deliver: Callable[[Event], None]) -> None:
+        self._deliver = deliver
+        _make_private_dir(self.directory)
+        self._path = os.path.join(self.directory, f"{os.getpid()}.sock")
+        if os.path.exists(self._path):
+            os.remove(self._path)
+        self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        if PASS_CREDENTIALS:
+            self._receiver.setsockopt(socket.SOL_SOCKET, socket.SO_PASSCRED, 1)
+        self._receiver.bind(self._path)
+        # Wake up now and then so the thread notices stop()
+        self._receiver.settimeout(1)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # A worker that stops reading must not block the request publishing to it
+        self._sender.setblocking(False)
+        threading.Thread(target=self._receive, name="comment-events", daemon=True).start()
+
+    def _receive(self) -> None:
+        receiver = self._receiver
+        while True:
+            try:
+                data, ancdata, _, _ = receiver.recvmsg(MAX_EVENT_BYTES, socket.CMSG_SPACE(CREDENTIALS.size))
+            except socket.timeout:
+                continue
+            except OSError:
+                return  # Closed by stop()
+            if PASS_CREDENTIALS and _sender_uid(ancdata) != os.getuid():
+                metrics.increment("comment_events.rejected")
+                logger.warning("Ignored a comment event from another user")
+                continue
+            try:
+                self._deliver(json.loads(data))
+            except Exception as e:
+                logger.error(f"Error delivering comment event: {e}")
+
+    def publish(self, event: Event) -> None:
+        data = json.dumps(event).encode()
+        self._deliver(event)
+        if len(data) > MAX_EVENT_BYTES:
+            logger.warning(f"Comment event for movie {event['movie_id']} too large to share with other workers")
+            return
+        for path in glob.glob(os.path.join(self.directory, "*.sock")):
+            if path == self._path:
+                continue
+            try:
+                self._sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                _remove_quietly(path)
+            except OSError as e:
+                metrics.increment("comment_events.dropped")
+                logger.warning(f"Dropped comment event for {path}: {e}")
+
+    def stop(self) -> None:
+        if self._receiver is not None:
+            self._receiver.close()
+            self._sender.close()
+            _remove_quietly(self._path)
+            self._receiver = self._sender = None
+
+
+def _make_private_dir(path: str) -> None:
+    """Create path for this user alone, refusing an existing one that others could write to"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{path} must be a directory owned by uid {os.getuid()} with mode 0700")
+
+
+def _sender_uid(ancdata) -> Optional[int]:
+    """The uid the kernel reported for a datagram's sender, if any"""
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_CREDENTIALS and len(data) >= CREDENTIALS.size:
+            return CREDENTIALS.unpack(data[:CREDENTIALS.size])[1]
+    return None
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+class CommentHub:
+    """Pub/sub of comment changes, keyed by movie.
+
+    Writes publish through the broadcast backend, which hands every event
+    back to the hub in each worker; the hub then queues it for the local
+    subscribers of that movie. Until start() is called events are only
+    delivered within this process.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else LocalBroadcast()
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._started = False
+
+    def start(self) -> None:
+        self.backend.start(self._deliver)
+        self._started = True
+
+    def stop(self) -> None:
+        self._started = False
+        self.backend.stop()
+
+    def publish(self, change: str, comment: Dict[str, Any]) -> None:
+        event = {'change': change, 'movie_id': comment['movie_id'], 'comment': _jsonable(comment)}
+        try:
+            if self._started:
+                self.backend.publish(event)
+            else:
+                self._deliver(event)
+        except Exception as e:
+            logger.error(f"Error publishing comment event for movie {comment['movie_id']}: {e}")
+
+    def _deliver(self, event: Event) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(event['movie_id'], ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                pass  # The subscriber's loop has closed
+
+    @contextmanager
+    def subscribe(self, movie_id: str) -> Iterator[asyncio.Queue]:
+        """Queue of events for a movie, for the duration of the block; call from the event loop"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(movie_id, set()).add(subscriber)
+            self._update_gauge()
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers[movie_id]
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[movie_id]
+                self._update_gauge()
+
+    def _update_gauge(self) -> None:
+        metrics.set_gauge("comment_events.subscribers", sum(map(len, self._subscribers.values())))
+
+
+def _offer(queue: asyncio.Queue, event: Event) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        metrics.increment("comment_events.dropped")
+
+
+def _create_backend():
+    if COMMENT_EVENTS_BACKEND == "unix":
+        return UnixSocketBroadcast()
+    if COMMENT_EVENTS_BACKEND == "local":
+        return LocalBroadcast()
+    raise ValueError(f"Unknown COMMENT_EVENTS_BACKEND {COMMENT_EVENTS_BACKEND!r}")
+
+
+hub = CommentHub(_create_backend())
+
+
+def start() -> None:
+    hub.start()
+
+
+def stop() -> None:
+    hub.stop()
+
+
+# Publish every comment write made by this worker
+aws_dynamodb.register_comment_listener(hub.publish)
@@ -0,0 +1,144 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+import logging
+
+from app.config import COUNTER_FLUSH_SECONDS, COUNTER_FLUSH_THRESHOLD
+from app.utils import aws_dynamodb, capacity, metrics
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """Per-movie counter increments aggregated in memory and written in batches.
+
+    Every flush_seconds, or as soon as flush_threshold movies have pending
+    counts, each movie gets one atomic ADD for everything buffered since the
+    last flush, so a popular title costs a few writes per minute however many
+    hits it gets. Counts that fail to write are put back for the next flush.
+
+    Trending events are summed the same way, per movie and generation, but
+    are best effort: weight that fails to write is dropped.
+
+    The buffer is flushed on graceful shutdown. If a worker dies without one
+    (SIGKILL, OOM, instance loss) its pending counts are lost: at most
+    flush_seconds worth of hits per worker.
+    """
+
+    def __init__(self, flush_seconds: float = COUNTER_FLUSH_SECONDS,
+                 flush_threshold: int = COUNTER_FLUSH_THRESHOLD):
+        self.flush_seconds = flush_seconds
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        # Serializes flushes so counts put back by a failed write are not raced
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._trending: Dict[Tuple[str, int], float] = defaultdict(float)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, movie_id: str, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._pending[movie_id][counter] += amount
+            full = len(self._pending) >= self.flush_threshold
+        if full:
+            self._wake.set()
+
+    def add_trending(self, movie_id: str, event: str, now: Optional[float] = None) -> None:
+        generation, weight = aws_dynamodb.trending_weight(event, now)
+        with self._lock:
+            self._trending[(movie_id, generation)] += weight
+            full = len(self._trending) >= self.flush_threshold
+        if full:
+            self._wake.set()
+
+    def pending(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {movie_id: dict(counts) for movie_id, counts in self._pending.items()}
+
+    def pending_trending(self) -> Dict[Tuple[str, int], float]:
+        with self._lock:
+            return dict(self._trending)
+
+    def flush(self) -> int:
+        """Write out everything buffered, returning how many movies' counters were updated"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+                trending, self._trending = self._trending, defaultdict(float)
+
+            for (movie_id, generation), weight in trending.items():
+                aws_dynamodb.add_trending_weight(movie_id, generation, weight)
+
+            written = 0
+            deferred = False
+            for movie_id, counts in pending.items():
+                if not deferred:
+                    try:
+                        aws_dynamodb.increment_movie_counters(movie_id, counts)
+                        written += 1
+                        continue
+                    except capacity.CapacityExceeded:
+                        # Low priority; keep the rest for the next flush
+                        deferred = True
+                        metrics.increment("counter_buffer.deferred")
+                    except Exception as e:
+                        logger.error(f"Error flushing counters for movie {movie_id}: {e}")
+                with self._lock:
+                    for counter, amount in counts.items():
+                        self._pending[movie_id][counter] += amount
+            metrics.increment("counter_buffer.writes", written)
+            return written
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="counter-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and write out whatever is left"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+buffer = CounterBuffer()
+
+
+def record_view(movie_id: str) -> None:
+    buffer.add(movie_id, 'view_count')
+
+
+def record_download(movie_id: str) -> None:
+    buffer.add(movie_id, 'download_count')
+    buffer.add_trending(movie_id, 'download')
+
+
+def record_rating(movie_id: str) -> None:
+    buffer.add_trending(movie_id, 'rating')
+
+
+def record_comment(movie_id: str) -> None:
+    buffer.add_trending(movie_id, 'comment')
+
+
+def start() -> None:
+    buffer.start()
+
+
+def stop() -> None:
+    buffer.stop()
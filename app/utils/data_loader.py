@@ -0,0 +1,118 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from fastapi.requests import Request
+from starlette.concurrency import run_in_threadpool
+
+from app.utils import aws_dynamodb
+
+
+class DataLoader:
+    """Batches and de-duplicates key lookups made during one request.
+
+    Keys requested in the same event loop tick are collected and fetched
+    with a single call to batch_load_fn, which runs in the threadpool and
+    returns a dict of key -> value. Results are memoized for the life of
+    the loader, so it must not outlive the request.
+    """
+
+    def __init__(self, batch_load_fn: Callable[[List[Hashable]], Dict[Hashable, Any]]):
+        self._batch_load_fn = batch_load_fn
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        if key in self._cache:
+            return self._cache[key]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.append(key)
+        if len(self._queue) == 1:
+            # Dispatch once every coroutine scheduled for this tick has queued its keys
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        """Seed the cache with a value that is already known"""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._cache[key] = future
+
+    def clear(self, key: Hashable) -> None:
+        """Forget a key, e.g. after the item was written"""
+        self._cache.pop(key, None)
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        asyncio.ensure_future(self._run_batch(keys))
+
+    async def _run_batch(self, keys: List[Hashable]) -> None:
+        try:
+            results = await run_in_threadpool(self._batch_load_fn, keys)
+        except Exception as e:
+            for key in keys:
+                future = self._cache.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        for key in keys:
+            future = self._cache.get(key)
+            if future is not None and not future.done():
+                future.set_result(results.get(key))
+
+
+class RequestLoaders:
+    """Request-scoped, memoized access to DynamoDB reads"""
+
+    def __init__(self):
+        self.movies = DataLoader(self._load_movies)
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    @staticmethod
+    def _load_movies(movie_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        # A single key is cheaper as a plain GetItem
+        if len(movie_ids) == 1:
+            movie = aws_dynamodb.get_movie(movie_ids[0])
+            return {movie_ids[0]: movie} if movie else {}
+        return aws_dynamodb.batch_get_movies(movie_ids)
+
+    def _memoized(self, name: str, *args) -> asyncio.Future:
+        """Run a blocking aws_dynamodb read once per request, sharing the result with later callers"""
+        key = (name, args)
+        if key not in self._calls:
+            func = getattr(aws_dynamodb, name)
+            self._calls[key] = asyncio.ensure_future(run_in_threadpool(func, *args))
+        return self._calls[key]
+
+    def forget(self, name: str, *args) -> None:
+        self._calls.pop((name, args), None)
+
+    async def movie(self, movie_id: str) -> Optional[Dict[str, Any]]:
+        return await self.movies.load(movie_id)
+
+    async def comments_by_movie(self, movie_id: str) -> List[Dict[str, Any]]:
+        return await self._memoized("get_comments_by_movie", movie_id)
+
+    async def comment_threads(self, movie_id: str, limit: int,
+                              before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await self._memoized("get_comment_threads", movie_id, limit, before)
+
+    async def movies_by_user(self, user_id: int) -> List[Dict[str, Any]]:
+        return await self._memoized("get_movies_by_user", user_id)
+
+    async def comments_by_user(self, user_id: int) -> List[Dict[str, Any]]:
+        return await self._memoized("get_comments_by_user", user_id)
+
+
+def get_loaders(request: Request) -> RequestLoaders:
+    """Get the loaders for this request, creating them on first use"""
+    loaders = getattr(request.state, "loaders", None)
+    if loaders is None:
+        loaders = request.state.loaders = RequestLoaders()
+    return loaders
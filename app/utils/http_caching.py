@@ -0,0 +1,106 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime as format_http_date
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import Request, Response, status
+
+from app.templating import templates, to_datetime, TEMPLATE_FINGERPRINT
+
+
+EDIT_WINDOW_SECONDS = 86400
+
+
+def cache_control_for(request: Request, max_age: int = 0) -> str:
+    """Cache-Control for a page, depending on whether the viewer is logged in"""
+    if request.state.current_user:
+        # Pages show per-user controls, so only the browser may keep them
+        return "private, no-cache"
+    return f"public, max-age={max_age}, must-revalidate"
+
+
+def item_validator(item: Dict[str, Any]) -> str:
+    """Identify one version of an item"""
+    updated = item.get('updated_at') or item.get('timestamp') or ''
+    return f"{item.get('id')}:{item.get('version', 0)}:{updated}"
+
+
+def editable_comment_ids(comments: Iterable[Dict[str, Any]], user) -> List[str]:
+    """Comments whose edit controls are still shown to this user.
+
+    Edit buttons disappear 24 hours after posting without the item changing,
+    so this has to be part of the ETag.
+    """
+    if not user:
+        return []
+    now = datetime.now(timezone.utc)
+    return [
+        str(comment.get('id')) for comment in comments
+        if str(comment.get('user_id')) == str(user.id)
+        and (now - to_datetime(comment.get('timestamp'))).total_seconds() < EDIT_WINDOW_SECONDS
+    ]
+
+
+def compute_etag(request: Request, items: Iterable[Dict[str, Any]], *extra: Any) -> str:
+    """Build a weak ETag from the items a page renders and who is viewing it"""
+    user = request.state.current_user
+    digest = hashlib.sha1()
+    digest.update(TEMPLATE_FINGERPRINT.encode())
+    digest.update(f"user:{user.id if user else 'anonymous'}".encode())
+    for item in items:
+        digest.update(item_validator(item).encode())
+        digest.update(b"\0")
+    for part in extra:
+        digest.update(repr(part).encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def compute_last_modified(items: Iterable[Dict[str, Any]]) -> Optional[str]:
+    """Latest update time across the items, formatted as an HTTP date"""
+    times = [
+        to_datetime(item.get('updated_at') or item.get('timestamp'))
+        for item in items
+        if item.get('updated_at') or item.get('timestamp')
+    ]
+    if not times:
+        return None
+    return format_http_date(max(times).astimezone(timezone.utc), usegmt=True)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check If-None-Match using weak comparison"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def set_cache_headers(response: Response, etag: str, last_modified: Optional[str], cache_control: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Cookie"
+    if last_modified:
+        response.headers["Last-Modified"] = last_modified
+    return response
+
+
+def conditional_template_response(
+        request: Request,
+        template_name: str,
+        context: Dict[str, Any],
+        items: List[Dict[str, Any]],
+        cache_control: str,
+        *extra: Any
+) -> Response:
+    """Render a template, or return 304 without rendering if the client's copy is current"""
+    etag = compute_etag(request, items, *extra)
+    last_modified = compute_last_modified(items)
+
+    if etag_matches(request, etag):
+        response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = templates.TemplateResponse(template_name, context)
+    return set_cache_headers(response, etag, last_modified, cache_control)
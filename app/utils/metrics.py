@@ -0,0 +1,55 @@
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Any
+
+
+# In-process metrics for this worker. Each gunicorn worker keeps its own
+# copy, so the snapshot includes the pid to tell them apart.
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+_histograms: Dict[str, Dict[str, float]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add to a counter"""
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Set a gauge to its current value"""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    """Record a sample in a histogram summary"""
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = {"count": 0, "sum": 0.0, "min": value, "max": value}
+        hist["count"] += 1
+        hist["sum"] += value
+        hist["min"] = min(hist["min"], value)
+        hist["max"] = max(hist["max"], value)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Get a copy of all metrics for this worker"""
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": {name: dict(hist) for name, hist in _histograms.items()},
+        }
+
+
+def reset() -> None:
+    """Clear all metrics"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+import logging
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Hashes created with fewer rounds than BCRYPT_ROUNDS are reported by
+# passlib as needing an update, which lets us upgrade them at login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the per-worker process pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _executor
+
+
+async def _run(func, *args):
+    """Run a hashing call in the process pool, rejecting work past the queue limit"""
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_HASH_QUEUE_LIMIT:
+            logger.warning(f"Password hashing queue full ({_pending} pending)")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        _pending += 1
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), func, *args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password without blocking the event loop.
+
+    Returns (valid, new_hash). new_hash is set when the stored hash uses
+    outdated settings and should be replaced.
+    """
+    return await _run(_verify_and_update, password, hashed_password)
+
+
+def shutdown() -> None:
+    """Shut down the process pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -0,0 +1,272 @@
+import bisect
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from app.config import SEARCH_INDEX_SNAPSHOT_PATH, SEARCH_INDEX_REFRESH_SECONDS
+from app.utils import aws_dynamodb
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 2
+
+# Title matches count for more than director matches
+FIELD_WEIGHTS = {"title": 2.0, "director": 1.0}
+
+# A prefix that expands to more terms than this only uses the first ones
+MAX_PREFIX_EXPANSION = 200
+
+# Fields kept per movie so results can be rendered without another read
+DOC_FIELDS = ("id", "title", "genre", "director", "rating", "user_id", "release_time", "version", "updated_at",
+              "rating_count", "comment_count")
+
+_token_re = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase, strip accents and split text into alphanumeric tokens"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _token_re.findall(text.lower())
+
+
+class SearchIndex:
+    """In-process inverted index over movie titles and directors.
+
+    Every query token is matched as a prefix, so "star wa" finds "Star Wars".
+    Results must match all query tokens and are ranked by a tf-idf style score
+    weighted by field.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # token -> {movie_id: weight}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # Sorted vocabulary for prefix lookups
+        self._terms: List[str] = []
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self.built_at = 0.0
+        self.snapshot_mtime: Optional[float] = None
+        # movie_id -> (when, movie or None if deleted) for writes made through
+        # this index, replayed over snapshots taken before them
+        self._writes: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """The stored fields of every indexed movie"""
+        with self._lock:
+            return list(self._docs.values())
+
+    def add(self, movie: Dict[str, Any]) -> None:
+        """Add or replace a movie in the index"""
+        if movie.get("id"):
+            self._record_write(movie["id"], movie)
+        self._add(movie)
+
+    def remove(self, movie_id: str) -> None:
+        self._record_write(movie_id, None)
+        with self._lock:
+            self._remove_locked(movie_id)
+
+    def _record_write(self, movie_id: str, movie: Optional[Dict[str, Any]]) -> None:
+        # Recorded before the change is applied, so a swap in between replays it
+        with self._lock:
+            self._writes[movie_id] = (time.time(), movie)
+
+    def _add(self, movie: Dict[str, Any]) -> None:
+        movie_id = movie.get("id")
+        if not movie_id:
+            return
+
+        weights: Dict[str, float] = defaultdict(float)
+        for field, field_weight in FIELD_WEIGHTS.items():
+            for token in tokenize(movie.get(field)):
+                weights[token] += field_weight
+
+        with self._lock:
+            self._remove_locked(movie_id)
+            for token, weight in weights.items():
+                postings = self._postings[token]
+                if not postings:
+                    bisect.insort(self._terms, token)
+                postings[movie_id] = weight
+            self._docs[movie_id] = {field: movie.get(field) for field in DOC_FIELDS}
+            self._doc_terms[movie_id] = set(weights)
+
+    def _remove_locked(self, movie_id: str) -> None:
+        for token in self._doc_terms.pop(movie_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(movie_id, None)
+            if not postings:
+                del self._postings[token]
+                i = bisect.bisect_left(self._terms, token)
+                if i < len(self._terms) and self._terms[i] == token:
+                    del self._terms[i]
+        self._docs.pop(movie_id, None)
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Vocabulary terms starting with prefix"""
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + "\uffff", lo=start)
+        return self._terms[start:min(end, start + MAX_PREFIX_EXPANSION)]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Find movies matching every token in the query, best first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            total = max(len(self._docs), 1)
+            scores: Optional[Dict[str, float]] = None
+            for token in dict.fromkeys(tokens):
+                token_scores: Dict[str, float] = defaultdict(float)
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    # Whole-word matches rank above prefix matches
+                    boost = 1.0 if term == token else 0.5
+                    for movie_id, weight in postings.items():
+                        token_scores[movie_id] = max(token_scores[movie_id], weight * idf * boost)
+
+                if scores is None:
+                    scores = dict(token_scores)
+                else:
+                    scores = {
+                        movie_id: score + token_scores[movie_id]
+                        for movie_id, score in scores.items()
+                        if movie_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+            ranked = sorted(
+                scores.items(),
+                key=lambda entry: (-entry[1], str(self._docs[entry[0]].get("title") or ""))
+            )
+            return [dict(self._docs[movie_id], score=score) for movie_id, score in ranked[:limit]]
+
+    def rebuild(self, movies: Iterable[Dict[str, Any]], built_at: Optional[float] = None) -> None:
+        """Replace the whole index with the given movies.
+
+        built_at is when they were read; writes made through this index
+        since then are kept. It defaults to now.
+        """
+        built_at = time.time() if built_at is None else built_at
+        fresh = SearchIndex()
+        for movie in movies:
+            fresh._add(movie)
+        fresh.built_at = built_at
+        self._swap_from(fresh)
+
+    def _swap_from(self, other: "SearchIndex") -> None:
+        with self._lock:
+            self._postings = other._postings
+            self._terms = other._terms
+            self._docs = other._docs
+            self._doc_terms = other._doc_terms
+            self.built_at = other.built_at
+            # Replay this worker's writes that the new data may not include
+            self._writes = {
+                movie_id: write for movie_id, write in self._writes.items() if write[0] >= self.built_at
+            }
+            for movie_id, (_, movie) in self._writes.items():
+                if movie is None:
+                    self._remove_locked(movie_id)
+                else:
+                    self._add(movie)
+
+    def save(self, path: str) -> None:
+        """Write a JSON snapshot atomically so other workers never read a partial file.
+
+        Only the stored fields are written; postings are rebuilt on load.
+        JSON rather than pickle, so a tampered snapshot cannot run code.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self._lock:
+            data = {"format": SNAPSHOT_FORMAT, "built_at": self.built_at, "docs": list(self._docs.values())}
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, default=_json_default)
+        os.replace(tmp_path, path)
+        self.snapshot_mtime = os.path.getmtime(path)
+
+    def load(self, path: str) -> bool:
+        """Load a snapshot, returning False if it is missing, unreadable or from another format"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable search index snapshot {path}: {e}")
+            return False
+        if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+            return False
+        self.rebuild(data["docs"], built_at=data["built_at"])
+        self.snapshot_mtime = os.path.getmtime(path)
+        return True
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+index = SearchIndex()
+
+
+def _snapshot_age(path: str) -> Optional[float]:
+    try:
+        return time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+
+def refresh(path: str = SEARCH_INDEX_SNAPSHOT_PATH, max_age: int = SEARCH_INDEX_REFRESH_SECONDS) -> None:
+    """Bring this worker's index up to date.
+
+    Uses the on-disk snapshot when it is fresh enough. Otherwise one worker,
+    chosen by a file lock, rebuilds from a parallel scan and writes a new
+    snapshot while the others wait and then load it.
+    """
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            age = _snapshot_age(path)
+            if age is not None and age < max_age:
+                if os.path.getmtime(path) != index.snapshot_mtime and index.load(path):
+                    logger.info(f"Loaded search index snapshot with {len(index)} movies")
+                return
+
+            start = time.perf_counter()
+            # Writes made while the scan runs may be missing from it, so they count as newer
+            scan_started = time.time()
+            index.rebuild(aws_dynamodb.parallel_scan_movies(), built_at=scan_started)
+            index.save(path)
+            logger.info(f"Rebuilt search index with {len(index)} movies in {time.perf_counter() - start:.2f}s")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Keep the index current with writes made by this worker
+aws_dynamodb.register_movie_listener(on_put=index.add, on_delete=index.remove)
@@ -0,0 +1,117 @@
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+import logging
+
+from app.config import SINGLE_FLIGHT_SHARE_ERRORS
+from app.utils import metrics
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls into one.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and get the same result. Nothing is cached once
+    the call finishes. Async code reaches this through the threadpool, so
+    concurrent requests and threads share one backend call alike.
+
+    With share_errors off, waiters whose leader failed run the call
+    themselves instead of re-raising the leader's exception.
+    """
+
+    def __init__(self, share_errors: bool = SINGLE_FLIGHT_SHARE_ERRORS):
+        self.share_errors = share_errors
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.increment("single_flight.shared")
+            call.done.wait()
+            if call.error is None:
+                return _copy(call.result)
+            if self.share_errors:
+                raise call.error
+            return func(*args, **kwargs)
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def _copy(result: Any) -> Any:
+    # Callers may sort or modify what they get back, so each gets its own
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+_group = SingleFlight()
+
+# Bumped by invalidate_flights; part of the key of every call in the scope
+_generations_lock = threading.Lock()
+_generations: Dict[Hashable, int] = {}
+
+
+def invalidate_flights(scope: Hashable) -> None:
+    """Call after a write: reads in scope that start from now on will not join a flight started before it"""
+    with _generations_lock:
+        _generations[scope] = _generations.get(scope, 0) + 1
+
+
+def single_flight(func: Optional[Callable[..., Any]] = None, *,
+                  scope: Optional[Callable[..., Hashable]] = None) -> Callable[..., Any]:
+    """Decorate a blocking read so identical concurrent calls share one execution.
+
+    scope maps a call's arguments to the scope that writes it must see pass to
+    invalidate_flights, so that a user reading after their own write gets a
+    fresh call rather than the result of an older flight.
+    """
+    if func is None:
+        return functools.partial(single_flight, scope=scope)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, _freeze(args), _freeze(kwargs))
+        if scope is not None:
+            with _generations_lock:
+                key += (_generations.get(scope(*args, **kwargs), 0),)
+        return _group.do(key, func, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,78 @@
+"""Measure SuggestIndex memory and suggest() latency on synthetic movies.
+
+Usage: python -m benchmarks.suggest_index [suggestions] [queries]
+
+Every movie gets a unique three-word title and a unique director, so the
+index holds about two suggestions per movie plus the genres. Memory is
+what tracemalloc sees the built index retain, not counting the movie
+dicts it was built from. Queries are 1-8 character prefixes of words in
+the stored titles and directors, typed the way a typeahead sends them.
+"""
+import random
+import statistics
+import string
+import sys
+import time
+import tracemalloc
+
+from app.utils.suggest_index import SuggestIndex
+
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Romance", "Sci-Fi", "Thriller", "Documentary"]
+
+
+def generate(n_movies: int, seed: int = 1):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(20_000)]
+    return [
+        {
+            "id": f"movie-{i}",
+            "title": " ".join(rng.choice(vocabulary) for _ in range(3)).title() + f" {i}",
+            "director": f"{rng.choice(vocabulary).title()} {rng.choice(vocabulary).title()} {i}",
+            "genre": rng.choice(GENRES),
+            # Rating counts follow a long tail, as on the real site
+            "rating_count": int(rng.paretovariate(1.2)),
+        }
+        for i in range(n_movies)
+    ]
+
+
+def queries(movies, n: int, seed: int = 2):
+    rng = random.Random(seed)
+    result = []
+    for _ in range(n):
+        movie = rng.choice(movies)
+        word = rng.choice(movie[rng.choice(("title", "director"))].split())
+        result.append(word[:rng.randint(1, 8)])
+    return result
+
+
+def run(n_suggestions: int, n_queries: int) -> None:
+    movies = generate(n_suggestions // 2)
+    index = SuggestIndex()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.rebuild(movies)
+    built = time.perf_counter()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    for query in queries(movies, n_queries):
+        begin = time.perf_counter()
+        index.suggest(query)
+        latencies.append((time.perf_counter() - begin) * 1000)
+    percentiles = statistics.quantiles(latencies, n=100)
+
+    print(f"{len(index):,} suggestions from {len(movies):,} movies: "
+          f"rebuild {built - start:.1f}s, "
+          f"index {size / 2**20:.0f} MB ({size / len(index):.0f} bytes per suggestion), "
+          f"peak during rebuild {peak / 2**20:.0f} MB")
+    print(f"{n_queries:,} queries: suggest() p50 {percentiles[49]:.3f} ms, "
+          f"p99 {percentiles[98]:.3f} ms, max {max(latencies):.3f} ms")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [1_000_000, 20_000]
+    run(*(args + defaults[len(args):]))
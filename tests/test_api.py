@@ -0,0 +1,136 @@
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from decimal import Decimal
+from app.main import app
+from app.routers.api import encode_cursor, decode_cursor
+from app.utils import aws_dynamodb
+import pytest
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def test_movies():
+    return [
+        {
+            "id": f"movie_{i}",
+            "title": f"Movie {i}",
+            "genre": "Drama",
+            "director": "Director",
+            "release_time": "2023-01-01T00:00:00",
+            "rating": Decimal(7),
+            "user_id": Decimal(1),
+            "s3_key": f"movies/movie_{i}/file.mp4"
+        }
+        for i in range(3)
+    ]
+
+def test_cursor_round_trip():
+    key = {"id": "movie_1", "genre": "Drama", "rating": Decimal(7)}
+    assert decode_cursor(encode_cursor(key)) == key
+    assert encode_cursor(None) is None
+
+@patch("app.utils.aws_dynamodb.scan_movies_page")
+def test_browse_movies_page(mock_scan, test_movies):
+    mock_scan.return_value = (test_movies, {"id": "movie_2"})
+
+    response = client.get("/api/v1/movies?limit=3")
+    assert response.status_code == 200
+    body = response.json()
+    assert [movie["id"] for movie in body["items"]] == ["movie_0", "movie_1", "movie_2"]
+    assert body["items"][0]["rating"] == 7.0
+    assert decode_cursor(body["next_cursor"]) == {"id": "movie_2"}
+    mock_scan.assert_called_once_with(3, None, None)
+
+@patch("app.utils.aws_dynamodb.scan_movies_page")
+def test_browse_movies_sparse_fields(mock_scan, test_movies):
+    mock_scan.return_value = (test_movies, None)
+
+    response = client.get("/api/v1/movies?fields=id,title")
+    assert response.status_code == 200
+    assert response.json()["items"][0] == {"id": "movie_0", "title": "Movie 0"}
+    assert response.json()["next_cursor"] is None
+
+def test_browse_multiple_genres_merged_by_rating(test_movies):
+    by_genre = {
+        "Drama": [dict(test_movies[0], id="d1", rating=Decimal(9)), dict(test_movies[0], id="d2", rating=Decimal(4))],
+        "Comedy": [dict(test_movies[0], id="c1", genre="Comedy", rating=Decimal(8)),
+                   dict(test_movies[0], id="c2", genre="Comedy", rating=Decimal(7))],
+    }
+
+    def fake_page(table, method, limit, start_key=None, genre=None, min_rating=None):
+        items = by_genre[genre]
+        start = [item["id"] for item in items].index(start_key["id"]) + 1 if start_key else 0
+        page = items[start:start + limit]
+        last_key = page[-1] if start + limit < len(items) else None
+        return page, last_key and {"id": last_key["id"], "genre": genre, "rating": last_key["rating"]}
+
+    with patch("app.utils.aws_dynamodb._ClientTable"), \
+            patch("app.utils.aws_dynamodb._query_page", side_effect=fake_page), \
+            patch("app.utils.aws_dynamodb._genre_rating_query",
+                  side_effect=lambda genre, min_rating: {"genre": genre, "min_rating": min_rating}):
+        first = client.get("/api/v1/movies?genre=drama,Comedy&limit=3").json()
+        assert [movie["id"] for movie in first["items"]] == ["d1", "c1", "c2"]
+
+        second = client.get(f"/api/v1/movies?genre=drama,Comedy&limit=3&cursor={first['next_cursor']}").json()
+        assert [movie["id"] for movie in second["items"]] == ["d2"]
+        assert second["next_cursor"] is None
+
+def test_normalize_genre():
+    assert aws_dynamodb.normalize_genre("  children's ") == "Children's"
+    assert aws_dynamodb.normalize_genre("film-noir") == "Film-Noir"
+    assert aws_dynamodb.normalize_genre("SCI-FI") == "Sci-Fi"
+    assert aws_dynamodb.normalize_genre("science  fiction") == "Science Fiction"
+    assert aws_dynamodb.normalize_genre(None) is None
+
+@patch("app.utils.aws_dynamodb._notify_movie_put")
+@patch("app.utils.aws_dynamodb.movies_table")
+@patch("app.utils.aws_dynamodb.parallel_scan_movies")
+def test_normalize_movie_genres_bumps_version(mock_scan, mock_movies_table, mock_notify):
+    mock_scan.return_value = [{"id": "1", "genre": "sci-fi"}, {"id": "2", "genre": "Drama"}]
+    updated = {"id": "1", "genre": "Sci-Fi", "version": Decimal(3)}
+    mock_movies_table.update_item.return_value = {"Attributes": updated}
+
+    assert aws_dynamodb.normalize_movie_genres() == 1
+    kwargs = mock_movies_table.update_item.call_args.kwargs
+    assert kwargs["UpdateExpression"] == "SET genre = :g ADD version :one"
+    mock_notify.assert_called_once_with(updated)
+
+def test_unknown_field_rejected():
+    with patch("app.utils.aws_dynamodb.scan_movies_page", return_value=([], None)):
+        response = client.get("/api/v1/movies?fields=id,s3_secret")
+    assert response.status_code == 400
+
+def test_invalid_cursor_rejected():
+    response = client.get("/api/v1/movies?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+@patch("app.utils.aws_dynamodb.get_comments_by_movie_page")
+def test_movie_comments_page(mock_comments):
+    mock_comments.return_value = ([{
+        "id": "movie_0_1700000000.0",
+        "movie_id": "movie_0",
+        "user_id": Decimal(1),
+        "content": "Great",
+        "timestamp": "2023-11-14T22:13:20+00:00"
+    }], None)
+
+    response = client.get("/api/v1/movies/movie_0/comments")
+    assert response.status_code == 200
+    assert response.json()["items"][0]["content"] == "Great"
+    assert response.json()["items"][0]["deleted"] is False
+
+
+@patch("app.utils.aws_dynamodb.get_comments_by_movie_page")
+def test_deleted_comment_marked(mock_comments):
+    mock_comments.return_value = ([{
+        "id": "movie_0_1700000000.0",
+        "movie_id": "movie_0",
+        "user_id": Decimal(1),
+        "content": "",
+        "deleted": True,
+        "reply_count": Decimal(2),
+        "timestamp": "2023-11-14T22:13:20+00:00"
+    }], None)
+
+    response = client.get("/api/v1/movies/movie_0/comments?fields=id,deleted")
+    assert response.json()["items"] == [{"id": "movie_0_1700000000.0", "deleted": True}]
@@ -0,0 +1,57 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import assets
+import gzip
+import json
+import pytest
+
+
+def test_build_assets_fingerprints_and_compresses(tmp_path):
+    css_dir = tmp_path / "css"
+    css_dir.mkdir()
+    (css_dir / "styles.css").write_text("body { color: red; }")
+
+    manifest = assets.build_assets(static_dir=str(tmp_path))
+
+    hashed = manifest["css/styles.css"]
+    assert hashed.startswith("build/css/styles.") and hashed.endswith(".css")
+    built = tmp_path / hashed
+    assert built.read_text() == "body { color: red; }"
+    assert gzip.decompress((tmp_path / (hashed + ".gz")).read_bytes()) == b"body { color: red; }"
+    assert json.loads((tmp_path / "build" / "manifest.json").read_text()) == manifest
+
+def test_asset_url_uses_manifest(monkeypatch):
+    monkeypatch.setattr(assets, "_manifest", {"css/styles.css": "build/css/styles.abc123.css"})
+    assert assets.asset_url("css/styles.css") == "/static/build/css/styles.abc123.css"
+    assert assets.asset_url("/images/logo.png") == "/static/images/logo.png"
+
+@pytest.fixture
+def static_client(tmp_path):
+    (tmp_path / "styles.css").write_text("body { color: red; }")
+    manifest = assets.build_assets(static_dir=str(tmp_path))
+    static_app = FastAPI()
+    static_app.mount("/static", assets.PrecompressedStaticFiles(directory=str(tmp_path)))
+    return TestClient(static_app), f"/static/{manifest['styles.css']}"
+
+def test_precompressed_variant_served(static_client):
+    client, url = static_client
+    response = client.get(url, headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == assets.IMMUTABLE_CACHE_CONTROL
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.text == "body { color: red; }"
+
+def test_refused_encodings_get_the_plain_file(static_client):
+    client, url = static_client
+    response = client.get(url, headers={"Accept-Encoding": "gzip;q=0, br;q=0"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Cache-Control"] == assets.IMMUTABLE_CACHE_CONTROL
+    assert response.text == "body { color: red; }"
+
+def test_accepts_encoding():
+    assert assets.accepts_encoding("gzip, deflate", "gzip")
+    assert not assets.accepts_encoding("gzip;q=0", "gzip")
+    assert not assets.accepts_encoding("gzip", "br")
+    assert assets.accepts_encoding("*;q=0.5", "br")
+    assert not assets.accepts_encoding("*, br;q=0", "br")
+    assert not assets.accepts_encoding("xgzip", "gzip")
@@ -1,15 +1,23 @@
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
-from app.database import Base
+from unittest.mock import patch
+from app.database import Base, ThreadedSession, get_async_url, has_async_driver
 from app.main import app
-from app.dependencies import get_db
+from app.dependencies import get_db, get_async_db
+from app.models import user as user_model
+from app.utils import password_hashing
+import asyncio
+import httpx
 import pytest
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(get_async_url(SQLALCHEMY_DATABASE_URL))
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
 
 Base.metadata.create_all(bind=engine)
 
@@ -20,7 +28,12 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 client = TestClient(app)
 
@@ -72,4 +85,65 @@ def test_login_nonexistent_user():
         "password": "somepassword"
     })
     assert response.status_code == 400
-    assert "Incorrect username or password" in response.json()["detail"]
\ No newline at end of file
+    assert "Incorrect username or password" in response.json()["detail"]
+
+def test_get_async_url():
+    assert str(get_async_url("sqlite:///./test.db")) == "sqlite+aiosqlite:///./test.db"
+    assert get_async_url("postgresql+psycopg2://u:p@host/db").drivername == "postgresql+asyncpg"
+    # Production uses pymssql, which has no async counterpart
+    assert not has_async_driver("mssql+pymssql://u:p@host:1433/YouFlix")
+    with pytest.raises(ValueError):
+        get_async_url("mssql+pymssql://u:p@host:1433/YouFlix")
+
+def test_threaded_session_stands_in_for_async_session():
+    async def lookups():
+        async with ThreadedSession(TestingSessionLocal) as db:
+            created = await user_model.create_user_async(db, {
+                "username": "threadeduser", "email": "threaded@example.com", "hashed_password": "x"
+            })
+            found = await user_model.get_user_by_username_async(db, "threadeduser")
+            assert found.id == created.id
+            await user_model.delete_user_async(db, created.id)
+            assert await user_model.get_user_by_username_async(db, "threadeduser") is None
+    asyncio.run(lookups())
+
+@pytest.fixture(scope="module")
+def login_user():
+    db = TestingSessionLocal()
+    try:
+        if not user_model.get_user_by_username(db, "paralleluser"):
+            user_model.create_user(db, {
+                "username": "paralleluser", "email": "parallel@example.com",
+                "hashed_password": password_hashing.pwd_context.hash("parallelpassword")
+            })
+    finally:
+        db.close()
+    return {"username": "paralleluser", "password": "parallelpassword"}
+
+def test_parallel_logins_overlap(login_user):
+    in_flight = 0
+    max_in_flight = 0
+    original = user_model.get_user_by_username_async
+
+    async def tracking_lookup(db, username):
+        # Counts logins whose real database lookup is awaiting at the same time
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            return await original(db, username)
+        finally:
+            in_flight -= 1
+
+    async def run_logins():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post("/auth/login", data=login_user) for _ in range(5)
+            ))
+
+    with patch("app.routers.auth.get_user_by_username_async", tracking_lookup):
+        responses = asyncio.run(run_logins())
+
+    assert all(response.status_code == 302 for response in responses)
+    assert max_in_flight > 1
@@ -0,0 +1,176 @@
+from unittest.mock import patch, MagicMock
+from fastapi import HTTPException, Request
+from fastapi.testclient import TestClient
+from app.dependencies import require_metrics_access
+from app.main import app
+from app.models.user import User
+from app.utils import aws_dynamodb, capacity
+from app.utils.capacity import CapacityExceeded, CapacityLimiter, UserWriteLimiter, HIGH, LOW
+import contextvars
+import pytest
+
+
+def consumed(table, units, **indexes):
+    return {
+        "TableName": table, "CapacityUnits": units + sum(indexes.values()), "Table": {"CapacityUnits": units},
+        "GlobalSecondaryIndexes": {name: {"CapacityUnits": n} for name, n in indexes.items()}
+    }
+
+def test_low_priority_writes_leave_a_reserve():
+    limiter = CapacityLimiter(rate=1, burst_seconds=10, low_priority_reserve=0.5)
+    assert limiter.admit("movies", LOW) == 0
+    limiter.record(consumed("movies", 5))
+    # 5 of 10 tokens left: enough for user writes but inside the reserve
+    assert limiter.admit("movies", HIGH) == 0
+    assert limiter.admit("movies", LOW) > 0
+
+def test_busy_index_holds_back_its_table():
+    limiter = CapacityLimiter(rate=1, burst_seconds=10)
+    limiter.record(consumed("movies", 1, TrendingIndex=12))
+    assert limiter.admit("movies", HIGH) == pytest.approx(3, abs=0.1)
+    assert limiter.admit("comments", HIGH) == 0
+
+def test_throttling_drains_the_table():
+    limiter = CapacityLimiter(rate=1, burst_seconds=10)
+    limiter.throttled("movies")
+    assert limiter.admit("movies", HIGH) > 0
+
+def test_user_write_limit():
+    limiter = UserWriteLimiter(rate_per_minute=1, burst=2)
+    limiter.check(1, "rating")
+    limiter.check(1, "rating")
+    with pytest.raises(CapacityExceeded) as error:
+        limiter.check(1, "rating")
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) > 0
+    # Other users and other kinds of writes have their own buckets
+    limiter.check(2, "rating")
+    limiter.check(1, "comment")
+
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_write_records_consumed_capacity(mock_movies_table):
+    mock_movies_table.name = "movies"
+    mock_movies_table.update_item.return_value = {"ConsumedCapacity": consumed("movies", 1, TrendingIndex=1)}
+    with patch.object(capacity, "limiter", CapacityLimiter(rate=1, burst_seconds=10)) as limiter:
+        aws_dynamodb.increment_movie_counters("heat", {"view_count": 1})
+        assert mock_movies_table.update_item.call_args.kwargs["ReturnConsumedCapacity"] == "INDEXES"
+        assert set(limiter._buckets) == {"movies", "movies:TrendingIndex"}
+
+        limiter.throttled("movies")
+        with pytest.raises(CapacityExceeded):
+            aws_dynamodb.increment_movie_counters("heat", {"view_count": 1})
+    assert mock_movies_table.update_item.call_count == 1
+
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_trending_dropped_when_over_capacity(mock_movies_table):
+    mock_movies_table.name = "movies"
+    with patch.object(capacity, "limiter", CapacityLimiter(rate=1, burst_seconds=10)) as limiter:
+        limiter.throttled("movies")
+        aws_dynamodb.record_trending_event("heat", "download")
+    mock_movies_table.update_item.assert_not_called()
+
+class Model:
+    def __init__(self, name):
+        self.name = name
+
+def test_every_call_asks_for_consumed_capacity():
+    params = {"TableName": "movies"}
+    aws_dynamodb._request_consumed_capacity(params, Model("Scan"))
+    assert params["ReturnConsumedCapacity"] == "INDEXES"
+    params = {"TableName": "movies"}
+    aws_dynamodb._request_consumed_capacity(params, Model("DescribeTable"))
+    assert "ReturnConsumedCapacity" not in params
+
+@patch("app.utils.capacity.metrics")
+def test_capacity_charged_to_operation_and_route(mock_metrics):
+    @capacity.accounted
+    def scan_movies():
+        aws_dynamodb._account_consumed_capacity(
+            {"ConsumedCapacity": {"TableName": "movies", "CapacityUnits": 60.0}}, Model("Scan"))
+        nested()
+
+    @capacity.accounted
+    def nested():
+        aws_dynamodb._account_consumed_capacity(
+            {"ConsumedCapacity": [{"TableName": "movies", "CapacityUnits": 2.0}]}, Model("BatchGetItem"))
+
+    def request():
+        usage = capacity.start_request()
+        scan_movies()
+        capacity.finish_request("index", usage)
+    # As the middleware does, in the context of its own request
+    contextvars.copy_context().run(request)
+    mock_metrics.observe.assert_any_call("dynamodb.rcu_per_request.index.scan_movies", 62.0)
+    mock_metrics.observe.assert_any_call("dynamodb.wcu_per_request.index.scan_movies", 0)
+    mock_metrics.increment.assert_any_call("dynamodb.expensive_scans.index.scan_movies")
+
+def test_report():
+    snapshot = {
+        "counters": {"dynamodb.expensive_scans.index.scan_movies": 1},
+        "histograms": {
+            "dynamodb.rcu_per_request.index.scan_movies": {"count": 2, "sum": 120.0, "min": 50.0, "max": 70.0},
+            "dynamodb.wcu_per_request.index.scan_movies": {"count": 2, "sum": 0.0, "min": 0.0, "max": 0.0},
+            "dynamodb.rcu_per_request.movie_detail.get_movie": {"count": 4, "sum": 2.0, "min": 0.5, "max": 0.5},
+            "db.pool.checkout_wait_seconds": {"count": 1, "sum": 0.1, "min": 0.1, "max": 0.1},
+        }
+    }
+    report = capacity.report(snapshot)
+    assert list(report) == ["index", "movie_detail"]
+    assert report["index"]["scan_movies"]["rcu_per_request"] == 60.0
+    assert report["index"]["scan_movies"]["expensive_scans"] == 1
+    assert report["movie_detail"]["get_movie"]["requests"] == 4
+
+def test_metrics_served_only_to_local_callers():
+    assert TestClient(app).get("/metrics/capacity").status_code == 403
+
+    def request(host, headers=()):
+        return Request({"type": "http", "client": (host, 40000), "headers": list(headers)})
+
+    require_metrics_access(request("127.0.0.1"))
+    for denied in (request("203.0.113.7"),
+                   # Proxied requests come from the proxy's loopback address
+                   request("127.0.0.1", [(b"x-forwarded-for", b"203.0.113.7")])):
+        with pytest.raises(HTTPException):
+            require_metrics_access(denied)
+
+@patch("app.dependencies.METRICS_TOKEN", "s3cret")
+def test_metrics_token():
+    client = TestClient(app)
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+@pytest.fixture
+def signed_in():
+    with patch("app.main.get_current_user_from_cookie") as mock_current_user:
+        mock_current_user.return_value = User(id=1, username="testuser", email="test@example.com",
+                                              hashed_password="hashedpassword")
+        yield
+
+@patch("app.utils.aws_s3.upload_movie")
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_upload_over_capacity_stores_nothing(mock_movies_table, mock_upload_movie, signed_in):
+    mock_movies_table.name = "movies"
+    with patch.object(capacity, "limiter", CapacityLimiter(rate=1, burst_seconds=10)) as limiter:
+        limiter.throttled("movies")
+        response = TestClient(app).post(
+            "/movies/", data={"title": "Heat", "genre": "Action", "director": "Mann", "release_time": "1995"},
+            files={"file": ("heat.mp4", b"video", "video/mp4")}, follow_redirects=False
+        )
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    mock_upload_movie.assert_not_called()
+    mock_movies_table.put_item.assert_not_called()
+
+@patch("app.utils.aws_s3.delete_movie")
+@patch("app.utils.aws_dynamodb.get_movie")
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_delete_over_capacity_keeps_the_file(mock_movies_table, mock_get_movie, mock_delete_file, signed_in):
+    mock_movies_table.name = "movies"
+    mock_get_movie.return_value = {"id": "heat", "user_id": 1, "s3_key": "movies/heat/heat.mp4"}
+    with patch.object(capacity, "limiter", CapacityLimiter(rate=1, burst_seconds=10)) as limiter:
+        limiter.throttled("movies")
+        response = TestClient(app).post("/movies/heat/delete", follow_redirects=False)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    mock_delete_file.assert_not_called()
@@ -0,0 +1,91 @@
+from unittest.mock import patch, MagicMock
+from app.utils import aws_dynamodb
+import pytest
+
+
+def pages(*pages):
+    """query results for each page in turn, linked by LastEvaluatedKey"""
+    responses = []
+    for i, items in enumerate(pages):
+        response = {"Items": items}
+        if i < len(pages) - 1:
+            response["LastEvaluatedKey"] = {"page": i}
+        responses.append(response)
+    return responses
+
+@pytest.fixture
+def tables():
+    with patch("app.utils.aws_dynamodb.comments_table") as comments, \
+            patch("app.utils.aws_dynamodb.ratings_table") as ratings, \
+            patch("app.utils.aws_dynamodb.stats_table") as stats, \
+            patch.object(aws_dynamodb.dynamodb, "batch_write_item") as batch_write_item, \
+            patch("app.utils.aws_dynamodb.time.sleep"):
+        comments.name, ratings.name, stats.name = "comments", "ratings", "stats"
+        stats.update_item.return_value = {"Attributes": {"status": "done"}}
+        batch_write_item.return_value = {}
+        yield comments, ratings, stats, batch_write_item
+
+def test_cascade_deletes_comments_and_ratings(tables):
+    comments, ratings, stats, batch_write_item = tables
+    comments.query.side_effect = pages([{"id": f"c{i}"} for i in range(30)], [{"id": "c30"}])
+    ratings.query.side_effect = pages([{"movie_id": "heat", "user_id": 1}])
+
+    assert aws_dynamodb.cascade_delete_movie("heat") == {"status": "done"}
+
+    assert comments.query.call_args_list[1].kwargs["ExclusiveStartKey"] == {"page": 0}
+    assert comments.query.call_args.kwargs["IndexName"] == "MovieIndex"
+    chunks = [call.kwargs["RequestItems"] for call in batch_write_item.call_args_list]
+    # 25 items per BatchWriteItem
+    assert [len(next(iter(chunk.values()))) for chunk in chunks] == [25, 5, 1, 1]
+    assert chunks[-1] == {"ratings": [{"DeleteRequest": {"Key": {"movie_id": "heat", "user_id": 1}}}]}
+    progress = [call.kwargs["ExpressionAttributeValues"].get(":n") for call in stats.update_item.call_args_list]
+    assert progress == [None, 30, 1, 1, None]
+
+def test_unprocessed_items_retried(tables):
+    comments, ratings, stats, batch_write_item = tables
+    comments.query.side_effect = pages([{"id": "c1"}, {"id": "c2"}])
+    ratings.query.side_effect = pages([])
+    unprocessed = {"comments": [{"DeleteRequest": {"Key": {"id": "c2"}}}]}
+    batch_write_item.side_effect = [{"UnprocessedItems": unprocessed}, {"UnprocessedItems": {}}]
+
+    aws_dynamodb.cascade_delete_movie("heat")
+    assert batch_write_item.call_args_list[1].kwargs["RequestItems"] == unprocessed
+
+def test_failure_recorded_for_resume(tables):
+    comments, ratings, stats, batch_write_item = tables
+    comments.query.side_effect = pages([{"id": "c1"}])
+    batch_write_item.return_value = {"UnprocessedItems": {"comments": [{"DeleteRequest": {"Key": {"id": "c1"}}}]}}
+
+    aws_dynamodb.cascade_delete_movie("heat")
+    assert batch_write_item.call_count == aws_dynamodb.BATCH_WRITE_ATTEMPTS
+    final = stats.update_item.call_args.kwargs
+    assert final["ExpressionAttributeValues"][":failed"] == "failed"
+    ratings.query.assert_not_called()
+
+def test_cleanup_claimed_by_one_worker(tables):
+    comments, ratings, stats, batch_write_item = tables
+    conflict = aws_dynamodb.dynamodb.meta.client.exceptions.ConditionalCheckFailedException(
+        {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+    stats.update_item.side_effect = conflict
+
+    assert aws_dynamodb.cascade_delete_movie("heat") is None
+    claim = stats.update_item.call_args.kwargs
+    assert "lease_until < :now" in claim["ConditionExpression"]
+    comments.query.assert_not_called()
+
+@patch("app.utils.aws_dynamodb.cascade_delete_movie")
+@patch("app.utils.aws_dynamodb.parallel_scan")
+def test_resume_skips_leased_cleanups(mock_scan, mock_cascade_delete):
+    now = aws_dynamodb.time.time()
+    mock_scan.return_value = [
+        {"id": "cascade#abandoned", "status": "running", "lease_until": now - 10},
+        {"id": "cascade#pending", "status": "pending"},
+        {"id": "cascade#busy", "status": "running", "lease_until": now + 60},
+        {"id": "cascade#finished", "status": "done"},
+        {"id": "genre_counts"},
+    ]
+    # pending was claimed by another worker in the meantime
+    mock_cascade_delete.side_effect = lambda movie_id: None if movie_id == "pending" else {"status": "done"}
+
+    assert aws_dynamodb.resume_cascades() == 1
+    assert [call.args[0] for call in mock_cascade_delete.call_args_list] == ["abandoned", "pending"]
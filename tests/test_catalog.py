@@ -0,0 +1,58 @@
+from unittest.mock import patch
+from app.utils.catalog import CatalogSnapshot
+import pytest
+
+
+MOVIES = [
+    {"id": "1", "title": "Heat", "genre": "Action", "rating": 8},
+    {"id": "2", "title": "Clue", "genre": "Comedy", "rating": 6},
+    {"id": "3", "title": "Ronin", "genre": "Action", "rating": 7},
+]
+
+
+@pytest.fixture
+def snapshot():
+    snapshot = CatalogSnapshot(refresh_seconds=60, max_staleness=300)
+    with patch("app.utils.aws_dynamodb.parallel_scan_movies", return_value=list(MOVIES)):
+        snapshot.refresh()
+    return snapshot
+
+def test_browse_filters_and_sorts(snapshot):
+    assert [m["id"] for m in snapshot.browse([])] == ["1", "3", "2"]
+    assert [m["id"] for m in snapshot.browse(["action"], min_rating=8)] == ["1"]
+    assert snapshot.genre_counts() == {"Action": 2, "Comedy": 1}
+
+def test_stale_while_revalidate(snapshot):
+    with patch.object(snapshot, "_refresh_in_background") as mock_refresh:
+        assert snapshot.movies() is not None
+        mock_refresh.assert_not_called()
+
+        # Stale but within max staleness: served, and a refresh is started
+        snapshot._loaded_at -= 120
+        assert snapshot.movies() is not None
+        mock_refresh.assert_called_once()
+
+        # Too stale: not served, so callers go to DynamoDB
+        snapshot._loaded_at -= 300
+        assert snapshot.movies() is None
+
+def test_nothing_served_before_first_load():
+    snapshot = CatalogSnapshot()
+    with patch.object(snapshot, "_refresh_in_background") as mock_refresh:
+        assert snapshot.browse([]) is None
+        mock_refresh.assert_called_once()
+
+def test_local_writes_patch_snapshot(snapshot):
+    snapshot.put({"id": "4", "title": "Up", "genre": "Comedy", "rating": 9})
+    snapshot.remove("1")
+    assert [m["id"] for m in snapshot.browse([])] == ["4", "3", "2"]
+
+def test_writes_during_refresh_are_replayed(snapshot):
+    def scan_with_concurrent_write():
+        snapshot.put({"id": "4", "title": "Up", "genre": "Comedy", "rating": 9})
+        snapshot.remove("2")
+        return list(MOVIES)
+
+    with patch("app.utils.aws_dynamodb.parallel_scan_movies", side_effect=scan_with_concurrent_write):
+        snapshot.refresh()
+    assert [m["id"] for m in snapshot.browse([])] == ["4", "1", "3"]
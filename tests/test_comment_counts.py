@@ -0,0 +1,57 @@
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils import aws_dynamodb
+import pytest
+
+
+@patch("app.utils.aws_dynamodb.record_trending_event")
+@patch("app.utils.aws_dynamodb.comments_table")
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_add_comment_increments_count(mock_movies_table, mock_comments_table, mock_record_trending_event):
+    mock_movies_table.update_item.return_value = {"Attributes": {"id": "heat", "comment_count": 1}}
+    aws_dynamodb.add_comment("heat", 1, "Great heist")
+
+    update = mock_movies_table.update_item.call_args.kwargs
+    assert update["UpdateExpression"] == "ADD comment_count :d, version :one"
+    assert update["ExpressionAttributeValues"][":d"] == 1
+
+@patch("app.utils.aws_dynamodb.comments_table")
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_delete_comment_decrements_count_once(mock_movies_table, mock_comments_table):
+    mock_comments_table.delete_item.return_value = {"Attributes": {"id": "heat_1", "movie_id": "heat"}}
+    aws_dynamodb.delete_comment("heat_1")
+    assert mock_movies_table.update_item.call_args.kwargs["ExpressionAttributeValues"][":d"] == -1
+
+    # Deleting it again removes nothing, so the count is left alone
+    mock_movies_table.update_item.reset_mock()
+    mock_comments_table.delete_item.return_value = {}
+    aws_dynamodb.delete_comment("heat_1")
+    mock_movies_table.update_item.assert_not_called()
+
+@patch("app.utils.aws_dynamodb.parallel_scan_movies")
+@patch("app.utils.aws_dynamodb.parallel_scan")
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_recount_fixes_drifted_counts(mock_movies_table, mock_scan, mock_scan_movies):
+    mock_scan.return_value = [{"movie_id": "heat"}, {"movie_id": "heat"}, {"movie_id": "ronin"}]
+    mock_scan_movies.return_value = [
+        {"id": "heat", "comment_count": 2},
+        {"id": "ronin", "comment_count": 3},
+        {"id": "clue", "comment_count": 1},
+    ]
+
+    assert aws_dynamodb.recount_comments() == 2
+    assert mock_scan.call_args.kwargs["IndexName"] == "MovieIndex"
+    updates = {call.kwargs["Key"]["id"]: call.kwargs["ExpressionAttributeValues"][":n"]
+               for call in mock_movies_table.update_item.call_args_list}
+    assert updates == {"ronin": 1, "clue": 0}
+
+@patch("app.utils.aws_dynamodb.get_genre_counts", return_value={})
+@patch("app.utils.aws_dynamodb.scan_movies")
+def test_browse_cards_show_comment_count(mock_scan_movies, mock_genre_counts):
+    mock_scan_movies.return_value = [
+        {"id": "counted", "title": "Heat", "genre": "Action", "rating": 8, "comment_count": 3, "version": 7}
+    ]
+    response = TestClient(app).get("/movies/browse")
+    assert response.status_code == 200
+    assert "<strong>Comments:</strong> 3" in response.text
@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.main import app
+from app.models.user import User
+from app.utils.comment_events import CommentHub, LocalBroadcast, UnixSocketBroadcast, CREDENTIALS, _sender_uid
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import pytest
+
+client = TestClient(app)
+
+COMMENT = {
+    "id": "heat_1", "movie_id": "heat", "user_id": 1, "content": "Great heist",
+    "timestamp": datetime(2024, 1, 1, tzinfo=timezone.utc), "version": Decimal(2)
+}
+
+def test_subscribers_get_events_for_their_movie():
+    hub = CommentHub(LocalBroadcast())
+    hub.start()
+
+    async def listen():
+        with hub.subscribe("heat") as heat, hub.subscribe("ronin") as ronin:
+            # Writes usually happen on threadpool threads
+            thread = threading.Thread(target=hub.publish, args=("added", COMMENT))
+            thread.start()
+            event = await asyncio.wait_for(heat.get(), 1)
+            thread.join()
+            assert ronin.empty()
+            return event
+
+    event = asyncio.run(listen())
+    assert event["change"] == "added"
+    assert event["comment"]["timestamp"] == "2024-01-01T00:00:00+00:00"
+    assert event["comment"]["version"] == 2
+
+def test_unsubscribed_after_block():
+    hub = CommentHub(LocalBroadcast())
+
+    async def listen():
+        with hub.subscribe("heat"):
+            pass
+    asyncio.run(listen())
+    assert hub._subscribers == {}
+    hub.publish("deleted", COMMENT)
+
+def test_unix_socket_broadcast_reaches_other_workers(tmp_path):
+    delivered = []
+    backend = UnixSocketBroadcast(str(tmp_path))
+    backend.start(delivered.append)
+    # Stand-ins for two other workers: one alive, one that died without cleaning up
+    peer = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    peer.bind(str(tmp_path / "1.sock"))
+    peer.settimeout(1)
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    dead.bind(str(tmp_path / "2.sock"))
+    dead.close()
+
+    try:
+        event = {"change": "added", "movie_id": "heat", "comment": {"id": "heat_1"}}
+        backend.publish(event)
+        assert delivered == [event]
+        assert json.loads(peer.recv(65536)) == event
+        assert not os.path.exists(tmp_path / "2.sock")
+
+        # And events published by other workers are delivered here
+        peer.sendto(json.dumps(event).encode(), str(tmp_path / f"{os.getpid()}.sock"))
+        for _ in range(100):
+            if len(delivered) == 2:
+                break
+            time.sleep(0.01)
+        assert delivered == [event, event]
+    finally:
+        peer.close()
+        backend.stop()
+
+def test_unix_socket_dir_must_be_private(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    with pytest.raises(RuntimeError):
+        UnixSocketBroadcast(str(shared)).start(lambda event: None)
+
+    private = tmp_path / "private"
+    backend = UnixSocketBroadcast(str(private))
+    backend.start(lambda event: None)
+    backend.stop()
+    assert private.stat().st_mode & 0o777 == 0o700
+
+@pytest.mark.skipif(not hasattr(socket, "SO_PASSCRED"), reason="sender credentials are Linux only")
+def test_sender_uid_from_credentials():
+    assert _sender_uid([(socket.SOL_SOCKET, socket.SCM_CREDENTIALS, CREDENTIALS.pack(1, 1234, 1234))]) == 1234
+    assert _sender_uid([]) is None
+
+@patch("app.main.get_current_user_from_cookie")
+@patch("app.utils.aws_dynamodb.add_comment")
+def test_htmx_add_comment_returns_no_content(mock_add_comment, mock_current_user):
+    mock_current_user.return_value = User(id=1, username="testuser", email="test@example.com",
+                                          hashed_password="hashedpassword")
+    response = client.post(
+        "/comments/add", data={"movie_id": "heat", "content": "Great heist"},
+        headers={"HX-Request": "true"}
+    )
+    # The comment itself reaches the page over the event stream
+    assert response.status_code == 204
+    mock_add_comment.assert_called_once_with(movie_id="heat", user_id=1, content="Great heist", parent_id=None)
+
+@patch("app.main.get_current_user_from_cookie")
+@patch("app.utils.aws_dynamodb.add_comment")
+def test_add_reply(mock_add_comment, mock_current_user):
+    mock_current_user.return_value = User(id=2, username="replier", email="replier@example.com",
+                                          hashed_password="hashedpassword")
+    response = client.post(
+        "/comments/add", data={"movie_id": "heat", "content": "Agreed", "parent_id": "heat_1"},
+        follow_redirects=False
+    )
+    assert response.status_code == 302
+    assert response.headers["location"] == "/movies/heat"
+    mock_add_comment.assert_called_once_with(movie_id="heat", user_id=2, content="Agreed", parent_id="heat_1")
@@ -0,0 +1,83 @@
+from fastapi import HTTPException
+from unittest.mock import patch, MagicMock
+from app.utils import aws_dynamodb
+import pytest
+
+
+def comment(path, parent_id=None):
+    return {
+        "id": path.rsplit("/", 1)[-1], "movie_id": "heat", "user_id": 1, "content": path,
+        "timestamp": "2024-01-01T00:00:00+00:00", "path": path, "depth": path.count("/"),
+        **({"parent_id": parent_id} if parent_id else {})
+    }
+
+# Three threads in path order; b has a reply with a reply of its own
+THREADS = [
+    comment("a"),
+    comment("b"), comment("b/c", "b"), comment("b/c/d", "c"), comment("b/e", "b"),
+    comment("f"),
+]
+
+def descending_query(items, page_size=2):
+    """A stand-in for Query on ThreadIndex with ScanIndexForward=False"""
+    def query(**kwargs):
+        rows = sorted(items, key=lambda item: item["path"], reverse=True)
+        condition = kwargs["KeyConditionExpression"].get_expression()
+        if condition["operator"] == "AND":
+            before = condition["values"][1].get_expression()["values"][1]
+            rows = [row for row in rows if row["path"] < before]
+        start = kwargs.get("ExclusiveStartKey", {}).get("path")
+        if start is not None:
+            rows = [row for row in rows if row["path"] < start]
+        page = [dict(row) for row in rows[:page_size]]
+        response = {"Items": page}
+        if len(rows) > page_size:
+            response["LastEvaluatedKey"] = {"path": page[-1]["path"]}
+        return response
+    return MagicMock(side_effect=query)
+
+@patch("app.utils.aws_dynamodb.comments_table")
+def test_threads_paginated_by_top_level_comment(mock_comments_table):
+    mock_comments_table.query = descending_query(THREADS)
+
+    comments, cursor = aws_dynamodb.get_comment_threads("heat", 2)
+    # Newest thread first, each thread depth first
+    assert [c["path"] for c in comments] == ["f", "b", "b/c", "b/c/d", "b/e"]
+    assert cursor == "b"
+
+    comments, cursor = aws_dynamodb.get_comment_threads("heat", 2, before=cursor)
+    assert [c["path"] for c in comments] == ["a"]
+    assert cursor is None
+
+def test_nest_comments():
+    threads = aws_dynamodb.nest_comments(THREADS)
+    assert [thread["id"] for thread in threads] == ["a", "b", "f"]
+    b = threads[1]
+    assert [reply["id"] for reply in b["replies"]] == ["c", "e"]
+    assert [reply["id"] for reply in b["replies"][0]["replies"]] == ["d"]
+
+@patch("app.utils.aws_dynamodb.record_trending_event")
+@patch("app.utils.aws_dynamodb.movies_table")
+@patch("app.utils.aws_dynamodb.comments_table")
+def test_reply_extends_parent_path(mock_comments_table, mock_movies_table, mock_record_trending_event):
+    parent = {"id": "b", "movie_id": "heat", "path": "00000000000000000001", "depth": 0}
+    mock_comments_table.get_item.return_value = {"Item": parent}
+
+    reply = aws_dynamodb.add_comment("heat", 1, "Agreed", parent_id="b")
+    assert reply["path"].startswith(parent["path"] + "/")
+    assert len(reply["path"]) == 2 * len(parent["path"]) + 1
+    assert reply["depth"] == 1
+    assert reply["parent_id"] == "b"
+    parent_update = mock_comments_table.update_item.call_args.kwargs
+    assert parent_update["Key"] == {"id": "b"}
+    assert parent_update["UpdateExpression"] == "ADD reply_count :one, version :one"
+
+@patch("app.utils.aws_dynamodb.comments_table")
+def test_reply_depth_limited(mock_comments_table):
+    mock_comments_table.get_item.return_value = {
+        "Item": {"id": "deep", "movie_id": "heat", "path": "x", "depth": aws_dynamodb.MAX_COMMENT_DEPTH}
+    }
+    with pytest.raises(HTTPException) as error:
+        aws_dynamodb.add_comment("heat", 1, "Too deep", parent_id="deep")
+    assert error.value.status_code == 400
+    mock_comments_table.put_item.assert_not_called()
@@ -0,0 +1,67 @@
+from unittest.mock import patch
+from app.utils import aws_dynamodb
+from app.utils.counter_buffer import CounterBuffer
+import time
+import pytest
+
+
+@patch("app.utils.aws_dynamodb.increment_movie_counters")
+def test_hits_coalesce_into_one_write_per_movie(mock_increment):
+    buffer = CounterBuffer(flush_seconds=60, flush_threshold=100)
+    for _ in range(50):
+        buffer.add("heat", "view_count")
+    buffer.add("heat", "download_count", 2)
+    buffer.add("ronin", "view_count")
+
+    assert buffer.flush() == 2
+    calls = {call.args[0]: call.args[1] for call in mock_increment.call_args_list}
+    assert calls == {"heat": {"view_count": 50, "download_count": 2}, "ronin": {"view_count": 1}}
+    assert buffer.pending() == {}
+
+@patch("app.utils.aws_dynamodb.increment_movie_counters")
+def test_failed_writes_retried_next_flush(mock_increment):
+    buffer = CounterBuffer(flush_seconds=60, flush_threshold=100)
+    buffer.add("heat", "view_count", 3)
+    mock_increment.side_effect = Exception("throttled")
+    assert buffer.flush() == 0
+
+    buffer.add("heat", "view_count")
+    assert buffer.pending() == {"heat": {"view_count": 4}}
+    mock_increment.side_effect = None
+    assert buffer.flush() == 1
+    mock_increment.assert_called_with("heat", {"view_count": 4})
+
+@patch("app.utils.aws_dynamodb.increment_movie_counters")
+def test_threshold_triggers_flush(mock_increment):
+    buffer = CounterBuffer(flush_seconds=60, flush_threshold=3)
+    buffer.start()
+    try:
+        for movie_id in ("a", "b", "c"):
+            buffer.add(movie_id, "view_count")
+        deadline = time.monotonic() + 2
+        while mock_increment.call_count < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert mock_increment.call_count == 3
+    finally:
+        buffer.stop()
+
+@patch("app.utils.aws_dynamodb.increment_movie_counters")
+def test_stop_flushes_remaining_counts(mock_increment):
+    buffer = CounterBuffer(flush_seconds=60, flush_threshold=100)
+    buffer.start()
+    buffer.add("heat", "download_count")
+    buffer.stop()
+    mock_increment.assert_called_once_with("heat", {"download_count": 1})
+
+@patch("app.utils.aws_dynamodb.add_trending_weight")
+def test_trending_events_summed_per_movie_and_generation(mock_add_trending_weight):
+    buffer = CounterBuffer(flush_seconds=60, flush_threshold=100)
+    for _ in range(3):
+        buffer.add_trending("heat", "download", now=0)
+    buffer.add_trending("heat", "comment", now=0)
+
+    buffer.flush()
+    generation, download = aws_dynamodb.trending_weight("download", now=0)
+    _, comment = aws_dynamodb.trending_weight("comment", now=0)
+    mock_add_trending_weight.assert_called_once_with("heat", generation, 3 * download + comment)
+    assert buffer.pending_trending() == {}
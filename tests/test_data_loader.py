@@ -0,0 +1,61 @@
+from unittest.mock import patch, MagicMock
+from app.utils.data_loader import DataLoader, RequestLoaders
+import asyncio
+import time
+
+
+def test_loads_in_same_tick_are_batched_and_deduplicated():
+    batch_fn = MagicMock(side_effect=lambda keys: {key: f"value-{key}" for key in keys})
+    loader = DataLoader(batch_fn)
+
+    async def run():
+        first = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"))
+        second = await loader.load("b")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == ["value-a", "value-b", "value-a"]
+    assert second == "value-b"
+    batch_fn.assert_called_once_with(["a", "b"])
+
+def test_batch_errors_propagate_and_are_not_cached():
+    batch_fn = MagicMock(side_effect=[RuntimeError("throttled"), {"a": 1}])
+    loader = DataLoader(batch_fn)
+
+    async def run():
+        try:
+            await loader.load("a")
+        except RuntimeError:
+            pass
+        return await loader.load("a")
+
+    assert asyncio.run(run()) == 1
+    assert batch_fn.call_count == 2
+
+def test_independent_fetches_run_concurrently():
+    def slow_movie(movie_id):
+        time.sleep(0.2)
+        return {"id": movie_id}
+
+    def slow_comments(movie_id):
+        time.sleep(0.2)
+        return []
+
+    async def run():
+        loaders = RequestLoaders()
+        start = time.perf_counter()
+        movie, comments = await asyncio.gather(loaders.movie("m1"), loaders.comments_by_movie("m1"))
+        # Repeat lookups are served from the request cache
+        await loaders.movie("m1")
+        await loaders.comments_by_movie("m1")
+        return movie, comments, time.perf_counter() - start
+
+    with patch("app.utils.aws_dynamodb.get_movie", side_effect=slow_movie) as mock_movie, \
+            patch("app.utils.aws_dynamodb.get_comments_by_movie", side_effect=slow_comments) as mock_comments:
+        movie, comments, elapsed = asyncio.run(run())
+
+    assert movie == {"id": "m1"}
+    assert comments == []
+    assert elapsed < 0.35
+    mock_movie.assert_called_once_with("m1")
+    mock_comments.assert_called_once_with("m1")
@@ -0,0 +1,50 @@
+from sqlalchemy import create_engine, exc
+from app.database import InstrumentedQueuePool, instrument_pool
+from app.utils import metrics
+import pytest
+
+
+@pytest.fixture
+def small_engine():
+    metrics.reset()
+    engine = create_engine(
+        "sqlite:///./test_pool.db",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+        connect_args={"check_same_thread": False}
+    )
+    instrument_pool(engine.pool)
+    yield engine
+    engine.dispose()
+
+def test_pool_gauges_and_churn(small_engine):
+    with small_engine.connect():
+        assert metrics.snapshot()["gauges"]["db.pool.sync.in_use"] == 1
+    snapshot = metrics.snapshot()
+    assert snapshot["gauges"]["db.pool.sync.in_use"] == 0
+    assert snapshot["counters"]["db.pool.sync.connects"] == 1
+    assert snapshot["histograms"]["db.pool.sync.checkout_wait_seconds"]["count"] == 1
+
+def test_pool_timeout_fails_fast(small_engine):
+    with small_engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            small_engine.connect()
+    assert metrics.snapshot()["counters"]["db.pool.sync.timeouts"] == 1
+
+def test_overflow_gauge():
+    metrics.reset()
+    engine = create_engine(
+        "sqlite:///./test_pool.db", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1,
+        connect_args={"check_same_thread": False}
+    )
+    instrument_pool(engine.pool)
+    try:
+        with engine.connect(), engine.connect():
+            assert metrics.snapshot()["gauges"]["db.pool.sync.overflow"] == 1
+        gauges = metrics.snapshot()["gauges"]
+        assert gauges["db.pool.sync.in_use"] == 0
+        assert gauges["db.pool.sync.overflow"] == 0
+    finally:
+        engine.dispose()
@@ -97,10 +97,12 @@ def test_update_movie(mock_update_movie, mock_get_movie, test_user, test_movie):
     assert response.status_code == 200
     assert response.json()["title"] == "Updated Test Movie"
 
+@patch("app.utils.aws_dynamodb.start_cascade_delete")
 @patch("app.utils.aws_dynamodb.get_movie")
 @patch("app.utils.aws_s3.delete_movie")
 @patch("app.utils.aws_dynamodb.delete_movie")
-def test_delete_movie(mock_delete_movie_db, mock_delete_movie_s3, mock_get_movie, test_user, test_movie):
+def test_delete_movie(mock_delete_movie_db, mock_delete_movie_s3, mock_get_movie, mock_start_cascade_delete,
+                      test_user, test_movie):
     app.dependency_overrides[get_current_user] = lambda: test_user
     mock_get_movie.return_value = test_movie
     mock_delete_movie_s3.return_value = None
@@ -110,16 +112,19 @@ def test_delete_movie(mock_delete_movie_db, mock_delete_movie_s3, mock_get_movie
     assert response.status_code == 204
     mock_delete_movie_s3.assert_called_once_with(test_movie['s3_key'])
     mock_delete_movie_db.assert_called_once_with(test_movie['id'])
+    mock_start_cascade_delete.assert_called_once_with(test_movie['id'], test_movie['user_id'])
 
+@patch("app.utils.counter_buffer.record_download")
 @patch("app.utils.aws_dynamodb.get_movie")
 @patch("app.utils.aws_s3.get_presigned_url")
-def test_download_movie(mock_get_presigned_url, mock_get_movie, test_movie):
+def test_download_movie(mock_get_presigned_url, mock_get_movie, mock_record_download, test_movie):
     mock_get_movie.return_value = test_movie
     mock_get_presigned_url.return_value = "https://test-presigned-url.com"
 
     response = client.get(f"/movies/{test_movie['id']}/download")
     assert response.status_code == 200
     assert response.json()["download_url"] == "https://test-presigned-url.com"
+    mock_record_download.assert_called_once_with(test_movie['id'])
 
 @patch("app.utils.aws_dynamodb.get_movie")
 @patch("app.utils.aws_dynamodb.add_rating")
@@ -135,4 +140,57 @@ def test_rate_movie(mock_add_rating, mock_get_movie, test_user, test_movie):
     assert response.status_code == 200
     assert response.json()["rating"] == 4.5
     assert response.json()["user_id"] == test_user.id
-    assert response.json()["movie_id"] == test_movie["id"]
\ No newline at end of file
+    assert response.json()["movie_id"] == test_movie["id"]
+
+@patch("app.utils.aws_dynamodb.get_comment_threads")
+@patch("app.utils.aws_dynamodb.get_movie")
+def test_movie_detail_conditional_get(mock_get_movie, mock_get_comments, test_movie):
+    mock_get_movie.return_value = {**test_movie, "version": 1, "updated_at": "2023-01-02T00:00:00+00:00"}
+    mock_get_comments.return_value = ([], None)
+
+    response = client.get(f"/movies/{test_movie['id']}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"] == "Mon, 02 Jan 2023 00:00:00 GMT"
+
+    with patch("app.templating.templates.TemplateResponse") as mock_render:
+        response = client.get(f"/movies/{test_movie['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    mock_render.assert_not_called()
+
+    mock_get_movie.return_value = {**test_movie, "version": 2, "updated_at": "2023-01-03T00:00:00+00:00"}
+    response = client.get(f"/movies/{test_movie['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+@patch("app.utils.aws_dynamodb.get_comment_threads")
+@patch("app.utils.aws_dynamodb.get_movie")
+def test_movie_detail_etag_follows_counters(mock_get_movie, mock_get_comments, test_movie):
+    movie = {**test_movie, "version": 1, "updated_at": "2023-01-02T00:00:00+00:00", "view_count": 5}
+    mock_get_movie.return_value = movie
+    mock_get_comments.return_value = ([], None)
+    etag = client.get(f"/movies/{test_movie['id']}").headers["etag"]
+
+    # Same version, more views and a download
+    mock_get_movie.return_value = {**movie, "view_count": 6, "download_count": 1}
+    response = client.get(f"/movies/{test_movie['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "<strong>Views:</strong> 6" in response.text
+
+@patch("app.utils.aws_dynamodb.get_genre_counts")
+@patch("app.utils.aws_dynamodb.scan_movies")
+def test_browse_genre_facets(mock_scan_movies, mock_genre_counts, test_movie):
+    mock_scan_movies.return_value = [test_movie]
+    mock_genre_counts.return_value = {"Action": 1, "Film-Noir": 3}
+
+    response = client.get("/movies/browse")
+    assert response.status_code == 200
+    assert "Action (1)" in response.text
+    assert "Film-Noir (3)" in response.text
+    etag = response.headers["etag"]
+
+    # New counts change the page even when the listed movies do not
+    mock_genre_counts.return_value = {"Action": 1, "Film-Noir": 4}
+    response = client.get("/movies/browse", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "Film-Noir (4)" in response.text
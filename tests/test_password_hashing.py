@@ -0,0 +1,70 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+
+from app.utils import password_hashing
+
+
+async def _max_loop_lag(coro, interval=0.01):
+    """Run coro while measuring the largest gap between event loop ticks"""
+    max_lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal max_lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            max_lag = max(max_lag, time.perf_counter() - start - interval)
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        done = True
+        await task
+    return result, max_lag
+
+
+def test_login_burst_does_not_block_event_loop():
+    async def burst():
+        return await asyncio.gather(*(password_hashing.hash_password(f"password{i}") for i in range(8)))
+
+    hashes, max_lag = asyncio.run(_max_loop_lag(burst()))
+    assert len(hashes) == 8
+    # A single bcrypt hash takes far longer than this on the loop thread
+    assert max_lag < 0.05
+
+
+def test_verify_password():
+    async def run():
+        hashed = await password_hashing.hash_password("secret")
+        return (
+            await password_hashing.verify_password("secret", hashed),
+            await password_hashing.verify_password("wrong", hashed),
+        )
+
+    (valid, new_hash), (invalid, _) = asyncio.run(run())
+    assert valid is True
+    assert new_hash is None
+    assert invalid is False
+
+
+def test_verify_password_upgrades_weak_hash():
+    weak_hash = bcrypt.using(rounds=4).hash("secret")
+
+    valid, new_hash = asyncio.run(password_hashing.verify_password("secret", weak_hash))
+    assert valid is True
+    assert new_hash is not None
+    assert not password_hashing.pwd_context.needs_update(new_hash)
+
+
+def test_queue_limit_rejects_with_503():
+    with patch("app.utils.password_hashing.PASSWORD_HASH_QUEUE_LIMIT", 0):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(password_hashing.hash_password("secret"))
+    assert exc_info.value.status_code == 503
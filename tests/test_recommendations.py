@@ -0,0 +1,65 @@
+from decimal import Decimal
+from unittest.mock import patch
+from app.recommendations import build_matrix, compute, run, similar_movies
+import pytest
+
+
+RATINGS = [
+    # Everyone who liked heat liked ronin; clue is rated by a different crowd
+    ("heat", 1, 9), ("ronin", 1, 9),
+    ("heat", 2, 8), ("ronin", 2, 7),
+    ("heat", 3, 10), ("ronin", 3, 9), ("clue", 3, 2),
+    ("clue", 4, 8), ("up", 4, 9),
+    ("clue", 5, 7), ("up", 5, 8),
+]
+
+def test_build_matrix():
+    matrix, movie_ids = build_matrix(RATINGS)
+    assert matrix.shape == (5, 4)
+    assert movie_ids == ["heat", "ronin", "clue", "up"]
+    assert matrix[0, movie_ids.index("heat")] == 9
+
+def test_neighbors_ranked_by_similarity():
+    recommendations = compute(RATINGS, k=2)
+    assert [movie_id for movie_id, _ in recommendations["heat"]] == ["ronin", "clue"]
+    assert [movie_id for movie_id, _ in recommendations["up"]] == ["clue"]
+    scores = [score for _, score in recommendations["heat"]]
+    assert scores == sorted(scores, reverse=True)
+
+def test_blocks_give_same_result():
+    matrix, _ = build_matrix(RATINGS)
+    whole, whole_scores = similar_movies(matrix, k=2, block_size=100)
+    blocked, blocked_scores = similar_movies(matrix, k=2, block_size=1)
+    assert (whole == blocked).all()
+    assert (whole_scores == blocked_scores).all()
+
+@patch("app.utils.aws_dynamodb.set_similar_movies")
+@patch("app.utils.aws_dynamodb.parallel_scan_movies")
+@patch("app.utils.aws_dynamodb.parallel_scan")
+def test_run_stores_neighbors_on_movies(mock_scan, mock_scan_movies, mock_set_similar):
+    mock_scan.return_value = [{"movie_id": m, "user_id": u, "rating": r} for m, u, r in RATINGS]
+    # "up" was deleted but its ratings remain
+    mock_scan_movies.return_value = [{"id": m, "title": m.title()} for m in ("heat", "ronin", "clue")]
+
+    assert run(k=2) == 3
+    stored = {call.args[0]: call.args[1] for call in mock_set_similar.call_args_list}
+    assert [movie["title"] for movie in stored["heat"]] == ["Ronin", "Clue"]
+    assert [movie["id"] for movie in stored["clue"]] == ["heat"]
+
+@patch("app.utils.aws_dynamodb.set_similar_movies")
+@patch("app.utils.aws_dynamodb.parallel_scan_movies")
+@patch("app.utils.aws_dynamodb.parallel_scan")
+def test_run_only_writes_changes(mock_scan, mock_scan_movies, mock_set_similar):
+    mock_scan.return_value = [{"movie_id": m, "user_id": u, "rating": r} for m, u, r in RATINGS]
+    mock_scan_movies.return_value = [{"id": m, "title": m.title()} for m in ("heat", "ronin", "clue", "up")]
+    run(k=2)
+    # As stored, with each movie's neighbors; "gone" lost all its ratings since the last run
+    mock_scan_movies.return_value = [
+        {"id": call.args[0], "title": call.args[0].title(), "similar": call.args[1]}
+        for call in mock_set_similar.call_args_list
+    ] + [{"id": "gone", "title": "Gone", "similar": [{"id": "heat", "title": "Heat", "score": Decimal("0.5")}]}]
+    mock_set_similar.reset_mock()
+
+    assert run(k=2) == 1
+    mock_set_similar.assert_called_once()
+    assert mock_set_similar.call_args.args[:2] == ("gone", [])
@@ -0,0 +1,73 @@
+from app.utils.search_index import SearchIndex, tokenize
+import pytest
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.rebuild([
+        {"id": "1", "title": "Star Wars", "director": "George Lucas", "genre": "Science Fiction"},
+        {"id": "2", "title": "Starship Troopers", "director": "Paul Verhoeven", "genre": "Action"},
+        {"id": "3", "title": "Amélie", "director": "Jean-Pierre Jeunet", "genre": "Comedy"},
+        {"id": "4", "title": "American Graffiti", "director": "George Lucas", "genre": "Comedy"},
+    ])
+    return index
+
+def test_tokenize():
+    assert tokenize("Amélie: The Fabulous_Destiny!") == ["amelie", "the", "fabulous", "destiny"]
+    assert tokenize(None) == []
+
+def test_prefix_matching_and_ranking(index):
+    results = index.search("star")
+    # Whole-word match ranks above the prefix match
+    assert [movie["id"] for movie in results] == ["1", "2"]
+
+def test_all_tokens_must_match(index):
+    assert [movie["id"] for movie in index.search("star wa")] == ["1"]
+    assert index.search("star lucas")[0]["id"] == "1"
+    assert index.search("star nothing") == []
+
+def test_director_and_accent_folding(index):
+    assert {movie["id"] for movie in index.search("lucas")} == {"1", "4"}
+    assert [movie["id"] for movie in index.search("amelie")] == ["3"]
+
+def test_incremental_updates(index):
+    index.add({"id": "2", "title": "Troopers", "director": "Paul Verhoeven"})
+    assert [movie["id"] for movie in index.search("star")] == ["1"]
+
+    index.remove("1")
+    assert index.search("star") == []
+    assert index.search("wars") == []
+
+def test_snapshot_round_trip(index, tmp_path):
+    path = str(tmp_path / "index.json")
+    index.save(path)
+
+    loaded = SearchIndex()
+    assert loaded.load(path)
+    assert len(loaded) == 4
+    assert [movie["id"] for movie in loaded.search("star wa")] == ["1"]
+    assert not SearchIndex().load(str(tmp_path / "missing.json"))
+
+def test_snapshot_is_not_pickle(index, tmp_path):
+    path = tmp_path / "index.json"
+    path.write_bytes(b"\x80\x04K\x01.")
+    assert not index.load(str(path))
+    assert len(index) == 4
+
+def test_own_writes_survive_an_older_snapshot(index, tmp_path):
+    path = str(tmp_path / "index.json")
+    index.save(path)
+    index.add({"id": "5", "title": "Star Trek", "director": "Robert Wise"})
+    index.remove("2")
+
+    # Another worker's snapshot from before those writes
+    assert index.load(path)
+    assert {movie["id"] for movie in index.search("star")} == {"1", "5"}
+
+    # Once a snapshot is newer than the writes, they are no longer replayed
+    newer = SearchIndex()
+    newer.rebuild([{"id": "6", "title": "Star 80", "director": "Bob Fosse"}])
+    newer.save(path)
+    assert index.load(path)
+    assert [movie["id"] for movie in index.search("star")] == ["6"]
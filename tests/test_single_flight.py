@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+from app.main import app
+from app.utils import aws_dynamodb
+from app.utils.single_flight import SingleFlight
+import asyncio
+import httpx
+import threading
+import time
+import pytest
+
+
+def run_concurrently(flight, func, callers=5):
+    # func is slow enough that every caller joins while the first is in flight
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(flight.do, "key", func) for _ in range(callers)]
+        return [future.exception() or future.result() for future in futures]
+
+def slow(result=None, error=None, calls=None):
+    def func():
+        calls.append(1)
+        time.sleep(0.2)
+        if error:
+            raise error
+        return result
+    return func
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+    results = run_concurrently(SingleFlight(), slow(result=[1, 2], calls=calls))
+    assert len(calls) == 1
+    assert all(result == [1, 2] for result in results)
+    # Every caller gets its own list
+    assert len({id(result) for result in results}) == len(results)
+
+def test_errors_shared_when_configured():
+    calls = []
+    results = run_concurrently(SingleFlight(share_errors=True), slow(error=ValueError("boom"), calls=calls))
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_waiters_retry_when_errors_not_shared():
+    calls = []
+    results = run_concurrently(SingleFlight(share_errors=False), slow(error=ValueError("boom"), calls=calls))
+    assert len(calls) == len(results)
+
+def test_nothing_cached_after_flight():
+    flight, calls = SingleFlight(), []
+    flight.do("key", slow(result=1, calls=calls))
+    flight.do("key", slow(result=1, calls=calls))
+    assert len(calls) == 2
+
+@patch("app.utils.aws_dynamodb.get_genre_counts", return_value={})
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_concurrent_browses_scan_once(mock_movies_table, mock_genre_counts):
+    def scan(**kwargs):
+        time.sleep(0.3)
+        return {"Items": [{"id": "1", "title": "Heat", "genre": "Action", "rating": 8}]}
+    mock_movies_table.scan = MagicMock(side_effect=scan)
+
+    async def browse_concurrently():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(async_client.get("/movies/browse") for _ in range(8)))
+
+    responses = asyncio.run(browse_concurrently())
+    assert all(response.status_code == 200 for response in responses)
+    assert all("Heat" in response.text for response in responses)
+    assert mock_movies_table.scan.call_count == 1
+
+@patch("app.utils.aws_dynamodb.record_trending_event")
+@patch("app.utils.aws_dynamodb.movies_table")
+@patch("app.utils.aws_dynamodb.comments_table")
+def test_own_comment_read_does_not_join_older_flight(mock_comments_table, mock_movies_table, mock_trending):
+    before = {"id": "heat_1", "movie_id": "heat", "user_id": 2}
+    started, release = threading.Event(), threading.Event()
+
+    def query(**kwargs):
+        if mock_comments_table.query.call_count == 1:
+            # A read that began before the comment was written
+            started.set()
+            release.wait(2)
+            return {"Items": [dict(before)]}
+        return {"Items": [dict(before), {"id": "heat_2", "movie_id": "heat", "user_id": 1}]}
+    mock_comments_table.query = MagicMock(side_effect=query)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        earlier = executor.submit(aws_dynamodb.get_comments_by_movie, "heat")
+        started.wait(2)
+        aws_dynamodb.add_comment("heat", 1, "Great heist")
+        after = aws_dynamodb.get_comments_by_movie("heat")
+        release.set()
+        assert len(earlier.result()) == 1
+    assert [comment["id"] for comment in after] == ["heat_1", "heat_2"]
@@ -0,0 +1,52 @@
+from app.utils.suggest_index import SuggestIndex, TOP_K
+import pytest
+
+
+MOVIES = [
+    {"id": "1", "title": "Star Wars", "director": "George Lucas", "genre": "Science Fiction", "rating_count": 50},
+    {"id": "2", "title": "Starship Troopers", "director": "Paul Verhoeven", "genre": "Action", "rating_count": 5},
+    {"id": "3", "title": "Amélie", "director": "Jean-Pierre Jeunet", "genre": "Comedy"},
+    {"id": "4", "title": "American Graffiti", "director": "George Lucas", "genre": "Comedy", "rating_count": 2},
+]
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex()
+    index.rebuild(MOVIES)
+    return index
+
+def texts(suggestions):
+    return [suggestion["text"] for suggestion in suggestions]
+
+def test_ranked_by_rating_count(index):
+    assert texts(index.suggest("sta")) == ["Star Wars", "Starship Troopers"]
+    # Directors sum the rating counts of their movies
+    assert index.suggest("geo") == [{"text": "George Lucas", "kind": "director"}]
+
+def test_matches_any_word_start(index):
+    assert texts(index.suggest("wars")) == ["Star Wars"]
+    assert texts(index.suggest("fiction")) == ["Science Fiction"]
+    assert texts(index.suggest("ame")) == ["American Graffiti", "Amélie"]
+    assert texts(index.suggest("amelie")) == ["Amélie"]
+    assert index.suggest("") == []
+
+def test_long_prefixes_and_limits(index):
+    assert texts(index.suggest("star wa")) == ["Star Wars"]
+    assert len(index.suggest("a", limit=1)) == 1
+    assert texts(index.suggest("a", limit=TOP_K + 5)) == texts(index.suggest("a"))
+
+def test_incremental_updates_match_rebuild(index):
+    index.add({"id": "5", "title": "Star Trek", "director": "J.J. Abrams", "genre": "Action", "rating_count": 20})
+    index.add(dict(MOVIES[0], rating_count=1))
+    index.remove("4")
+
+    rebuilt = SuggestIndex()
+    rebuilt.rebuild([
+        dict(MOVIES[0], rating_count=1), MOVIES[1], MOVIES[2],
+        {"id": "5", "title": "Star Trek", "director": "J.J. Abrams", "genre": "Action", "rating_count": 20},
+    ])
+    for query in ("s", "st", "sta", "star", "g", "a", "c", "comedy"):
+        assert index.suggest(query) == rebuilt.suggest(query)
+    assert texts(index.suggest("sta")) == ["Star Trek", "Starship Troopers", "Star Wars"]
+    assert texts(index.suggest("graf")) == []
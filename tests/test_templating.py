@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+from app.templating import create_environment, fragment_cache, template_fingerprint
+import pytest
+
+
+@pytest.fixture
+def env(tmp_path):
+    fragment_cache.clear()
+    return create_environment(cache_dir=str(tmp_path))
+
+def test_fragment_is_cached_per_version(env):
+    template = env.from_string("{{ cached_fragment('fragments/movie_card.html', movie) }}")
+    movie = {"id": "m1", "title": "First Title", "genre": "Drama", "director": "Someone", "rating": 7, "version": 1}
+
+    assert "First Title" in template.render(movie=movie)
+    assert "First Title" in template.render(movie={**movie, "title": "Changed"})
+    assert fragment_cache.hits == 1
+
+    assert "Changed" in template.render(movie={**movie, "title": "Changed", "version": 2})
+
+def test_fragment_escapes_item_data(env):
+    template = env.from_string("{{ cached_fragment('fragments/comment.html', comment) }}")
+    comment = {"id": "c1", "content": "<script>", "user_id": 1, "timestamp": "now", "version": 1}
+
+    assert "&lt;script&gt;" in template.render(comment=comment)
+
+def test_comment_timestamp_same_from_page_and_event(env):
+    template = env.from_string("{{ cached_fragment('fragments/comment.html', comment) }}")
+    posted = datetime(2023, 11, 14, 22, 13, 20, tzinfo=timezone.utc)
+    comment = {"id": "c1", "content": "Great", "user_id": 1, "version": 1}
+
+    # Pages pass datetimes; the event stream passes the stored ISO string
+    from_page = template.render(comment={**comment, "timestamp": posted})
+    fragment_cache.clear()
+    from_event = template.render(comment={**comment, "timestamp": posted.isoformat()})
+    assert from_page == from_event
+    assert "2023-11-14 22:13:20 UTC" in from_page
+
+def test_fingerprint_changes_with_asset_manifest(tmp_path):
+    (tmp_path / "page.html").write_text("<link href=\"{{ asset_url('css/styles.css') }}\">")
+    before = template_fingerprint(str(tmp_path), manifest={"css/styles.css": "build/css/styles.abc123.css"})
+    after = template_fingerprint(str(tmp_path), manifest={"css/styles.css": "build/css/styles.def456.css"})
+    assert before != after
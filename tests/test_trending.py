@@ -0,0 +1,72 @@
+from decimal import Decimal
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+from app.main import app
+from app.utils import aws_dynamodb
+import pytest
+
+client = TestClient(app)
+
+HALF_LIFE = aws_dynamodb.TRENDING_HALF_LIFE_HOURS * 3600
+GENERATION = HALF_LIFE * aws_dynamodb.TRENDING_GENERATION_HALF_LIVES
+
+
+def conditional_check_failed():
+    error_class = aws_dynamodb.dynamodb.meta.client.exceptions.ConditionalCheckFailedException
+    return error_class({"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}}, "UpdateItem")
+
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_later_events_weigh_more(mock_movies_table):
+    start = 5 * GENERATION
+    aws_dynamodb.record_trending_event("1", "download", now=start)
+    aws_dynamodb.record_trending_event("1", "download", now=start + HALF_LIFE)
+
+    first, second = mock_movies_table.update_item.call_args_list
+    assert first.kwargs["ExpressionAttributeValues"] == {":w": Decimal(1), ":g": 5}
+    assert second.kwargs["ExpressionAttributeValues"] == {":w": Decimal(2), ":g": 5}
+
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_first_event_in_generation_carries_counter_over(mock_movies_table):
+    mock_movies_table.update_item = MagicMock(side_effect=[conditional_check_failed(), {}])
+    mock_movies_table.get_item.return_value = {
+        "Item": {"id": "1", "trending": Decimal(256 * 3), "trending_generation": Decimal(4)}
+    }
+
+    aws_dynamodb.record_trending_event("1", "rating", now=5 * GENERATION)
+
+    carried = mock_movies_table.update_item.call_args_list[1].kwargs
+    # 256 is 2 ** TRENDING_GENERATION_HALF_LIVES: a full generation of decay
+    assert carried["ExpressionAttributeValues"] == {":t": Decimal(3 + 3), ":g": 5, ":old": 4}
+
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_deleted_movie_not_recreated(mock_movies_table):
+    mock_movies_table.update_item = MagicMock(side_effect=conditional_check_failed())
+    mock_movies_table.get_item.return_value = {}
+
+    aws_dynamodb.record_trending_event("gone", "comment")
+    assert mock_movies_table.update_item.call_count == 1
+
+@patch("app.utils.aws_dynamodb.movies_table")
+def test_query_merges_generations(mock_movies_table):
+    def query(**kwargs):
+        generation = kwargs["KeyConditionExpression"].get_expression()["values"][1]
+        items = {
+            5: [{"id": "new", "trending": Decimal(8)}, {"id": "moving", "trending": Decimal(4)}],
+            4: [{"id": "moving", "trending": Decimal(512)}, {"id": "old", "trending": Decimal(1536)}],
+        }
+        return {"Items": items[generation]}
+    mock_movies_table.query = MagicMock(side_effect=query)
+
+    movies = aws_dynamodb.query_trending_movies(2, now=5 * GENERATION + HALF_LIFE)
+    # new: 8 / 2, old: 1536 / 256 / 2, moving: the larger of 4 / 2 and 512 / 256 / 2
+    assert [movie["id"] for movie in movies] == ["new", "old"]
+    assert movies[0]["trending_score"] == pytest.approx(4)
+    assert movies[1]["trending_score"] == pytest.approx(3)
+
+@patch("app.utils.aws_dynamodb.get_trending_movies")
+def test_home_shows_trending(mock_trending):
+    mock_trending.return_value = [{"id": "1", "title": "Heat", "genre": "Action", "rating": 8}]
+    response = client.get("/")
+    assert response.status_code == 200
+    assert "Trending Now" in response.text
+    assert "Heat" in response.text